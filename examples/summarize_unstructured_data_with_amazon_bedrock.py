@@ -1,171 +1,45 @@
 #!/opt/anaconda3/bin/python
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import json
 import os
 import sys
 from typing import Any
-from awschain import HandlerFactory, ConfigLoader
+from awschain import HandlerFactory, ChainRunner, ConfigLoader, ChainRegistry, Request
+from awschain.handlers import ChainSpecError
+from awschain.utils.checkpoint import CheckpointStore, run_resumable
 import argparse
 
 
 # Load config
 ConfigLoader.load_config('../config.yaml')
 
+# Chains are declared in chains.yaml (see chains.yaml.example) and compiled once per input type and options.
+CHAINS_FILE = os.getenv("CHAINS_FILE") or ("../chains.yaml" if os.path.exists("../chains.yaml") else "../chains.yaml.example")
+chains = ChainRegistry.from_file(CHAINS_FILE)
+
 def determine_input_type(file_path):
-    if "youtube" in file_path or "youtu.be" in file_path:
-        return "youtube_url"
-    elif file_path.startswith(('http')):
-        return "http"    
-    elif file_path.startswith(('s3://')):
-        return "s3"  
-    elif file_path.startswith(('quip://')):
-        return "quip"   
-    elif file_path.endswith(('.mp3', '.mp4', '.m4a', '.wav', '.flac', '.mov', '.avi')):
-        return "multimedia_file"
-    elif file_path.endswith('.pdf'):
-        return "pdf"
-    elif file_path.endswith('.docx'):
-        return "microsoft_word"
-    elif file_path.endswith(('.xlsx','.xlsm','.xltx','.xltm')):
-        return "microsoft_excel"
-    elif file_path.endswith('.pptx'):
-        return "microsoft_pp"
-    elif file_path.endswith(('.jpg', '.jpeg', '.png', '.tiff')):
-        return "image_file"    
-    elif file_path.endswith(('.txt', '.json')):
-        return "text_or_json"
-    else:
-        # Assume text
-        return "text_or_json"
+    return chains.determine_input_type(file_path)
+
+def chain_options(args):
+    chat = args.chat
+    return {
+        "anonymize": args.anonymize in (True, 'true', '1'),
+        "sum_first": chat == 'sum_first',
+        "chat_only": chat == 'chat_only',
+        # Any other chat mode chats before summarizing.
+        "chat_first": chat not in (None, 'sum_first', 'chat_only'),
+        "clipboard": os.getenv('CLIPBOARD_COPY', 'false').lower() in ('true', '1', 't'),
+    }
 
 def construct_chain(input_type, args):
-    
-    
-    # Use if-elif-else to construct the appropriate chain. In Python 3.10 we could use match statement.
-    if input_type == "youtube_url":
-        youtube_handler = HandlerFactory.get_handler("YouTubeReaderHandler")
-        s3writer_handler = HandlerFactory.get_handler("AmazonS3WriterHandler")
-        transcription_handler = HandlerFactory.get_handler("AmazonTranscriptionHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-        
-        chain = youtube_handler
-        current_handler = youtube_handler.set_next(s3writer_handler).set_next(transcription_handler).set_next(local_file_writer_handler)
-    elif input_type == "multimedia_file":
-        s3writer_handler = HandlerFactory.get_handler("AmazonS3WriterHandler")
-        transcription_handler = HandlerFactory.get_handler("AmazonTranscriptionHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-
-        chain = s3writer_handler
-        current_handler = s3writer_handler.set_next(transcription_handler).set_next(local_file_writer_handler)
-
-    elif input_type == "multimedia_file_whisper":
-        transcription_handler = HandlerFactory.get_handler("OpenAIWhisperTranscriptionHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-
-        chain = transcription_handler
-        current_handler = transcription_handler.set_next(local_file_writer_handler)        
-    elif input_type == "image_file":
-        local_file_reader_handler = HandlerFactory.get_handler("LocalFileReaderHandler")
-        textract_handler = HandlerFactory.get_handler("AmazonTextractHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-        chain = local_file_reader_handler
-        current_handler = local_file_reader_handler.set_next(textract_handler).set_next(local_file_writer_handler)       
-    elif input_type == "pdf":
-        pdf_handler = HandlerFactory.get_handler("PDFReaderHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-
-        chain = pdf_handler
-        current_handler = pdf_handler.set_next(local_file_writer_handler)
-
-    elif input_type == "http":
-        http_handler = HandlerFactory.get_handler("HTTPHandler")
-        http_clean_handler = HandlerFactory.get_handler("HTMLCleanerHandler")      
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")  
-
-        chain = http_handler
-        current_handler = http_handler.set_next(http_clean_handler).set_next(local_file_writer_handler)
-    elif input_type == "text_or_json":
-        local_file_reader_handler = HandlerFactory.get_handler("LocalFileReaderHandler")
-
-        chain = local_file_reader_handler
-        current_handler = local_file_reader_handler
-    elif input_type == "s3":
-        s3reader_handler = HandlerFactory.get_handler("AmazonS3ReaderHandler")
-        # local_file_reader_handler = HandlerFactory.get_handler("LocalFileReaderHandler")
-        current_handler = chain = s3reader_handler        
-
-    elif input_type == "quip":
-        quip_reader_handler = HandlerFactory.get_handler("QuipReaderHandler")
-        http_clean_handler = HandlerFactory.get_handler("HTMLCleanerHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-
-        chain = quip_reader_handler
-        current_handler = quip_reader_handler.set_next(http_clean_handler).set_next(local_file_writer_handler)
-    elif input_type == "microsoft_word":
-        msword_handler = HandlerFactory.get_handler("MicrosoftWordReaderHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-        chain = msword_handler
-        current_handler = msword_handler.set_next(local_file_writer_handler)
-    
-    elif input_type == "microsoft_excel":
-        xls_hanlder = HandlerFactory.get_handler("MicrosoftExcelReaderHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-        chain = xls_hanlder
-        current_handler = xls_hanlder.set_next(local_file_writer_handler)
-    elif input_type == "microsoft_pp":
-        pp_handler = HandlerFactory.get_handler("MicrosoftPowerPointReaderHandler")
-        local_file_writer_handler = HandlerFactory.get_handler("LocalFileWriterHandler")
-        chain = pp_handler
-        current_handler = pp_handler.set_next(local_file_writer_handler)
-    elif input_type == "custom":
+    if input_type == "custom":
         return construct_custom_chain() # for testing only
-            # construct and return a custom chain.    
-    else:
-        # For unsupported types, default to just summarization_handler
-        print("Unsupported file type.", input_type)
-        sys.exit(1)
-    
-    # Anonymize data?
-    anonymize = args.anonymize in (True, 'true', '1')
-    if anonymize: 
-        anonymize_handler = HandlerFactory.get_handler("AmazonComprehendPIITokenizeHandler")
-        current_handler = current_handler.set_next(anonymize_handler)
 
-    # Add the prompt and bedrock handlers.
-    prompt_handler = HandlerFactory.get_handler("PromptHandler")
-    bedrock_handler = HandlerFactory.get_handler("AmazonBedrockHandler")    
-        
-    # Determinate when / if we need to call summarization or Chat and in what order.
-    
-    if args.chat and args.chat != None: 
-        chat_handler = HandlerFactory.get_handler("AmazonBedrockChatHandler")
-        print("Enable chat", args)
-        if args.chat == 'sum_first':
-            current_handler = current_handler.set_next(prompt_handler).set_next(bedrock_handler).set_next(chat_handler)
-
-        elif args.chat == 'chat_only': 
-            current_handler = current_handler.set_next(chat_handler)
-            
-        else: 
-            current_handler = current_handler.set_next(chat_handler)
-            current_handler = current_handler.set_next(prompt_handler).set_next(bedrock_handler)
-    else: 
-        current_handler = current_handler.set_next(prompt_handler).set_next(bedrock_handler)
-    
-    # Finally, if we have tokenized the content, let's untokenize
-    if anonymize:
-        unanonymize_handler = HandlerFactory.get_handler("AmazonComprehendPIIUntokenizeHandler")
-        current_handler = current_handler.set_next(unanonymize_handler)
-
-    # Copy to clipboard?
-    clipboard = os.getenv('CLIPBOARD_COPY', 'false').lower() in ('true', '1', 't')
-    if clipboard:         
-        clipboard_handler = HandlerFactory.get_handler("ClipboardWriterHandler")
-        current_handler = current_handler.set_next(clipboard_handler)
-        print("\n\n  ================================================\n   The summary will be copied to your clipboard.\n  ================================================\n")    
-        
-    return chain
+    try:
+        return chains.build(input_type, **chain_options(args))
+    except ChainSpecError as e:
+        print("Unsupported file type.", input_type, e)
+        sys.exit(1)
 
 def construct_custom_chain():
     # Get creative...
@@ -245,14 +119,11 @@ def construct_custom_chain():
          
     return chain
 
-def process_file(file_path, args):
-    print(f"Processing: {file_path}")
+def build_request(file_path, args):
     if args.custom:
         input_type = "custom"
     else:
         input_type = determine_input_type(file_path)
-    
-    handler_chain = construct_chain(input_type, args)
 
     # Prepare the output filename with the current date and time
     current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -260,16 +131,26 @@ def process_file(file_path, args):
     output_file = f"{local_dir}/output_{os.path.basename(file_path)}_{current_time}.txt"
     
     
-    request = {
-        "type": input_type,
-        "path": file_path,
-        "prompt_file_name": args.prompt_file_name,
-        "text": "",
-        "write_file_path": output_file,
-        "extract_media": True
-    }
+    request = Request(
+        type=input_type,
+        path=file_path,
+        prompt_file_name=args.prompt_file_name,
+        text="",
+        write_file_path=output_file,
+        extract_media=True
+    )
+    return request
 
-    result = handler_chain.handle(request)
+def process_file(file_path, args):
+    print(f"Processing: {file_path}")
+    request = build_request(file_path, args)
+    handler_chain = construct_chain(request["type"], args)
+
+    if args.resume:
+        # Checkpoint after every handler; a rerun continues after the last one that succeeded.
+        return run_resumable(handler_chain, request, CheckpointStore())
+
+    result = handler_chain.handle_in_stages(request)
     return result
 
 
@@ -292,25 +173,32 @@ def main():
     # Optional flag to specify the use of a custom chain
     parser.add_argument('--custom', action='store_true', help='Flag to use a custom processing chain instead of the default based on file type.')
 
+    # Optional flag to checkpoint every stage and resume failed runs
+    parser.add_argument('--resume', action='store_true', help='Checkpoint the request after every handler and resume a previously failed run from its last completed stage.')
+
     # Parse the command-line arguments
     args = parser.parse_args()
 
-    # Handler discovery
-    HandlerFactory.discover_handlers()
+    if args.chat:
+        print("Enable chat", args)
+    if chain_options(args)["clipboard"]:
+        print("\n\n  ================================================\n   The summary will be copied to your clipboard.\n  ================================================\n")
  
     if os.path.isdir(args.path):
-        max_processes = int(os.getenv('MAX_PARALLEL_PROCESSES', 1))
-        with ThreadPoolExecutor(max_workers=max_processes) as executor:
-            futures = [executor.submit(process_file, os.path.join(args.path, f), args) for f in os.listdir(args.path) if os.path.isfile(os.path.join(args.path, f))]
-            for future in as_completed(futures):
-                result = future.result()
+        # All files are processed concurrently on one event loop. Every request gets its own chain
+        # because some handlers keep per-request state on the handler instance.
+        files = [os.path.join(args.path, f) for f in os.listdir(args.path) if os.path.isfile(os.path.join(args.path, f))]
+        runner = ChainRunner(lambda request: construct_chain(request["type"], args), checkpoints=CheckpointStore() if args.resume else None)
+        results = runner.run([build_request(file_path, args) for file_path in files])
+        result = results[-1] if results else {}
     else:
         result = process_file(args.path, args)
 
     if result.get("text", None):
         print(result.get("text"))
     else:
-        print(json.dumps(result, indent=2))
+        # dict() turns a Request into a plain dict, which json can serialize.
+        print(json.dumps(dict(result), indent=2, default=str))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,22 @@
 import os
+import importlib.util
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+
+
+class BuildPyWithHandlerIndex(build_py):
+    """
+    Bundles the handler discovery index with the package so installed copies
+    never parse their own handler files at startup.
+    """
+
+    def run(self):
+        super().run()
+        spec = importlib.util.spec_from_file_location(
+            "discovery_index", os.path.join("src", "awschain", "handlers", "discovery_index.py"))
+        discovery_index = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(discovery_index)
+        discovery_index.build_index(os.path.join(self.build_lib, "awschain", "handlers"))
 
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
@@ -36,4 +53,6 @@ setup(
     python_requires=">=3.7",
     install_requires=requirements,  # Optional if requirements.txt doesn't exist
     test_suite='tests',
+    cmdclass={"build_py": BuildPyWithHandlerIndex},
+    entry_points={"console_scripts": ["awschain=awschain.cli:main"]},
 )
@@ -1,4 +1,7 @@
 from .handlers.handler_factory import HandlerFactory
+from .handlers.chain_runner import ChainRunner
+from .handlers.chain_template import ChainRegistry
 from .utils.config_loader import ConfigLoader
+from .utils.request import Request
 
-__all__ = ['HandlerFactory', 'ConfigLoader']
\ No newline at end of file
+__all__ = ['HandlerFactory', 'ChainRunner', 'ChainRegistry', 'ConfigLoader', 'Request']
\ No newline at end of file
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+from .handlers.chain_template import ChainRegistry
+from .utils.config_loader import ConfigLoader
+from .worker import Worker, open_queue
+from .utils.bedrock_batch import BedrockBatch
+
+
+def chain_for_request(registry: ChainRegistry):
+    """
+    Returns a chain factory for the worker: request["chain"] names the chain,
+    otherwise it is picked from the input type of request["path"].
+    request["chain_options"] holds the when / unless options.
+    """
+    def build(request: dict):
+        name = request.get("chain") or request.get("type") or registry.determine_input_type(request.get("path", ""))
+        return registry.build(name, **request.get("chain_options", {}))
+    return build
+
+
+def run_worker(args) -> int:
+    queue = open_queue(args.queue)
+    registry = ChainRegistry.load(args.chains)
+    worker = Worker(queue, chain_for_request(registry), concurrency=args.concurrency)
+    worker.run(stop_when_empty=args.exit_when_empty)
+    queue.close()
+    return 0
+
+
+def run_enqueue(args) -> int:
+    queue = open_queue(args.queue)
+    lines = args.requests or sys.stdin
+    count = 0
+    for line in lines:
+        line = line.strip()
+        if line:
+            queue.put(json.loads(line))
+            count += 1
+    queue.close()
+    print(f"Enqueued {count} request(s)")
+    return 0
+
+
+def run_bedrock_batch(args) -> int:
+    batch = BedrockBatch(args.dir)
+    if args.action == "submit":
+        batch.submit(args.job_name, direct=True if args.direct else None)
+    elif args.action == "status":
+        print(batch.status())
+    elif args.action == "wait":
+        print(batch.wait(args.poll_interval))
+    else:
+        if args.wait:
+            batch.wait(args.poll_interval)
+        results = batch.resume()
+        failed = sum(1 for result in results if "bedrock_batch_error" in result)
+        print(f"Resumed {len(results) - failed} request(s), {failed} failed")
+        return 1 if failed else 0
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="awschain", description="Run awschain handler chains.")
+    parser.add_argument("--config", default=None, help="Path to config.yaml (searched from the working directory by default).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="Process requests from a queue until stopped.")
+    worker.add_argument("--queue", default=os.getenv("WORKER_QUEUE"), help="sqlite:///path/to/queue.db or an SQS queue URL (WORKER_QUEUE).")
+    worker.add_argument("--chains", default=None, help="Chain specification file (CHAINS_FILE, or chains.yaml next to config.yaml).")
+    worker.add_argument("--concurrency", type=int, default=None, help="Requests processed at the same time (WORKER_CONCURRENCY, default 4).")
+    worker.add_argument("--exit-when-empty", action="store_true", help="Stop once the queue is drained instead of waiting for more requests.")
+    worker.set_defaults(func=run_worker)
+
+    enqueue = commands.add_parser("enqueue", help="Add JSON requests (one per argument or per stdin line) to a queue.")
+    enqueue.add_argument("--queue", default=os.getenv("WORKER_QUEUE"), help="sqlite:///path/to/queue.db or an SQS queue URL (WORKER_QUEUE).")
+    enqueue.add_argument("requests", nargs="*", help="JSON request objects.")
+    enqueue.set_defaults(func=run_enqueue)
+
+    bedrock_batch = commands.add_parser("bedrock-batch", help="Submit, check or resume a staged Bedrock batch inference job.")
+    bedrock_batch.add_argument("action", choices=("submit", "status", "wait", "resume"))
+    bedrock_batch.add_argument("--dir", default=None, help="Staging directory (AMAZON_BEDROCK_BATCH_DIR).")
+    bedrock_batch.add_argument("--job-name", default=None, help="Job name for submit (generated by default).")
+    bedrock_batch.add_argument("--poll-interval", type=float, default=None, help="Seconds between status checks (AMAZON_BEDROCK_BATCH_POLL_INTERVAL).")
+    bedrock_batch.add_argument("--wait", action="store_true", help="With resume: wait for the job to finish first.")
+    bedrock_batch.add_argument("--direct", action="store_true",
+                               help="With submit: invoke the model directly when there are too few records for a batch job.")
+    bedrock_batch.set_defaults(func=run_bedrock_batch)
+
+    args = parser.parse_args(argv)
+    config_path = args.config or ConfigLoader.find_config_file()
+    if config_path:
+        ConfigLoader.load_config(config_path)
+    if hasattr(args, "queue"):
+        args.queue = args.queue or os.getenv("WORKER_QUEUE")
+        if not args.queue:
+            parser.error("--queue or WORKER_QUEUE is required")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 from .handler_factory import HandlerFactory
 from .abstract_handler import AbstractHandler
 from .base_handler import BaseHandler
+from .chain_runner import ChainRunner
+from .parallel_handler import ParallelHandler, MergeConflictError
+from .chain_template import ChainRegistry, ChainTemplate, ChainSpecError
 
-__all__ = ['HandlerFactory', 'AbstractHandler', 'BaseHandler']
\ No newline at end of file
+__all__ = ['HandlerFactory', 'AbstractHandler', 'BaseHandler', 'ChainRunner', 'ParallelHandler', 'MergeConflictError', 'ChainRegistry', 'ChainTemplate', 'ChainSpecError']
@@ -1,7 +1,57 @@
 from __future__ import annotations
+import contextvars
+import functools
 from abc import abstractmethod
 from typing import Any
 from .base_handler import BaseHandler
+from ..utils.executors import run_in_thread, run_in_process, process_pool_enabled
+from ..utils import metrics
+from ..utils import result_cache
+from ..utils import spill
+from ..utils.text_stream import materialize_lazy_values
+
+# Set while a single stage is executed on its own (see AbstractHandler.run_stage).
+# The default chaining behaviour in handle() checks it to stop after the current
+# handler instead of recursing into the rest of the chain.
+_stage_state = contextvars.ContextVar("awschain_stage_state", default=None)
+
+
+class _StageState:
+    __slots__ = ("forwarded",)
+
+    def __init__(self):
+        self.forwarded = False
+
+
+def _instrument(handle):
+    # Wraps a subclass handle method so each stage is measured when metrics are
+    # enabled and served from the result cache when the handler opts in.
+    # super().handle calls within the same handler reuse its recorder.
+    @functools.wraps(handle)
+    def instrumented_handle(self, request):
+        stage = metrics.current_stage()
+        if stage is not None and stage.handler is self:
+            return handle(self, request)
+        if not self.accepts_lazy_text:
+            # Streamed or spilled values become plain str for handlers that have not opted in.
+            materialize_lazy_values(request)
+        if not metrics.metrics_enabled(request):
+            return result_cache.call_with_cache(handle, self, request, AbstractHandler.handle)
+        stage = metrics.StageRecorder(self, request)
+        token = metrics.set_current_stage(stage)
+        try:
+            result = result_cache.call_with_cache(handle, self, request, AbstractHandler.handle)
+        except Exception as e:
+            stage.finish(error=e)
+            raise
+        finally:
+            metrics.reset_current_stage(token)
+        stage.finish(result)
+        return result
+
+    instrumented_handle.__awschain_instrumented__ = True
+    return instrumented_handle
+
 
 class AbstractHandler(BaseHandler):
     """
@@ -11,6 +61,43 @@ class AbstractHandler(BaseHandler):
 
     _next_handler: Handler = None
 
+    # Number of requests grouped into one micro-batch by handle_batch. Handlers
+    # with batch-capable backends raise it and override process_batch.
+    batch_size: int = 1
+
+    # CPU-bound handlers (parsing, NLP) are run in a worker process by ahandle
+    # so they do not serialize on the GIL. They must keep their results in the
+    # request, not on the handler instance.
+    cpu_bound: bool = False
+
+    # Handlers that read LazyText values (TextStream, SpilledText) themselves,
+    # through iter_chunks or write_to. Every other handler gets those values
+    # as str, and large texts are only spilled ahead of handlers that opt in.
+    accepts_lazy_text: bool = False
+
+    # Result cache opt-in (see utils/result_cache.py): the request fields the
+    # output depends on, which of them name local files to hash by content, the
+    # environment variables (model, prompt settings...) that change the output,
+    # and a version to bump when the handler's logic changes. Inputs outside the
+    # request, such as the version of an S3 object, come from cache_key_extra.
+    cache_key_fields: tuple = None
+    cache_file_fields: tuple = ()
+    cache_config_vars: tuple = ()
+    cache_version: int = 1
+
+    def cache_key_extra(self, request: dict):
+        """
+        Returns an input of the result cache key that is not in the request, such
+        as the version of a remote object, or None when the request cannot be cached.
+        """
+        return ""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        handle = cls.__dict__.get("handle")
+        if handle is not None and not getattr(handle, "__awschain_instrumented__", False):
+            cls.handle = _instrument(handle)
+
     def set_next(self, handler: Handler) -> Handler:
         self._next_handler = handler
         # Returning a handler from here will let us link handlers in a
@@ -18,9 +105,163 @@ class AbstractHandler(BaseHandler):
         # local_file_handler.set_next(prompt_handler).set_next(summarization_handler)
         return handler
 
+    def get_next(self) -> Handler:
+        return self._next_handler
+
+    def iter_chain(self):
+        """
+        Yields this handler followed by every handler linked after it.
+        """
+        handler = self
+        while handler is not None:
+            yield handler
+            handler = getattr(handler, "_next_handler", None)
+
     @abstractmethod
     def handle(self, request: dict) -> dict:
+        # Reaching this point means the handler is done with the request.
+        result_cache.store_pending(self, request)
+        # Large texts go to disk between stages when a memory budget is set,
+        # if the next handler can read them from there.
+        if getattr(self._next_handler, "accepts_lazy_text", False):
+            spill.maybe_spill(request)
+
+        state = _stage_state.get()
+        if state is not None:
+            # Running a single stage: record that the handler wants the chain
+            # to continue and hand the request back to the caller.
+            state.forwarded = True
+            return request
+
+        if self._next_handler:
+            stage = metrics.current_stage()
+            if stage is None:
+                return self._next_handler.handle(request)
+            # Pause this stage's clocks while the rest of the chain runs.
+            stage.before_forward(request)
+            token = metrics.set_current_stage(None)
+            try:
+                return self._next_handler.handle(request)
+            finally:
+                metrics.reset_current_stage(token)
+                stage.after_forward()
+
+        return request
+
+    def handle_in_stages(self, request: dict) -> dict:
+        """
+        Runs the request through this handler and the rest of the chain one stage
+        at a time, like ahandle and handle_batch, instead of each handler calling
+        the next from inside its handle(). A handler's locals are released before
+        the next stage starts, so a large text it produced and that was spilled
+        (see utils/spill.py) is freed rather than kept alive until the chain returns.
+        """
+        handler = self
+        while handler is not None:
+            request, forwarded = handler.run_stage(request)
+            if not forwarded:
+                break
+            handler = handler.get_next()
+        return request
+
+    def run_stage(self, request: dict):
+        """
+        Runs only this handler on the request without passing it down the chain.
+        Returns a tuple of the resulting request and a flag telling whether the
+        handler forwarded the request (False means the handler ended the chain).
+        """
+        state = _StageState()
+        token = _stage_state.set(state)
+        try:
+            result = self.handle(request)
+        finally:
+            _stage_state.reset(token)
+        return result, state.forwarded
+
+    async def arun_stage(self, request: dict):
+        """
+        Asynchronous counterpart of run_stage: runs this handler in the shared
+        thread pool, or in the process pool when it is cpu_bound.
+        """
+        if self.cpu_bound and process_pool_enabled():
+            return await run_in_process(self, request)
+        return await run_in_thread(self.run_stage, request)
+
+    def handle_batch(self, requests) -> list:
+        """
+        Runs a batch of requests through this handler and the rest of the chain,
+        reusing the same handler instances, and returns the results in input order.
+        """
+        return list(self.iter_batch(requests))
+
+    def iter_batch(self, requests):
+        """
+        Lazily runs requests through the chain and yields each result as soon as
+        it leaves the last handler. Every stage groups up to batch_size requests
+        into a micro-batch and streams finished items to the next stage without
+        waiting for the rest of the batch.
+        """
+        items = ((request, True) for request in requests)
+        for handler in self.iter_chain():
+            items = handler._stream_batch(items)
+        for request, _ in items:
+            yield request
+
+    def process_batch(self, requests: list) -> list:
+        """
+        Processes one micro-batch for this stage only and returns the requests in
+        the same order. Handlers backed by batch APIs override this method; the
+        default runs the stage on each request in turn.
+        """
+        return [self.run_stage(request)[0] for request in requests]
+
+    def _stream_batch(self, items):
+        # items are (request, active) pairs; inactive requests were ended by an
+        # earlier handler and only pass through, keeping their position.
+        pending = []
+        active = 0
+        for item in items:
+            pending.append(item)
+            if item[1]:
+                active += 1
+            if active >= max(1, self.batch_size):
+                yield from self._flush_batch(pending)
+                pending = []
+                active = 0
+        if pending:
+            yield from self._flush_batch(pending)
+
+    def _flush_batch(self, pending):
+        requests = [request for request, active in pending if active]
+        if type(self).process_batch is AbstractHandler.process_batch:
+            # Per-item fallback keeps the early-return semantics of handle().
+            outcomes = iter([self.run_stage(request) for request in requests])
+        else:
+            outcomes = iter([(request, True) for request in self.process_batch(requests)])
+        for request, active in pending:
+            if active:
+                yield next(outcomes)
+            else:
+                yield request, False
+
+    async def ahandle(self, request: dict) -> dict:
+        """
+        Asynchronous counterpart of handle.
+
+        The default implementation adapts synchronous handlers: the handle method
+        of this stage runs in a worker thread, so blocking boto3 calls do not hold
+        the event loop, or in a worker process for cpu_bound handlers, and the
+        next handler is awaited afterwards. Native async
+        handlers override this method and finish with
+        `return await self.ahandle_next(request)`.
+        """
+        result, forwarded = await self.arun_stage(request)
+        if not forwarded:
+            return result
+        return await self.ahandle_next(result)
+
+    async def ahandle_next(self, request: dict) -> dict:
         if self._next_handler:
-            return self._next_handler.handle(request)
+            return await self._next_handler.ahandle(request)
 
-        return request
\ No newline at end of file
+        return request
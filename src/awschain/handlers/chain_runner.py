@@ -0,0 +1,59 @@
+import os
+import asyncio
+from .abstract_handler import AbstractHandler
+from ..utils.checkpoint import arun_resumable
+
+class ChainRunner:
+    """
+    Runs many requests through a handler chain concurrently on a single asyncio
+    event loop.
+
+    The chain can be a handler instance shared by every request, or a callable
+    that receives the request and returns a freshly built chain. Use the latter
+    for handlers that keep per-request state on the instance (e.g. the PII
+    tokenizer). Synchronous handlers are adapted through AbstractHandler.ahandle,
+    so their blocking calls run in the shared thread pool (ASYNC_MAX_WORKERS)
+    while the event loop keeps every other request moving.
+
+    With a CheckpointStore, each request is checkpointed after every stage and
+    resumes after its last completed stage when it is run again.
+    """
+
+    def __init__(self, chain, concurrency: int = None, checkpoints=None):
+        self.chain = chain
+        # Upper bound on the number of requests in flight at the same time.
+        self.concurrency = concurrency or int(os.getenv("ASYNC_MAX_CONCURRENCY", 1000))
+        self.checkpoints = checkpoints
+
+    def build_chain(self, request: dict) -> AbstractHandler:
+        if isinstance(self.chain, AbstractHandler):
+            return self.chain
+        return self.chain(request)
+
+    async def arun(self, request: dict) -> dict:
+        """
+        Runs a single request through the chain.
+        """
+        if self.checkpoints is not None:
+            return await arun_resumable(self.build_chain(request), request, self.checkpoints)
+        return await self.build_chain(request).ahandle(request)
+
+    async def arun_many(self, requests, return_exceptions: bool = False) -> list:
+        """
+        Runs all requests concurrently and returns their results in input order.
+        With return_exceptions=True a failing request yields its exception instead
+        of cancelling the whole run, mirroring asyncio.gather.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(request):
+            async with semaphore:
+                return await self.arun(request)
+
+        return await asyncio.gather(*(bounded(request) for request in requests), return_exceptions=return_exceptions)
+
+    def run(self, requests, return_exceptions: bool = False) -> list:
+        """
+        Synchronous entry point: starts an event loop and runs all requests on it.
+        """
+        return asyncio.run(self.arun_many(requests, return_exceptions=return_exceptions))
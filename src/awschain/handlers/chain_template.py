@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+from .handler_factory import HandlerFactory
+from .parallel_handler import ParallelHandler, MERGE_STRATEGIES
+from ..utils.config_loader import ConfigLoader
+from ..utils.lazy_import import lazy_import
+
+yaml = lazy_import("yaml", package="pyyaml")
+
+# Used when a chain specification does not define its own input_types table.
+# Rules with "prefix" or "contains" are checked in order first, then the file
+# extension is looked up among the "suffix" rules.
+DEFAULT_INPUT_TYPES = [
+    {"type": "youtube_url", "contains": ["youtube", "youtu.be"]},
+    {"type": "http", "prefix": ["http"]},
+    {"type": "s3", "prefix": ["s3://"]},
+    {"type": "quip", "prefix": ["quip://"]},
+    {"type": "multimedia_file", "suffix": [".mp3", ".mp4", ".m4a", ".wav", ".flac", ".mov", ".avi"]},
+    {"type": "pdf", "suffix": [".pdf"]},
+    {"type": "microsoft_word", "suffix": [".docx"]},
+    {"type": "microsoft_excel", "suffix": [".xlsx", ".xlsm", ".xltx", ".xltm"]},
+    {"type": "microsoft_pp", "suffix": [".pptx"]},
+    {"type": "image_file", "suffix": [".jpg", ".jpeg", ".png", ".tiff"]},
+    {"type": "text_or_json", "suffix": [".txt", ".json"]},
+]
+DEFAULT_INPUT_TYPE = "text_or_json"
+
+
+class ChainSpecError(ValueError):
+    """
+    Raised when a chain specification is malformed or refers to an unknown handler or chain.
+    """
+
+
+class InputTypeTable:
+    """
+    Maps a path or URL to an input type using prefix / substring rules and a
+    file extension lookup table.
+    """
+
+    def __init__(self, rules=None, default=DEFAULT_INPUT_TYPE):
+        self.default = default
+        self._ordered = []
+        self._extensions = {}
+        for rule in rules if rules is not None else DEFAULT_INPUT_TYPES:
+            if not isinstance(rule, dict) or "type" not in rule:
+                raise ChainSpecError(f"Input type rules need a 'type': {rule!r}")
+            unknown = set(rule) - {"type", "prefix", "contains", "suffix"}
+            if unknown:
+                raise ChainSpecError(f"Unknown keys in input type rule {rule['type']}: {sorted(unknown)}")
+            if "prefix" in rule or "contains" in rule:
+                self._ordered.append((rule["type"], tuple(rule.get("prefix", ())), tuple(rule.get("contains", ()))))
+            for suffix in rule.get("suffix", ()):
+                # The first rule listing an extension wins, as with an if/elif chain.
+                self._extensions.setdefault(suffix.lower(), rule["type"])
+
+    def lookup(self, path: str) -> str:
+        for input_type, prefixes, substrings in self._ordered:
+            if (prefixes and path.startswith(prefixes)) or any(substring in path for substring in substrings):
+                return input_type
+        extension = os.path.splitext(path)[1].lower()
+        return self._extensions.get(extension, self.default)
+
+
+class ChainTemplate:
+    """
+    A validated, compiled chain: handler classes are resolved once, so
+    build() only instantiates and links them. Every build() returns new
+    handler instances, as handlers may keep per-request state.
+    """
+
+    def __init__(self, name: str, steps: list):
+        self.name = name
+        # Each compiled step is (handler class, None) or (ParallelHandler, ([branch steps], merge)).
+        self._steps = steps
+
+    @property
+    def handler_names(self) -> list:
+        return [handler_class.__name__ for handler_class, _ in self._steps]
+
+    def build(self):
+        return self._link(self._steps)
+
+    @classmethod
+    def _link(cls, steps):
+        head = current = None
+        for handler_class, parallel in steps:
+            if parallel is None:
+                handler = handler_class()
+            else:
+                branches, merge = parallel
+                handler = ParallelHandler(*(cls._link(branch) for branch in branches), merge=merge)
+            if head is None:
+                head = current = handler
+            else:
+                current = current.set_next(handler)
+        return head
+
+
+class ChainRegistry:
+    """
+    Chains defined declaratively in YAML or JSON:
+
+        input_types:            # optional, defaults to DEFAULT_INPUT_TYPES
+          - {type: pdf, suffix: [.pdf]}
+        default_input_type: text_or_json
+        chains:
+          summarize:
+            - {handler: AmazonComprehendPIITokenizeHandler, when: anonymize}
+            - PromptHandler
+            - AmazonBedrockHandler
+          pdf:
+            - PDFReaderHandler
+            - include: summarize
+            - parallel: [[AmazonComprehendInsightsHandler], [LocalFileWriterHandler]]
+              merge: last
+
+    A step is a handler name, {handler: Name}, {include: chain} or
+    {parallel: [[steps], ...], merge: strategy}; any step can carry
+    when / unless naming an option passed to build(). The specification is
+    validated on load and each (chain, options) pair is compiled once.
+    """
+
+    def __init__(self, spec: dict):
+        if not isinstance(spec, dict) or not isinstance(spec.get("chains"), dict):
+            raise ChainSpecError("A chain specification needs a 'chains' mapping.")
+        self.chains = spec["chains"]
+        self.input_types = InputTypeTable(spec.get("input_types"), spec.get("default_input_type", DEFAULT_INPUT_TYPE))
+        self._templates = {}
+        self._lock = threading.Lock()
+        for name in self.chains:
+            self._validate(name, self.chains[name], (name,))
+
+    @classmethod
+    def from_file(cls, path: str) -> "ChainRegistry":
+        with open(path, "r") as file:
+            if path.endswith(".json"):
+                spec = json.load(file)
+            else:
+                spec = yaml.safe_load(file)
+        return cls(spec)
+
+    @classmethod
+    def load(cls, path: str = None) -> "ChainRegistry":
+        """
+        Loads CHAINS_FILE, or chains.yaml / chains.json next to config.yaml.
+        """
+        path = path or os.getenv("CHAINS_FILE")
+        if not path:
+            config_path = ConfigLoader.find_config_file()
+            directory = os.path.dirname(config_path) if config_path else os.getcwd()
+            for file_name in ("chains.yaml", "chains.yml", "chains.json"):
+                candidate = os.path.join(directory, file_name)
+                if os.path.exists(candidate):
+                    path = candidate
+                    break
+        if not path:
+            raise ChainSpecError("No chain specification found. Set CHAINS_FILE or add chains.yaml next to config.yaml.")
+        return cls.from_file(path)
+
+    def determine_input_type(self, path: str) -> str:
+        return self.input_types.lookup(str(path))
+
+    def template(self, name: str, **options) -> ChainTemplate:
+        """
+        Returns the compiled template of a chain for the given options, compiling it on first use.
+        """
+        if name not in self.chains:
+            raise ChainSpecError(f"Unknown chain: {name}")
+        key = (name, tuple(sorted((option, bool(value)) for option, value in options.items())))
+        template = self._templates.get(key)
+        if template is None:
+            with self._lock:
+                template = self._templates.get(key)
+                if template is None:
+                    template = ChainTemplate(name, self._compile(self.chains[name], options))
+                    if not template.handler_names:
+                        raise ChainSpecError(f"Chain {name} has no handlers for options {options}")
+                    self._templates[key] = template
+        return template
+
+    def build(self, name: str, **options):
+        """
+        Returns a new handler chain for the named chain.
+        """
+        return self.template(name, **options).build()
+
+    def build_for(self, path: str, **options):
+        """
+        Returns a new handler chain for the input type of path.
+        """
+        return self.build(self.determine_input_type(path), **options)
+
+    def _validate(self, name, steps, stack):
+        if not isinstance(steps, list):
+            raise ChainSpecError(f"Chain {name} must be a list of steps.")
+        for step in steps:
+            if isinstance(step, str):
+                step = {"handler": step}
+            if not isinstance(step, dict):
+                raise ChainSpecError(f"Invalid step in chain {name}: {step!r}")
+            kinds = [kind for kind in ("handler", "include", "parallel") if kind in step]
+            if len(kinds) != 1:
+                raise ChainSpecError(f"A step in chain {name} needs exactly one of handler, include or parallel: {step!r}")
+            unknown = set(step) - {"handler", "include", "parallel", "merge", "when", "unless"}
+            if unknown:
+                raise ChainSpecError(f"Unknown keys in a step of chain {name}: {sorted(unknown)}")
+            if "handler" in step and not HandlerFactory.has_handler(step["handler"]):
+                raise ChainSpecError(f"Unknown handler in chain {name}: {step['handler']}")
+            if "include" in step:
+                included = step["include"]
+                if included not in self.chains:
+                    raise ChainSpecError(f"Chain {name} includes unknown chain: {included}")
+                if included in stack:
+                    raise ChainSpecError(f"Chain {name} includes itself through: {' -> '.join(stack + (included,))}")
+                self._validate(included, self.chains[included], stack + (included,))
+            if "parallel" in step:
+                merge = step.get("merge", "error")
+                if merge not in MERGE_STRATEGIES:
+                    raise ChainSpecError(f"Unknown merge strategy in chain {name}: {merge}")
+                if not isinstance(step["parallel"], list) or not step["parallel"]:
+                    raise ChainSpecError(f"Parallel step in chain {name} needs a list of branches.")
+                for branch in step["parallel"]:
+                    self._validate(name, branch, stack)
+
+    def _compile(self, steps, options):
+        compiled = []
+        for step in steps:
+            if isinstance(step, str):
+                step = {"handler": step}
+            if "when" in step and not options.get(step["when"]):
+                continue
+            if "unless" in step and options.get(step["unless"]):
+                continue
+            if "handler" in step:
+                compiled.append((HandlerFactory.get_handler_class(step["handler"]), None))
+            elif "include" in step:
+                compiled.extend(self._compile(self.chains[step["include"]], options))
+            else:
+                branches = [self._compile(branch, options) for branch in step["parallel"]]
+                branches = [branch for branch in branches if branch]
+                if branches:
+                    compiled.append((ParallelHandler, (branches, step.get("merge", "error"))))
+        return compiled
@@ -0,0 +1,174 @@
+"""
+On-disk index of the handler classes defined in each source file, used by
+HandlerFactory so that handler discovery does not parse unchanged files.
+
+Two indexes are consulted:
+- a cache in AWSCHAIN_CACHE_DIR (default ~/.cache/awschain), keyed by absolute
+  path and validated by file mtime and size, so a warm start only stats files;
+- an index bundled with the package at build time (see build_index), keyed by
+  path relative to the handlers package and validated by a content hash.
+
+This module only depends on the standard library so setup.py can load it
+without importing awschain.
+"""
+import ast
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import tempfile
+
+INDEX_VERSION = 1
+INDEX_FILE_NAME = "handler_index.json"
+BUNDLED_INDEX_PATH = pathlib.Path(__file__).parent / INDEX_FILE_NAME
+
+
+def index_enabled() -> bool:
+    return os.getenv("AWSCHAIN_DISCOVERY_INDEX", "true").lower() in ("true", "1")
+
+
+def cache_dir() -> pathlib.Path:
+    configured = os.getenv("AWSCHAIN_CACHE_DIR")
+    if configured:
+        return pathlib.Path(configured)
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return pathlib.Path(base) / "awschain"
+
+
+def find_handler_classes(path) -> list:
+    """
+    Parses a Python source file and returns the names of the classes that
+    directly extend AbstractHandler.
+    """
+    with open(path, "r") as file:
+        node = ast.parse(file.read(), filename=pathlib.Path(path).name)
+
+    names = []
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, ast.ClassDef):
+            for base in child.bases:
+                if (isinstance(base, ast.Attribute) and base.attr == 'AbstractHandler') or \
+                   (isinstance(base, ast.Name) and base.id == 'AbstractHandler'):
+                    names.append(child.name)
+                    break
+    return names
+
+
+def _sha1(path) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def _read_json(path) -> dict:
+    try:
+        with open(path, "r") as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def _write_json(path: pathlib.Path, files: dict):
+    # Write to a temporary file and rename it so concurrent readers never see a partial index.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump({"version": INDEX_VERSION, "files": files}, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class DiscoveryIndex:
+    """
+    Maps source files to the handler classes they define. Call handlers_in for
+    every file found during discovery, then save to persist new entries.
+    """
+
+    def __init__(self, path=None, bundled_path=BUNDLED_INDEX_PATH, package_root=None):
+        self.path = pathlib.Path(path) if path else cache_dir() / INDEX_FILE_NAME
+        self.package_root = pathlib.Path(package_root) if package_root else BUNDLED_INDEX_PATH.parent
+        self._files = _read_json(self.path)
+        self._bundled = _read_json(bundled_path) if bundled_path else {}
+        self._seen = set()
+        self._dirty = False
+
+    def handlers_in(self, path: pathlib.Path) -> list:
+        key = str(path.resolve())
+        self._seen.add(key)
+        stat = path.stat()
+        entry = self._files.get(key)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["handlers"]
+
+        handlers = self._bundled_handlers(path, stat)
+        if handlers is None:
+            handlers = find_handler_classes(path)
+        self._files[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "handlers": handlers}
+        self._dirty = True
+        return handlers
+
+    def _bundled_handlers(self, path: pathlib.Path, stat):
+        try:
+            relative = path.resolve().relative_to(self.package_root.resolve()).as_posix()
+        except ValueError:
+            return None
+        entry = self._bundled.get(relative)
+        if entry and entry["size"] == stat.st_size and entry["sha1"] == _sha1(path):
+            return entry["handlers"]
+        return None
+
+    def forget_missing(self, root_path: pathlib.Path):
+        """
+        Drops entries under root_path for files that were not seen since the index was loaded.
+        """
+        root = str(root_path.resolve()) + os.sep
+        for key in [key for key in self._files if key.startswith(root) and key not in self._seen]:
+            del self._files[key]
+            self._dirty = True
+
+    def save(self):
+        """
+        Persists the index if it changed. Failing to write (read-only home
+        directory, for example) only costs the next start a re-parse.
+        """
+        if not self._dirty:
+            return False
+        try:
+            _write_json(self.path, self._files)
+        except OSError:
+            return False
+        self._dirty = False
+        return True
+
+
+def build_index(package_root=None, output_path=None) -> pathlib.Path:
+    """
+    Writes the bundled index for the handler files under package_root
+    (the handlers package by default). Run at build time so installed
+    packages never parse their own handler files.
+    """
+    package_root = pathlib.Path(package_root) if package_root else BUNDLED_INDEX_PATH.parent
+    output_path = pathlib.Path(output_path) if output_path else package_root / INDEX_FILE_NAME
+    files = {}
+    for path in sorted(package_root.rglob('*.py')):
+        if path.name == '__init__.py':
+            continue
+        files[path.relative_to(package_root).as_posix()] = {
+            "size": path.stat().st_size,
+            "sha1": _sha1(path),
+            "handlers": find_handler_classes(path),
+        }
+    _write_json(output_path, files)
+    return output_path
+
+
+if __name__ == "__main__":
+    # python -m awschain.handlers.discovery_index [package_root] [output_path]
+    print(build_index(*sys.argv[1:3]))
@@ -1,8 +1,8 @@
-import ast
 import pathlib
 import importlib.util
 import os
 from .abstract_handler import AbstractHandler
+from .discovery_index import DiscoveryIndex, find_handler_classes, index_enabled
 
 class HandlerFactory:
     _handlers = {}
@@ -24,19 +24,25 @@ class HandlerFactory:
         cls._handler_paths.clear()
         cls._custom_handler_files.clear()
 
+        # The discovery index lets unchanged files be skipped instead of parsed.
+        index = DiscoveryIndex() if index_enabled() else None
+
         # Discover handlers inside the package
         package_handlers_root = pathlib.Path(__file__).parent
-        cls._search_for_handlers_in_path(package_handlers_root)
+        cls._search_for_handlers_in_path(package_handlers_root, index=index)
 
         # Check for custom handlers path in environment variable
         custom_handlers_path = os.getenv('custom_handlers_path')
         if custom_handlers_path:
             cls._debug(f"Searching for custom handlers in: {custom_handlers_path}")
             custom_handlers_root = pathlib.Path(custom_handlers_path)
-            cls._search_for_handlers_in_path(custom_handlers_root, custom=True)
+            cls._search_for_handlers_in_path(custom_handlers_root, custom=True, index=index)
+
+        if index is not None and index.save():
+            cls._debug(f"Handler discovery index updated: {index.path}")
 
     @classmethod
-    def _search_for_handlers_in_path(cls, root_path, custom=False):
+    def _search_for_handlers_in_path(cls, root_path, custom=False, index=None):
         """
         Helper method to search for handlers in a given path.
         If custom is True, handlers are considered as external/custom.
@@ -49,31 +55,40 @@ class HandlerFactory:
             if path.name == '__init__.py':
                 continue
 
-            # Read the content of the Python file
-            with open(path, 'r') as file:
-                node = ast.parse(file.read(), filename=path.name)
-
-            # Traverse the AST to find class definitions that extend AbstractHandler
-            for child in ast.iter_child_nodes(node):
-                if isinstance(child, ast.ClassDef):
-                    for base in child.bases:
-                        if (isinstance(base, ast.Attribute) and base.attr == 'AbstractHandler') or \
-                           (isinstance(base, ast.Name) and base.id == 'AbstractHandler'):
-                            handler_name = child.name
-                            if custom:
-                                # Store the actual file path for custom handlers
-                                cls._custom_handler_files[handler_name] = path
-                                cls._debug(f"Custom handler found: {handler_name} at {path}")
-                            else:
-                                # Calculate the module path relative to the package's handlers folder
-                                module_path_parts = path.relative_to(root_path.parent).with_suffix('').parts
-                                module_path = '.' + '.'.join(module_path_parts[1:])
-                                cls._handler_paths[handler_name] = module_path
-                                cls._debug(f"Handler found: {handler_name} at {module_path} (custom={custom})")
-                            break
+            handler_names = index.handlers_in(path) if index is not None else find_handler_classes(path)
+            for handler_name in handler_names:
+                if custom:
+                    # Store the actual file path for custom handlers
+                    cls._custom_handler_files[handler_name] = path
+                    cls._debug(f"Custom handler found: {handler_name} at {path}")
+                else:
+                    # Calculate the module path relative to the package's handlers folder
+                    module_path_parts = path.relative_to(root_path.parent).with_suffix('').parts
+                    module_path = '.' + '.'.join(module_path_parts[1:])
+                    cls._handler_paths[handler_name] = module_path
+                    cls._debug(f"Handler found: {handler_name} at {module_path} (custom={custom})")
+
+        if index is not None:
+            index.forget_missing(root_path)
+
+    @classmethod
+    def has_handler(cls, handler_type) -> bool:
+        """
+        Tells whether a handler with this name was discovered, without importing it.
+        """
+        if not cls._handlers and not cls._handler_paths and not cls._custom_handler_files:
+            cls.discover_handlers()
+        return handler_type in cls._handlers or handler_type in cls._handler_paths or handler_type in cls._custom_handler_files
 
     @classmethod
     def get_handler(cls, handler_type):
+        return cls.get_handler_class(handler_type)()
+
+    @classmethod
+    def get_handler_class(cls, handler_type):
+        """
+        Returns the handler class registered under handler_type, importing its module on first use.
+        """
         if not cls._handlers:
             cls.discover_handlers()
 
@@ -90,7 +105,7 @@ class HandlerFactory:
                     handler_class = getattr(module, handler_type)
                     if issubclass(handler_class, AbstractHandler):
                         cls._handlers[handler_type] = handler_class
-                        return handler_class()
+                        return handler_class
                     else:
                         raise ValueError(f"The class {handler_type} is not a subclass of AbstractHandler")
                 except Exception as e:
@@ -107,7 +122,7 @@ class HandlerFactory:
                     handler_class = getattr(module, handler_type)
                     if issubclass(handler_class, AbstractHandler):
                         cls._handlers[handler_type] = handler_class
-                        return handler_class()
+                        return handler_class
                     else:
                         raise ValueError(f"The class {handler_type} is not a subclass of AbstractHandler")
                 except ModuleNotFoundError as e:
@@ -116,4 +131,4 @@ class HandlerFactory:
 
             raise ValueError(f"Handler not found for type: {handler_type}")
 
-        return cls._handlers[handler_type]()
\ No newline at end of file
+        return cls._handlers[handler_type]
\ No newline at end of file
@@ -1,5 +1,7 @@
-import pyperclip
 from ..abstract_handler import AbstractHandler
+from ...utils.lazy_import import lazy_import
+
+pyperclip = lazy_import("pyperclip")
 
 class ClipboardWriterHandler(AbstractHandler):
     def handle(self, request: dict):      
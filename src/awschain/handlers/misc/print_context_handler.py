@@ -6,6 +6,9 @@ class PrintContextHandler(AbstractHandler):
     """
     Simple handler that only prints the request context.
     """
+    # Lazy text is printed by its repr, not read.
+    accepts_lazy_text = True
+
     def handle(self, request: dict) -> dict:
         print("============================================================")
         print(request)
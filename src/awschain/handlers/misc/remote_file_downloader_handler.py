@@ -1,7 +1,7 @@
 import os
 import urllib.request
-import boto3
 from ..abstract_handler import AbstractHandler
+from ...utils.aws_boto_client_manager import AWSBotoClientManager
 
 class RemoteFileDownloaderHandler(AbstractHandler):
 
@@ -38,6 +38,6 @@ class RemoteFileDownloaderHandler(AbstractHandler):
         local_filename = object_key.split('/')[-1]
         local_path = os.path.join(os.getenv('DIR_STORAGE', './downloads'), local_filename)
 
-        s3_client = boto3.client('s3')
+        s3_client = AWSBotoClientManager.get_client('s3')
         s3_client.download_file(bucket_name, object_key, local_path)
         return local_path
\ No newline at end of file
@@ -0,0 +1,108 @@
+import copy
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .abstract_handler import AbstractHandler
+from ..utils.metrics import METRICS_KEY
+
+MERGE_STRATEGIES = ("error", "first", "last", "collect")
+
+
+class MergeConflictError(ValueError):
+    """
+    Raised when two branches of a ParallelHandler change the same request key
+    to different values and the merge strategy is "error".
+    """
+
+
+class ParallelHandler(AbstractHandler):
+    """
+    Fans a request out to independent branches, runs them concurrently and
+    merges their results before passing the request to the next handler.
+
+    Each branch is an ordinary handler chain and receives its own deep copy of
+    the request, so branches never observe each other's changes. Only keys a
+    branch added or changed are merged back. When several branches change the
+    same key to different values the merge strategy decides:
+
+    - "error" (default): raise MergeConflictError
+    - "first" / "last": keep the value of the first / last branch, in the order
+      the branches were added
+    - "collect": store the list of values from all branches that changed the key
+    - a callable(key, values) returning the merged value
+
+    Keys removed by a branch are not removed from the merged request.
+
+    Example:
+        fan_out = ParallelHandler(insights, pii_classifier, rekognition)
+        reader.set_next(fan_out).set_next(writer)
+    """
+
+    def __init__(self, *branches, merge="error"):
+        if not callable(merge) and merge not in MERGE_STRATEGIES:
+            raise ValueError(f"Unknown merge strategy: {merge}. Use one of {MERGE_STRATEGIES} or a callable.")
+        self.branches = list(branches)
+        self.merge = merge
+
+    def add_branch(self, handler: AbstractHandler) -> "ParallelHandler":
+        self.branches.append(handler)
+        return self
+
+    def handle(self, request: dict) -> dict:
+        if self.branches:
+            snapshot = copy.deepcopy(request)
+            # A private pool per fan-out: branches may themselves run inside the
+            # shared worker pool, and waiting on that pool from one of its own
+            # threads could deadlock under load. Threads started by submit() do
+            # not inherit context variables, so each branch runs as a full chain.
+            with ThreadPoolExecutor(max_workers=len(self.branches), thread_name_prefix="awschain-branch") as executor:
+                futures = [executor.submit(branch.handle, copy.deepcopy(snapshot)) for branch in self.branches]
+                results = [future.result() for future in futures]
+            self.merge_results(request, snapshot, results)
+
+        return super().handle(request)
+
+    async def ahandle(self, request: dict) -> dict:
+        if self.branches:
+            snapshot = copy.deepcopy(request)
+            results = await asyncio.gather(*(branch.ahandle(copy.deepcopy(snapshot)) for branch in self.branches))
+            self.merge_results(request, snapshot, results)
+
+        return await self.ahandle_next(request)
+
+    def merge_results(self, request: dict, snapshot: dict, results: list) -> dict:
+        """
+        Merges the keys changed by each branch into the request, in place.
+        """
+        changes = {}
+        known_records = len(snapshot.get(METRICS_KEY) or [])
+        for result in results:
+            if result is None:
+                continue
+            # Stage measurements from every branch are kept, not merged as a value.
+            records = result.get(METRICS_KEY) or []
+            if len(records) > known_records:
+                request.setdefault(METRICS_KEY, []).extend(records[known_records:])
+            for key, value in result.items():
+                if key == METRICS_KEY:
+                    continue
+                if key not in snapshot or snapshot[key] != value:
+                    changes.setdefault(key, []).append(value)
+
+        for key, values in changes.items():
+            request[key] = self.resolve(key, values)
+        return request
+
+    def resolve(self, key, values: list):
+        if callable(self.merge):
+            return self.merge(key, values)
+        if self.merge == "collect":
+            return values
+        if self.merge == "first":
+            return values[0]
+        if self.merge == "last":
+            return values[-1]
+
+        first = values[0]
+        if any(value != first for value in values[1:]):
+            raise MergeConflictError(f"Branches produced conflicting values for request key '{key}'.")
+        return first
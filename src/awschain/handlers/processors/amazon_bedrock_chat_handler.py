@@ -1,32 +1,103 @@
+import os
 import sys
 from ..abstract_handler import AbstractHandler
-from ...utils.bedrock import invoke_model
+from ...utils.bedrock import invoke_model, invoke_model_stream, streaming_enabled, get_invocation_plan
+from ...utils.chat_context import ChatContext
+from ...utils.embeddings import BedrockEmbedder
+from ...utils.text_stream import LazyText
+from ...utils.vector_index import VectorIndex
 import json
 
+# Characters of the document shown when the chat starts.
+PREVIEW_CHARS = 300
+
 class AmazonBedrockChatHandler(AbstractHandler):
-    
+    # Reads the document only when it is sent to the model (not with a vector index).
+    accepts_lazy_text = True
+
     def handle(self, request: dict) -> dict:
         
         print(f"Hello, I'm the Amazon Bedrock chat hanlder buddy.\n")
         
-        print(request.get("text"))      
-        print(f"\n\n------\nYou can ask any questions on the text above. To terminate the chat session, use Ctrl+C")
-        
-        chat_history = []
-        chat_history.append({"role": "user", "content": request['text']})
+        use_cache = request.get("use_cache", True) is not False
+        # What is resent each turn: see AMAZON_BEDROCK_CHAT_CONTEXT
+        # With a vector index (see AmazonBedrockEmbeddingsHandler) only the relevant chunks are sent.
+        retriever = self.retriever(request["vector_index"]) if request.get("vector_index") else None
+        document = None if retriever is not None else str(request.get("text") or "")
+        context = ChatContext.from_env(document, retriever=retriever)
+
+        if context.mode == "full" and retriever is None:
+            print(document)
+            print(f"\n\n------\nYou can ask any questions on the text above. To terminate the chat session, use Ctrl+C")
+        else:
+            # Bounded and retrieval chats are meant for long documents: only a preview is printed.
+            print(self.preview(request.get("text")))
+            print(f"\n\n------\nYou can ask any questions on this document. To terminate the chat session, use Ctrl+C")
         try: 
           while True:
               user_input = input("> ")              
-              chat_history.append({"role": "user", "content": user_input})
-              messages = json.dumps({"messages": chat_history})
-              # Assume summarize_text_with_bedrock is adapted to handle chat
-              response = invoke_model(messages)
-              
-              print(f"Model: {response}")
-              chat_history.append({"role": "assistant", "content": response})
+              context.add("user", user_input)
+              response = self.ask(context, streaming_enabled(request), use_cache)
+              if not streaming_enabled(request):
+                  print(f"Model: {response}")
+              context.add("assistant", response)
+              context.fold(lambda prompt: invoke_model(prompt, use_cache=use_cache))
         except KeyboardInterrupt:      
           exit_choice = input("\n ---------------- Terminating Chat Session ---------------- \n Type 'yes' to include the chat history for your next handler? ")
           if exit_choice == "yes":
-              request['text'] = json.dumps({"messages": chat_history})
+              request['text'] = json.dumps({"messages": context.transcript()})
         
         return super().handle(request)
+
+    def ask(self, context: ChatContext, stream: bool, use_cache: bool) -> str:
+        """
+        Sends the next turn: as a Messages API body with the document in the system prompt
+        when the context is bounded and the model supports it, else as one JSON prompt.
+        """
+        plan = get_invocation_plan()
+        if context.mode != "full" and plan.supports_messages:
+            body = context.messages_body(plan)
+            if stream:
+                return self.print_streamed(plan.invoke_body_stream(body, use_cache))
+            return plan.invoke_body(body, use_cache)
+        if stream:
+            return self.print_streamed(invoke_model_stream(context.prompt_text(), use_cache=use_cache))
+        return invoke_model(context.prompt_text(), use_cache=use_cache)
+
+    def preview(self, text) -> str:
+        """
+        Describes the document by its length and first PREVIEW_CHARS characters.
+        """
+        if isinstance(text, LazyText):
+            size = text.size_hint()
+            return f"Document of {size} characters" if size is not None else "Streamed document"
+        text = text or ""
+        more = "..." if len(text) > PREVIEW_CHARS else ""
+        return f"Document of {len(text)} characters:\n{text[:PREVIEW_CHARS]}{more}"
+
+    def retriever(self, directory: str):
+        """
+        Returns question -> the AMAZON_BEDROCK_CHAT_RETRIEVAL_TOP_K most relevant chunks
+        of the index in directory, in document order.
+        """
+        index = VectorIndex.open(directory)
+        # Questions are embedded like the index, whatever the current settings.
+        embedder = BedrockEmbedder.from_env(index.model_id, index.meta["dimensions"])
+        top_k = int(os.getenv("AMAZON_BEDROCK_CHAT_RETRIEVAL_TOP_K", 5))
+
+        def retrieve(question: str) -> list:
+            hits = index.search(embedder.embed_query(question), top_k)
+            return [chunk["text"].strip() for _, chunk in sorted(hits, key=lambda hit: hit[1]["start"])]
+        return retrieve
+
+    def print_streamed(self, tokens) -> str:
+        """
+        Prints the model's answer token by token as it arrives and returns the full answer.
+        """
+        print("Model: ", end="", flush=True)
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            print(token, end="", flush=True)
+        print()
+        return "".join(parts)
@@ -0,0 +1,28 @@
+import os
+from ..abstract_handler import AbstractHandler
+from ...utils.embeddings import BedrockEmbedder
+from ...utils.vector_index import VectorIndex, index_directory, index_key, retrieval_planner
+
+class AmazonBedrockEmbeddingsHandler(AbstractHandler):
+    """
+    Chunks request["text"], embeds the chunks with a Bedrock embedding model and stores
+    them in a local vector index. request["vector_index"] is set to the index directory,
+    which AmazonBedrockChatHandler uses to send only the relevant chunks each turn.
+    The text is passed on unchanged; an index of the same text, model, dimensions and chunking is reused.
+    """
+
+    def handle(self, request: dict) -> dict:
+        text = str(request.get("text") or "")
+        embedder = BedrockEmbedder.from_env()
+        planner = retrieval_planner()
+        directory = os.path.join(index_directory(), index_key(text, embedder.model_id, planner, embedder.dimensions))
+
+        if VectorIndex.exists(directory):
+            print(f"Reusing vector index {directory}")
+        else:
+            chunks = planner.plan(text)
+            print(f"Embedding {len(chunks)} chunks with {embedder.model_id}. Text Len:", len(text))
+            VectorIndex.build(directory, chunks, embedder)
+
+        request["vector_index"] = directory
+        return super().handle(request)
@@ -1,27 +1,192 @@
-from ...utils.bedrock import invoke_model
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from ...utils.bedrock import invoke_model, invoke_model_stream, streaming_enabled, use_response_cache
+from ...utils.text_stream import LazyText, TextStream, PromptedText
+from ...utils.chunking import ChunkPlanner
+from ...utils.bedrock_batch import batch_enabled, get_batch
 from ..abstract_handler import AbstractHandler
-import botocore.exceptions
+from ...utils.lazy_import import lazy_import
+
+botocore_exceptions = lazy_import("botocore.exceptions", package="boto3")
+
+DEFAULT_REDUCE_PROMPT = "Combine the following partial summaries of one document into a single summary:\n\n{input_text}"
+# Errors worth retrying a single chunk for, on top of the client's own retries.
+TRANSIENT_ERRORS = ("ThrottlingException", "ModelTimeoutException", "ModelNotReadyException",
+                    "ServiceUnavailableException", "InternalServerException")
 
 class AmazonBedrockHandler(AbstractHandler):
+    # Streamed text is summarized chunk by chunk (see summarize_stream).
+    accepts_lazy_text = True
+    # Result cache key: the prompt text and the model configuration.
+    cache_key_fields = ("text",)
+    cache_config_vars = ("AMAZON_BEDROCK_MODEL_ID", "AMAZON_BEDROCK_MODEL_PROPS", "AMAZON_BEDROCK_PROMPT_TEMPLATE",
+                         "AMAZON_BEDROCK_PROMPT_INPUT_VAR", "AMAZON_BEDROCK_OUTPUT_JSONPATH", "AMAZON_BEDROCK_STREAM_CHUNK_CHARS",
+                         "AMAZON_BEDROCK_STREAM_OUTPUT_JSONPATH", "AMAZON_BEDROCK_SUMMARIZE_MODE",
+                         "AMAZON_BEDROCK_MAX_INPUT_CHARS", "AMAZON_BEDROCK_REDUCE_PROMPT",
+                         "AMAZON_BEDROCK_MAX_INPUT_TOKENS", "AMAZON_BEDROCK_CHARS_PER_TOKEN", "AMAZON_BEDROCK_CHUNK_OVERLAP")
     
     def handle(self, request: dict) -> dict:
         text = request.get("text", None)
-        print("Summarizing text with Bedrock. Text Len:", len(text))
-        
-        summary = self.summarize_with_retry(text)
-        
+        if isinstance(text, LazyText) and not isinstance(text, TextStream):
+            # Spilled or file-backed text is read back, so it is summarized exactly like a str.
+            text = text.materialize()
+
+        if batch_enabled(request):
+            # The chain stops here and continues when the batch job's results are resumed.
+            prefix = suffix = ""
+            if isinstance(text, PromptedText):
+                # The prompt is repeated around every record's chunk of the source text.
+                prefix, suffix, text = text.prefix, text.suffix, text.source
+            text = str(text)
+            records = get_batch().enqueue(self, request, text, prefix, suffix)
+            print(f"Staged {len(records)} prompt(s) for a Bedrock batch job. Text Len:", len(text))
+            return request
+
+        # use_cache=False on the request also bypasses the Bedrock response cache.
+        with use_response_cache(request.get("use_cache", True) is not False):
+            if isinstance(text, TextStream):
+                print("Summarizing streamed text with Bedrock.")
+                summary = self.summarize_stream(text)
+            elif streaming_enabled(request):
+                print("Summarizing text with Bedrock (streamed response). Text Len:", len(text))
+                summary = self.summarize_streamed_response(text)
+            elif map_reduce_enabled():
+                print("Summarizing text with Bedrock (map-reduce). Text Len:", len(text))
+                summary = self.map_reduce(text)
+            else:
+                print("Summarizing text with Bedrock. Text Len:", len(text))
+                summary = self.summarize_with_retry(text)
+
         request.update({"text": summary})
         return super().handle(request)
 
     def summarize_with_retry(self, text: str) -> str:
         try:
             return invoke_model(text)
-        except botocore.exceptions.ClientError as e:
+        except botocore_exceptions.ClientError as e:
             if e.response['Error']['Code'] == 'ValidationException':
                 return self.chunk_and_summarize(text)
             else:
                 raise e
 
+    def summarize_streamed_response(self, text: str):
+        """
+        Returns the summary as a TextStream of tokens as the model produces them,
+        so downstream handlers (e.g. writers) can start before it is complete.
+        The stream is buffered: handlers that need the whole text still get it.
+        """
+        try:
+            return TextStream(invoke_model_stream(text), buffer=True)
+        except botocore_exceptions.ClientError as e:
+            if e.response['Error']['Code'] == 'ValidationException':
+                return self.map_reduce(text) if map_reduce_enabled() else self.chunk_and_summarize(text)
+            raise e
+
+    def summarize_stream(self, text: LazyText) -> str:
+        """
+        Summarizes streamed text one chunk of AMAZON_BEDROCK_STREAM_CHUNK_CHARS characters at a time,
+        so only one chunk is held in memory. A prompt from PromptHandler is repeated around every
+        chunk of its source text, and the partial summaries are combined like in map_reduce.
+        Text that fits in a single chunk is summarized in one call.
+        """
+        max_chars = int(os.getenv("AMAZON_BEDROCK_STREAM_CHUNK_CHARS", 100000))
+        if isinstance(text, PromptedText):
+            room = max(max_chars - len(text.prefix) - len(text.suffix), 1)
+            chunks = (text.prefix + chunk + text.suffix for chunk in text.source.rechunk(room).iter_chunks())
+        else:
+            chunks = text.rechunk(max_chars).iter_chunks()
+        summaries = [self.summarize_with_retry(chunk) for chunk in chunks]
+        if len(summaries) == 1:
+            return summaries[0]
+        return self.reduce_summaries(summaries, ChunkPlanner(max_chars))
+
+    def map_reduce(self, text: str) -> str:
+        """
+        Splits the text into chunks that fit one call (see ChunkPlanner.for_bedrock),
+        summarizes them concurrently (AMAZON_BEDROCK_MAP_CONCURRENCY calls at a time) and
+        combines the partial summaries with AMAZON_BEDROCK_REDUCE_PROMPT, in as many
+        rounds as needed for them to fit in one call.
+        """
+        planner = ChunkPlanner.for_bedrock()
+        summaries = self.summarize_chunks(planner.split(text) or [text])
+        if len(summaries) == 1:
+            return summaries[0]
+        return self.reduce_summaries(summaries, planner)
+
+    def reduce_summaries(self, summaries: list, planner: ChunkPlanner) -> str:
+        """
+        Combines partial summaries with AMAZON_BEDROCK_REDUCE_PROMPT, in as many rounds
+        as needed for each call to fit planner's limit.
+        """
+        reduce_prompt = os.getenv("AMAZON_BEDROCK_REDUCE_PROMPT") or DEFAULT_REDUCE_PROMPT
+        budget = max(planner.max_size - planner.measure(reduce_prompt), 1)
+        while len(summaries) > 1 and planner.measure("\n\n".join(summaries)) > budget:
+            groups = self.group_summaries(summaries, budget, planner.measure)
+            if len(groups) == len(summaries):
+                # Every partial summary fills a call on its own: nothing left to combine.
+                return "\n".join(summaries)
+            print(f"Reducing {len(summaries)} partial summaries in {len(groups)} groups")
+            reduced = iter(self.summarize_chunks([self.reduce_prompt(group, reduce_prompt) for group in groups if len(group) > 1]))
+            summaries = [next(reduced) if len(group) > 1 else group[0] for group in groups]
+        return self.summarize_chunk(self.reduce_prompt(summaries, reduce_prompt))
+
+    def summarize_chunks(self, chunks: list) -> list:
+        """
+        Summarizes the chunks concurrently, returning the summaries in order.
+        """
+        if len(chunks) == 1:
+            return [self.summarize_chunk(chunks[0])]
+        workers = min(int(os.getenv("AMAZON_BEDROCK_MAP_CONCURRENCY", 4)), len(chunks))
+        print(f"Summarizing {len(chunks)} chunks with Bedrock, {workers} at a time")
+        # A private pool, like ParallelHandler: this may already run on a shared pool
+        # thread. Each call runs in a copy of the caller's context so its AWS calls
+        # are recorded against this stage.
+        with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="awschain-bedrock") as executor:
+            futures = [executor.submit(contextvars.copy_context().run, self.summarize_chunk, chunk) for chunk in chunks]
+            return [future.result() for future in futures]
+
+    def summarize_chunk(self, chunk: str, depth: int = 0) -> str:
+        """
+        Summarizes one chunk. A chunk the model rejects as too long is split in two
+        and a chunk that hits a transient error is retried on its own
+        (AMAZON_BEDROCK_CHUNK_RETRIES times), keeping the results of the other chunks.
+        """
+        retries = int(os.getenv("AMAZON_BEDROCK_CHUNK_RETRIES", 2))
+        for attempt in range(retries + 1):
+            try:
+                return invoke_model(chunk)
+            except botocore_exceptions.ClientError as e:
+                code = e.response['Error']['Code']
+                if code == 'ValidationException':
+                    if depth >= 10 or len(chunk) < 2:
+                        raise RuntimeError("Failed to summarize text due to input length constraints after multiple attempts.")
+                    print(f"Chunk of {len(chunk)} characters is too long, splitting it in two")
+                    return "\n".join(self.summarize_chunk(part, depth + 1) for part in self.split_text(chunk, 2))
+                if code not in TRANSIENT_ERRORS or attempt == retries:
+                    raise e
+                print(f"Retrying chunk after {code} (attempt {attempt + 1} of {retries})")
+                time.sleep(min(2 ** attempt, 30))
+
+    def group_summaries(self, summaries: list, budget: int, measure=len) -> list:
+        """
+        Groups consecutive summaries so each group's text fits in budget (as counted by measure).
+        """
+        groups, size = [], 0
+        for summary in summaries:
+            summary_size = measure(summary) + measure("\n\n")
+            if groups and size + summary_size <= budget:
+                groups[-1].append(summary)
+                size += summary_size
+            else:
+                groups.append([summary])
+                size = measure(summary)
+        return groups
+
+    def reduce_prompt(self, summaries: list, template: str) -> str:
+        return template.replace("{input_text}", "\n\n".join(summaries))
+
     def chunk_and_summarize(self, text: str) -> str:
         max_attempts = 10
         num_chunks = 2
@@ -33,7 +198,7 @@ class AmazonBedrockHandler(AbstractHandler):
             try:
                 summaries = [invoke_model(chunk) for chunk in chunks]
                 return "\n".join(summaries)
-            except botocore.exceptions.ClientError as e:
+            except botocore_exceptions.ClientError as e:
                 if e.response['Error']['Code'] == 'ValidationException':
                     num_chunks *= 2  # Increase the number of chunks
                     attempt += 1
@@ -45,18 +210,10 @@ class AmazonBedrockHandler(AbstractHandler):
 
     def split_text(self, text: str, num_chunks: int) -> list:
         """
-        Splits the text into the specified number of chunks, respecting word boundaries.
+        Splits the text into about num_chunks chunks of equal size, at sentence or word boundaries.
         """
-        avg_chunk_length = len(text) // num_chunks
-        chunks = []
-        start = 0
-        
-        for _ in range(num_chunks - 1):
-            end = start + avg_chunk_length
-            while end < len(text) and text[end] != ' ':
-                end += 1
-            chunks.append(text[start:end].strip())
-            start = end
-        
-        chunks.append(text[start:].strip())
-        return chunks
+        max_size = max(-(-len(text) // num_chunks), 1)
+        return [chunk.strip() for chunk in ChunkPlanner(max_size).split(text)]
+
+def map_reduce_enabled() -> bool:
+    return os.getenv("AMAZON_BEDROCK_SUMMARIZE_MODE", "retry").lower() == "map_reduce"
@@ -1,12 +1,28 @@
+import contextvars
 from ..abstract_handler import AbstractHandler
 from ...utils.aws_boto_client_manager import AWSBotoClientManager
+from ...utils.chunking import ChunkPlanner
+from ...utils import result_cache
+from ...utils.text_stream import materialize_lazy_values
+
+# Insights computed by process_batch, by id() of the request, for handle() to pick up.
+_batch_insights = contextvars.ContextVar("awschain_batch_insights", default=None)
 
 class AmazonComprehendInsightsHandler(AbstractHandler):
+
+    # Amazon Comprehend batch APIs accept up to 25 documents per call.
+    batch_size = 25
+    # Result cache key (batched requests go through handle() too).
+    cache_key_fields = ("text",)
+    max_bytes = 3000  # Amazon Comprehend's size limit of 5000kb for various operations
     
     def handle(self, request: dict) -> dict:
-        
+        batch_insights = _batch_insights.get()
+        if batch_insights is not None and id(request) in batch_insights:
+            request.update({"text": batch_insights[id(request)]})
+            return super().handle(request)
+
         self.comprehend = AWSBotoClientManager.get_client('comprehend')
-        self.max_bytes = 3000  # Amazon Comprehend's size limit of 5000kb for various operations
         
         print("Extracting insights from text...")
         text = request.get("text", None)    
@@ -20,43 +36,101 @@ class AmazonComprehendInsightsHandler(AbstractHandler):
                 entities.extend(self.detect_entities(chunk))
                 key_phrases.extend(self.detect_key_phrases(chunk))
             
-            # Aggregate the insights and append to the request object
-            aggregated_data = {
-                "sentiment": max(set(sentiments), key=sentiments.count),  # Aggregation by most frequent sentiment
-                "entities": entities,  # Entities from all chunks
-                "key_phrases": key_phrases  # Key phrases from all chunks
-            }
-
             # updating the request body and adding the aggregated data.
-            request.update({"text": aggregated_data})
+            request.update({"text": self.aggregate_insights(sentiments, entities, key_phrases)})
             
         else:
             print("No text provided for insights extraction.")
 
         return super().handle(request)
 
-    def chunk_text(self, text):
+    def process_batch(self, requests: list) -> list:
         """
-        Breaks the text into chunks, each within the Amazon Comprehend size limit.
+        Extracts insights for a micro-batch of requests using the Comprehend batch APIs.
+        Chunks from all requests are packed together, 25 per call, instead of
+        issuing three calls per chunk. Requests the result cache can answer are left
+        out; then every request goes through handle(), for the cache, metrics and
+        the rest of the stage's bookkeeping.
         """
-        words = text.split()
+        if not requests:
+            return []
+        for request in requests:
+            materialize_lazy_values(request)
+        misses = [request for request in requests if not result_cache.is_cached(self, request)]
+        token = _batch_insights.set(self.batch_insights(misses) if misses else {})
+        try:
+            return [self.run_stage(request)[0] for request in requests]
+        finally:
+            _batch_insights.reset(token)
+
+    def batch_insights(self, requests: list) -> dict:
+        """
+        Returns the aggregated insights of each request with text, by id() of the request.
+        """
+        comprehend = AWSBotoClientManager.get_client('comprehend')
+
+        print(f"Extracting insights from {len(requests)} texts in batch...")
+        # (request index, chunk) for every chunk of every request that has text
         chunks = []
-        current_chunk = []
-        current_size = 0
-
-        for word in words:
-            word_size = len(word.encode('utf-8'))
-            if current_size + word_size <= self.max_bytes:
-                current_chunk.append(word)
-                current_size += word_size
+        for index, request in enumerate(requests):
+            text = request.get("text", None)
+            if text:
+                chunks.extend((index, chunk) for chunk in self.chunk_text(text))
             else:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [word]
-                current_size = word_size
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-        
-        return chunks
+                print("No text provided for insights extraction.")
+
+        sentiments = {}
+        entities = {}
+        key_phrases = {}
+        for start in range(0, len(chunks), self.batch_size):
+            group = chunks[start:start + self.batch_size]
+            text_list = [chunk for _, chunk in group]
+            owners = [index for index, _ in group]
+
+            for position, result in self.batch_detect(comprehend.batch_detect_sentiment, text_list):
+                sentiments.setdefault(owners[position], []).append(result.get("Sentiment"))
+            for position, result in self.batch_detect(comprehend.batch_detect_entities, text_list):
+                entities.setdefault(owners[position], []).extend(
+                    {"Text": entity["Text"], "Type": entity["Type"], "Score": entity["Score"]} for entity in result.get("Entities", []))
+            for position, result in self.batch_detect(comprehend.batch_detect_key_phrases, text_list):
+                key_phrases.setdefault(owners[position], []).extend(
+                    {"Text": phrase["Text"], "Score": phrase["Score"]} for phrase in result.get("KeyPhrases", []))
+
+        return {id(requests[index]): self.aggregate_insights(
+                    sentiments.get(index, [None]), entities.get(index, []), key_phrases.get(index, []))
+                for index in sorted({index for index, _ in chunks})}
+
+    def batch_detect(self, operation, text_list):
+        """
+        Calls a Comprehend batch operation and yields (position, result) for every
+        document that succeeded. Failed documents are reported and skipped, like
+        the errors of the single-document calls.
+        """
+        try:
+            response = operation(TextList=text_list, LanguageCode='en')
+        except Exception as e:
+            print(f"Error calling {operation.__name__}: {e}")
+            return
+        for error in response.get("ErrorList", []):
+            print(f"Error in document {error.get('Index')}: {error.get('ErrorMessage')}")
+        for result in response.get("ResultList", []):
+            yield result["Index"], result
+
+    def aggregate_insights(self, sentiments, entities, key_phrases):
+        """
+        Aggregates the insights of all chunks of a text.
+        """
+        return {
+            "sentiment": max(set(sentiments), key=sentiments.count),  # Aggregation by most frequent sentiment
+            "entities": entities,  # Entities from all chunks
+            "key_phrases": key_phrases  # Key phrases from all chunks
+        }
+
+    def chunk_text(self, text):
+        """
+        Breaks the text into chunks, each within the Amazon Comprehend size limit.
+        """
+        return ChunkPlanner(self.max_bytes, unit="bytes").split(text)
 
     def detect_sentiment(self, text):
         """
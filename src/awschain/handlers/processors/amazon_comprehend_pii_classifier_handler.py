@@ -1,7 +1,10 @@
 from ..abstract_handler import AbstractHandler
 from ...utils.aws_boto_client_manager import AWSBotoClientManager
+from ...utils.chunking import ChunkPlanner
 
 class AmazonComprehendPIIClassifierHandler(AbstractHandler):
+    # Result cache key: the text being classified.
+    cache_key_fields = ("text",)
     
     def handle(self, request: dict) -> dict:
         self.comprehend = AWSBotoClientManager.get_client('comprehend')
@@ -23,8 +26,8 @@ class AmazonComprehendPIIClassifierHandler(AbstractHandler):
         """
         Classifies text to detect PII and identify the types of PII found.
         """
-        max_length = 5000  # character length, adjust based on the encoding
-        chunks = [text[i:i + max_length] for i in range(0, len(text), max_length)]
+        # Chunks of at most 5000 UTF-8 bytes, cut between words rather than inside them
+        chunks = ChunkPlanner(5000, unit="bytes").split(text)
         detected_pii_types = set()
 
         for chunk in chunks:
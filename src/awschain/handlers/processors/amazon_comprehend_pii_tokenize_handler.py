@@ -2,8 +2,12 @@ import os
 import json
 from ..abstract_handler import AbstractHandler
 from ...utils.aws_boto_client_manager import AWSBotoClientManager
+from ...utils.text_stream import LazyText, TextStream
+from ...utils.chunking import ChunkPlanner
 
 class AmazonComprehendPIITokenizeHandler(AbstractHandler):
+    # Streamed text is tokenized chunk by chunk.
+    accepts_lazy_text = True
     
     def handle(self, request: dict) -> dict:
         self.comprehend = AWSBotoClientManager.get_client('comprehend')
@@ -16,6 +20,14 @@ class AmazonComprehendPIITokenizeHandler(AbstractHandler):
         
         # Determine chunk size
         max_size = 99995  # AWS Comprehend limit in bytes
+
+        if isinstance(text, LazyText):
+            # Tokenize the streamed text chunk by chunk; the token map file is written once the stream is consumed
+            token_map_file = self.token_map_path()
+            request.update({"text": TextStream(self.tokenize_stream(text, max_size, token_map_file))})
+            request.update({"token_map": token_map_file})
+            return super().handle(request)
+
         chunks = self.chunk_text(text, max_size)
         
         pii_tokens = []
@@ -39,32 +51,12 @@ class AmazonComprehendPIITokenizeHandler(AbstractHandler):
 
     def chunk_text(self, text, max_size):
         """
-        Divides the text into chunks that are within the AWS Comprehend size limit.
-        Ensures that chunks end at complete words to avoid breaking entities.
+        Divides the text into chunks that are within the AWS Comprehend size limit (in UTF-8 bytes),
+        ending at sentence or word boundaries to avoid breaking entities. Each chunk's offset
+        is its exact position in the text.
         """
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        current_offset = 0
-        
-        for word in words:
-            word_size = len(word.encode('utf-8'))
-            if current_size + word_size + len(current_chunk) > max_size:
-                chunk_text = " ".join(current_chunk)
-                chunks.append({'text': chunk_text, 'offset': current_offset})
-                current_offset += len(chunk_text) + 1  # +1 for the space after the chunk
-                current_chunk = [word]
-                current_size = word_size
-            else:
-                current_chunk.append(word)
-                current_size += word_size
-        
-        if current_chunk:
-            chunk_text = " ".join(current_chunk)
-            chunks.append({'text': chunk_text, 'offset': current_offset})
-        
-        return chunks
+        return [{'text': chunk.text, 'offset': chunk.start}
+                for chunk in ChunkPlanner(max_size, unit="bytes").iter_chunks(text)]
 
     def generate_token(self):
         """
@@ -109,11 +101,28 @@ class AmazonComprehendPIITokenizeHandler(AbstractHandler):
             offset += len(token) - (end - start)
         return tokenized_text
 
-    def store_token_map(self, token_map):
+    def tokenize_stream(self, text, max_size, token_map_file):
+        """
+        Yields the streamed text with PII replaced by tokens, one Comprehend-sized chunk at a time.
+        """
+        token_map = {}
+        for chunk in text.rechunk(max_size, unit="bytes").iter_chunks():
+            chunk_pii_tokens, chunk_token_map = self.tokenize_pii(chunk)
+            token_map.update(chunk_token_map)
+            yield self.replace_pii_with_tokens(chunk, chunk_pii_tokens)
+        self.store_token_map(token_map, token_map_file)
+
+    def token_map_path(self):
+        """
+        Returns a new file path for a token map.
+        """
+        return os.path.join(self.storage_dir, f"token_map_{self.generate_token()}.json")
+
+    def store_token_map(self, token_map, file_path=None):
         """
         Stores the token map in a JSON file and returns the file path.
         """
-        file_path = os.path.join(self.storage_dir, f"token_map_{self.generate_token()}.json")
+        file_path = file_path or self.token_map_path()
         with open(file_path, 'w') as file:
             json.dump(token_map, file)
         return file_path
@@ -13,6 +13,7 @@ class AmazonComprehendPIIUntokenizeHandler(AbstractHandler):
             if token_map_file is None:
                 raise ValueError("Token map is missing, have you forgotten to tokenize first?")
 
+            # Streamed text arrives materialized, which also completes the token map file.
             text = request.get("text", None)
             token_map = self.load_token_map(token_map_file)
             untokenized_text = self.replace_tokens_with_pii(text, token_map)
@@ -1,11 +1,15 @@
 import os
 import json
-from PIL import Image
 from io import BytesIO
 from ..abstract_handler import AbstractHandler
 from ...utils.aws_boto_client_manager import AWSBotoClientManager
+from ...utils.lazy_import import lazy_import
+
+Image = lazy_import("PIL.Image", package="pillow")
 
 class AmazonRekognitionHandler(AbstractHandler):
+    # Does not read the text; it is passed on as it is.
+    accepts_lazy_text = True
 
     def handle(self, request: dict) -> dict:
         # Ensure metadata exists in the request
@@ -6,6 +6,11 @@ from ..abstract_handler import AbstractHandler
 from ...utils.aws_boto_client_manager import AWSBotoClientManager
 
 class AmazonTextractHandler(AbstractHandler):
+    # Replaces the text without reading it.
+    accepts_lazy_text = True
+    # Result cache key: the document, hashed by content when it is a local file.
+    cache_key_fields = ("path",)
+    cache_file_fields = ("path",)
     
     def handle(self, request: dict) -> dict:
         self.textract_client = AWSBotoClientManager.get_client('textract')
@@ -4,6 +4,25 @@ import json
 from ..abstract_handler import AbstractHandler
 from ...utils.aws_boto_client_manager import AWSBotoClientManager
 class AmazonTranscriptionHandler(AbstractHandler):
+    # Replaces the text without reading it.
+    accepts_lazy_text = True
+    # Result cache key: the S3 URI of the media file and its ETag (see cache_key_extra).
+    cache_key_fields = ("path",)
+
+    def cache_key_extra(self, request: dict):
+        """
+        The ETag of the media object, so a file re-uploaded under the same key is transcribed again.
+        """
+        s3_file_path = request.get("path") or ""
+        if not s3_file_path.startswith("s3://"):
+            return None
+        bucket, _, key = s3_file_path[len("s3://"):].partition("/")
+        try:
+            response = AWSBotoClientManager.get_client('s3').head_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            print(f"Not using the result cache for {s3_file_path}: {e}")
+            return None
+        return {"etag": response.get("ETag"), "version": response.get("VersionId")}
 
     def handle(self, request: dict) -> dict:
         s3_file_path = request.get("path")
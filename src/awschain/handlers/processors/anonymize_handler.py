@@ -1,8 +1,17 @@
-import spacy
 import os
+import threading
 from ..abstract_handler import AbstractHandler
+from ...utils.lazy_import import lazy_import
+
+spacy = lazy_import("spacy")
 
 class AnonymizeHandler(AbstractHandler):
+    # spaCy NER is CPU-bound; async chains run it in a worker process, which
+    # loads the model once and keeps it for later requests.
+    cpu_bound = True
+    # The spaCy model is loaded on first use and shared by all instances.
+    _nlp = None
+    _nlp_lock = threading.Lock()
     
     def handle(self, request: dict) -> dict:
       print("Starting Anonymization...")
@@ -19,12 +28,20 @@ class AnonymizeHandler(AbstractHandler):
         Anonymizes entities in the given text by replacing them with a specified replacement.
         """
 
-        # Load the spaCy model
-        nlp = spacy.load("en_core_web_sm")
-
-        doc = nlp(text)
+        doc = self.get_nlp()(text)
         anonymized_text = text
         for ent in doc.ents:
             if ent.label_ == "ORG":
                 anonymized_text = anonymized_text.replace(ent.text, replacement)
-        return anonymized_text    
\ No newline at end of file
+        return anonymized_text    
+
+    @classmethod
+    def get_nlp(cls):
+        """
+        Returns the spaCy model, loading it on the first call.
+        """
+        if cls._nlp is None:
+            with cls._nlp_lock:
+                if cls._nlp is None:
+                    cls._nlp = spacy.load("en_core_web_sm")
+        return cls._nlp
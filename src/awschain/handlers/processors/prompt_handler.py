@@ -1,11 +1,19 @@
 import os
 from ..abstract_handler import AbstractHandler
+from ...utils.text_stream import LazyText, PromptedText, TextStream
+from ...utils.bedrock_batch import batch_enabled
 
 class PromptHandler(AbstractHandler):
+    # Streamed text is wrapped in the prompt without being read.
+    accepts_lazy_text = True
         
     def handle(self, request: dict) -> dict:
         print("Constructing prompt...")
-        prompt = self.load_prompt(request.get("prompt_file_name", "default_prompt"), request.get("text", None))
+        text = request.get("text", None)
+        if isinstance(text, str) and batch_enabled(request):
+            # Kept apart from the template, so each batch record repeats the prompt (see BedrockBatch.enqueue).
+            text = TextStream([text], buffer=True)
+        prompt = self.load_prompt(request.get("prompt_file_name", "default_prompt"), text)
 
         request.update({"text": prompt})
         return super().handle(request)
@@ -19,9 +27,21 @@ class PromptHandler(AbstractHandler):
         try:
             with open(prompt_file_path, 'r', encoding='utf-8') as file:
                 prompt_template = file.read()
-                formatted_prompt = prompt_template.format(input_text=text)
+                formatted_prompt = self.format_prompt(prompt_template, text)
                 return formatted_prompt
         except FileNotFoundError:
             print(f"Prompt file '{prompt_file_name}.txt' not found. Using default prompt.")
             default_prompt = "Please provide a summary of the following text: {input_text}"
-            return default_prompt.format(input_text=text)
\ No newline at end of file
+            return self.format_prompt(default_prompt, text)
+
+    def format_prompt(self, prompt_template, text):
+        """
+        Formats the prompt template with the text. Streamed text is not materialized: the
+        result is a PromptedText stream of the template prefix, the text chunks and the suffix.
+        """
+        if not isinstance(text, LazyText):
+            return prompt_template.format(input_text=text)
+
+        marker = "\x00input_text\x00"
+        prefix, _, suffix = prompt_template.format(input_text=marker).partition(marker)
+        return PromptedText(prefix, text, suffix)
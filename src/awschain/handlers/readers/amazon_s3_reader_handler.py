@@ -1,5 +1,8 @@
+import codecs
+import os
 from ..abstract_handler import AbstractHandler
 from ...utils.aws_boto_client_manager import AWSBotoClientManager
+from ...utils.text_stream import TextStream
 class AmazonS3ReaderHandler(AbstractHandler):
 
     def handle(self, request: dict) -> dict:
@@ -11,12 +14,14 @@ class AmazonS3ReaderHandler(AbstractHandler):
 
         print(f"Reading content from s3://{s3_bucket}/{s3_object}")
 
-        file_content = self.read_file_content_from_s3(s3_object, s3_bucket)
+        if request.get("stream_text", False):
+            file_content = TextStream(self.iter_file_content_from_s3(s3_object, s3_bucket))
+        else:
+            file_content = self.read_file_content_from_s3(s3_object, s3_bucket)
         
         # Update request with the file content
         request.update({"text": file_content})
-        
-        print("REQUEST IS:", request)
+
         return super().handle(request)
 
     def read_file_content_from_s3(self, s3_object, bucket_name):
@@ -29,6 +34,23 @@ class AmazonS3ReaderHandler(AbstractHandler):
         
         return file_content
 
+    def iter_file_content_from_s3(self, s3_object, bucket_name):
+        """
+        Reads file content from an S3 bucket in chunks of S3_READ_CHUNK_SIZE bytes and yields it as text.
+        """
+        chunk_size = int(os.getenv('S3_READ_CHUNK_SIZE', 1024 * 1024))
+        s3_client = AWSBotoClientManager.get_client('s3')
+        s3_object = s3_client.get_object(Bucket=bucket_name, Key=s3_object)
+        # Incremental decoding keeps multi-byte characters split across chunks intact
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in s3_object['Body'].iter_chunks(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
     def parse_s3_path(self, s3_path):
         # Assumes s3_path format is "s3://bucket-name/path/to/object"
         _, _, bucket_name, object_key = s3_path.split('/', 3)
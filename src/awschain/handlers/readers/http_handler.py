@@ -1,11 +1,13 @@
 import os
 import json
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-import requests
-from pytube import YouTube
 from ..abstract_handler import AbstractHandler
 from ...utils.web_utils import fetch_webpage
+from ...utils.lazy_import import lazy_import
+
+BeautifulSoup = lazy_import("bs4", "BeautifulSoup", package="beautifulsoup4")
+requests = lazy_import("requests")
+YouTube = lazy_import("pytube", "YouTube")
 
 class HTTPHandler(AbstractHandler):
 
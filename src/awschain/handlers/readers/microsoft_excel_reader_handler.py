@@ -1,13 +1,16 @@
 import os
 import json
 import shutil
-from openpyxl import load_workbook
-from openpyxl.drawing.image import Image as ExcelImage
-from ..abstract_handler import AbstractHandler
-from PIL import Image
 import io
+from ..abstract_handler import AbstractHandler
+from ...utils.lazy_import import lazy_import
+
+load_workbook = lazy_import("openpyxl", "load_workbook")
+Image = lazy_import("PIL.Image", package="pillow")
 
 class MicrosoftExcelReaderHandler(AbstractHandler):
+    # Parsing the workbook is CPU-bound; async chains run it in a worker process.
+    cpu_bound = True
     
     def handle(self, request: dict) -> dict:
         print("Processing XLSX file...")
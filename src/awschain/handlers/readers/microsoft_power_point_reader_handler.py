@@ -1,9 +1,11 @@
 import os
 import json
 import shutil
-from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
 from ..abstract_handler import AbstractHandler
+from ...utils.lazy_import import lazy_import
+
+Presentation = lazy_import("pptx", "Presentation", package="python-pptx")
+MSO_SHAPE_TYPE = lazy_import("pptx.enum.shapes", "MSO_SHAPE_TYPE", package="python-pptx")
 
 class MicrosoftPowerPointReaderHandler(AbstractHandler):
     
@@ -1,10 +1,15 @@
 import os
 import json
 import shutil
-from docx import Document
 from ..abstract_handler import AbstractHandler
+from ...utils.text_stream import TextStream
+from ...utils.lazy_import import lazy_import
+
+Document = lazy_import("docx", "Document", package="python-docx")
 
 class MicrosoftWordReaderHandler(AbstractHandler):
+    # Parsing the document XML is CPU-bound; async chains run it in a worker process.
+    cpu_bound = True
     
     def handle(self, request: dict) -> dict:
         print("Processing DOCX file...")
@@ -68,27 +73,30 @@ class MicrosoftWordReaderHandler(AbstractHandler):
 
         extract_media = request.get("extract_media", False)
 
-        # Iterate through each paragraph and run in the document
-        for paragraph_id, paragraph in enumerate(document.paragraphs):
-            text_content += paragraph.text + '\n'
-            if extract_media:
+        if extract_media:
+            # Iterate through each paragraph and run in the document
+            for paragraph_id, paragraph in enumerate(document.paragraphs):
                 for run_id, run in enumerate(paragraph.runs):
                     extract_and_save_media(run, paragraph_id, source_type="paragraph", run_id=run_id)
 
-        # Iterate through each table in the document
-        for table_id, table in enumerate(document.tables):
-            for row_id, row in enumerate(table.rows):
-                for cell_id, cell in enumerate(row.cells):
-                    for paragraph_id, paragraph in enumerate(cell.paragraphs):
-                        text_content += paragraph.text + '\n'
-                        if extract_media:
+            # Iterate through each table in the document
+            for table_id, table in enumerate(document.tables):
+                for row_id, row in enumerate(table.rows):
+                    for cell_id, cell in enumerate(row.cells):
+                        for paragraph_id, paragraph in enumerate(cell.paragraphs):
                             for run_id, run in enumerate(paragraph.runs):
                                 extract_and_save_media(run, paragraph_id, source_type="table", table_id=table_id, row_id=row_id, cell_id=cell_id, run_id=run_id)
 
-        # Save the transcript to a text file
         transcript_file_path = os.path.join(output_folder, 'transcript.txt')
-        with open(transcript_file_path, 'w') as transcript_file:
-            transcript_file.write(text_content)
+        if request.get("stream_text", False):
+            # Paragraphs are yielded (and written to the transcript) as the text is consumed downstream
+            text_content = TextStream(self.iter_transcript(document, transcript_file_path))
+        else:
+            text_content = ''.join(self.iter_document_text(document))
+
+            # Save the transcript to a text file
+            with open(transcript_file_path, 'w') as transcript_file:
+                transcript_file.write(text_content)
 
         # Create metadata with traceability for graph database
         metadata = {
@@ -110,3 +118,25 @@ class MicrosoftWordReaderHandler(AbstractHandler):
 
         # Call the next handler in the chain
         return super().handle(request)
+
+    def iter_document_text(self, document):
+        """
+        Yields the text of every paragraph, first in the document body and then in the tables.
+        """
+        for paragraph in document.paragraphs:
+            yield paragraph.text + '\n'
+
+        for table in document.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    for paragraph in cell.paragraphs:
+                        yield paragraph.text + '\n'
+
+    def iter_transcript(self, document, transcript_file_path):
+        """
+        Yields the document text paragraph by paragraph, appending it to the transcript file.
+        """
+        with open(transcript_file_path, 'w') as transcript_file:
+            for paragraph_text in self.iter_document_text(document):
+                transcript_file.write(paragraph_text)
+                yield paragraph_text
@@ -1,11 +1,18 @@
 import os
 import json
 import shutil
-import fitz  # PyMuPDF
-from pdfminer.high_level import extract_text
 from ..abstract_handler import AbstractHandler
+from ...utils.text_stream import TextStream
+from ...utils.lazy_import import lazy_import
+
+fitz = lazy_import("fitz", package="PyMuPDF")
+extract_text = lazy_import("pdfminer.high_level", "extract_text", package="pdfminer.six")
+extract_pages = lazy_import("pdfminer.high_level", "extract_pages", package="pdfminer.six")
+pdfminer_layout = lazy_import("pdfminer.layout", package="pdfminer.six")
 
 class PDFReaderHandler(AbstractHandler):
+    # pdfminer parsing is CPU-bound; async chains run it in a worker process.
+    cpu_bound = True
 
     def handle(self, request: dict) -> dict:
         print("Processing PDF file...")
@@ -34,13 +41,17 @@ class PDFReaderHandler(AbstractHandler):
         original_file_path = os.path.join(output_folder, 'original.pdf')
         shutil.copy(pdf_path, original_file_path)
 
-        # Extract text from PDF
-        text_content = extract_text(pdf_path)
-        
-        # Save the transcript to a text file
         transcript_file_path = os.path.join(output_folder, 'transcript.txt')
-        with open(transcript_file_path, 'w') as transcript_file:
-            transcript_file.write(text_content)
+        if request.get("stream_text", False):
+            # Pages are extracted (and written to the transcript) as the text is consumed downstream
+            text_content = TextStream(self.iter_pages_text(pdf_path, transcript_file_path))
+        else:
+            # Extract text from PDF
+            text_content = extract_text(pdf_path)
+            
+            # Save the transcript to a text file
+            with open(transcript_file_path, 'w') as transcript_file:
+                transcript_file.write(text_content)
 
         # Extract images if requested
         if request.get("extract_media", False):
@@ -79,3 +90,14 @@ class PDFReaderHandler(AbstractHandler):
 
         # Call the next handler in the chain
         return super().handle(request)
+
+    def iter_pages_text(self, pdf_path, transcript_file_path):
+        """
+        Yields the text of the PDF one page at a time, appending each page to the transcript file.
+        Pages are separated by a form feed, like pdfminer's extract_text.
+        """
+        with open(transcript_file_path, 'w') as transcript_file:
+            for page_layout in extract_pages(pdf_path):
+                page_text = ''.join(element.get_text() for element in page_layout if isinstance(element, pdfminer_layout.LTTextContainer)) + '\f'
+                transcript_file.write(page_text)
+                yield page_text
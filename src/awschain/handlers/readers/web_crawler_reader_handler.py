@@ -1,7 +1,9 @@
 from ..abstract_handler import AbstractHandler
 from ...utils.web_utils import fetch_webpage, clean_html
-import requests
-from bs4 import BeautifulSoup
+from ...utils.lazy_import import lazy_import
+
+requests = lazy_import("requests")
+BeautifulSoup = lazy_import("bs4", "BeautifulSoup", package="beautifulsoup4")
 
 class WebCrawlerReaderHandler(AbstractHandler):
 
@@ -1,7 +1,9 @@
 import os
 from ..abstract_handler import AbstractHandler
-from pytubefix import YouTube
-import moviepy.editor as mp
+from ...utils.lazy_import import lazy_import
+
+YouTube = lazy_import("pytubefix", "YouTube")
+mp = lazy_import("moviepy.editor", package="moviepy")
 
 class YouTubeReaderHandler(AbstractHandler):
     def handle(self, request: dict) -> dict:
@@ -8,6 +8,8 @@ import os
 from utils.aws_boto_client_manager import AWSBotoClientManager
 
 class AmazonDataZoneAssetWriterHandler(AbstractHandler):
+    # Does not read the text; it is passed on as it is.
+    accepts_lazy_text = True
 
     def handle(self, request: dict) -> dict:
         domain_id = os.getenv("DATAZONE_DOMAIN_ID")
@@ -1,13 +1,27 @@
+import contextvars
 import datetime
 import os
 import time
 from typing import Dict
 from ..abstract_handler import AbstractHandler
 from ...utils.aws_boto_client_manager import AWSBotoClientManager
+from ...utils.text_stream import LazyText
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Set while process_batch uploads a micro-batch, which waits for consistency once
+# at the end. A context variable, so handle() calls on other threads still wait.
+_batch_upload = contextvars.ContextVar("awschain_s3_batch_upload", default=False)
 
 
 class AmazonS3WriterHandler(AbstractHandler):
+
+    batch_size = 16
+    # Streamed and spilled text is written to the upload file chunk by chunk.
+    accepts_lazy_text = True
+    # Seconds to wait after uploading, to allow for S3 eventual consistency.
+    consistency_delay = 5
+
     def handle(self, request: Dict) -> Dict:
         # Extracting data from request
         file_path = request.get("path")
@@ -50,6 +64,26 @@ class AmazonS3WriterHandler(AbstractHandler):
 
         return super().handle(request)
 
+    def process_batch(self, requests: list) -> list:
+        """
+        Uploads a micro-batch of requests concurrently and waits for S3 consistency
+        once per batch instead of once per file.
+        """
+        if not requests:
+            return []
+        token = _batch_upload.set(True)
+        try:
+            with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+                # Each upload runs in a copy of the caller's context, so its metrics are
+                # recorded against this stage and it skips the per-file wait.
+                futures = [executor.submit(contextvars.copy_context().run, self.run_stage, request) for request in requests]
+                results = [future.result()[0] for future in futures]
+        finally:
+            _batch_upload.reset(token)
+
+        time.sleep(self.consistency_delay)
+        return results
+
     def upload_file_to_s3(self, file_path, bucket_name, s3_folder, file_name):
         """
         Uploads a file to an S3 bucket and returns the S3 path.
@@ -59,7 +93,8 @@ class AmazonS3WriterHandler(AbstractHandler):
         s3_client.upload_file(file_path, bucket_name, s3_path)
 
         # Eventual consistency delay
-        time.sleep(5)
+        if not _batch_upload.get():
+            time.sleep(self.consistency_delay)
 
         return s3_path
 
@@ -76,7 +111,11 @@ class AmazonS3WriterHandler(AbstractHandler):
         
         try:
             with open(write_file_path, "a") as f:
-                f.write(text + "\n")  # Append a newline for separation between entries
+                if isinstance(text, LazyText):
+                    text.write_to(f)
+                else:
+                    f.write(text)
+                f.write("\n")  # Append a newline for separation between entries
                 f.close()
         except Exception as e:
             print(f"Error writing to {write_file_path}: {e}")        
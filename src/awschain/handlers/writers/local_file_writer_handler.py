@@ -2,8 +2,12 @@ import datetime
 import json
 import os
 from ..abstract_handler import AbstractHandler
+from ...utils.text_stream import LazyText, FileText
 
 class LocalFileWriterHandler(AbstractHandler):
+    # Streamed and spilled text is written chunk by chunk.
+    accepts_lazy_text = True
+
     def handle(self, request: dict) -> dict:
         # Determine the file path for writing
         write_file_path = request.get("write_file_path", None)
@@ -18,6 +22,25 @@ class LocalFileWriterHandler(AbstractHandler):
         print(f"Writing data into: {write_file_path}")
         # Extract the text content from the request
         text = request.get("text", None)
+
+        # Streamed text is written chunk by chunk as it arrives, without materializing it.
+        # Handlers further down the chain read it back from the written file.
+        if isinstance(text, LazyText):
+            try:
+                with open(write_file_path, "ab") as f:
+                    start = f.tell()
+                    for chunk in text.iter_chunks():
+                        f.write(chunk.encode("utf-8"))
+                        # Make streamed model output visible in the file as it arrives.
+                        f.flush()
+                    end = f.tell()
+                    f.write(b"\n")
+                request.update({"status": True, "text": FileText(write_file_path, start, end)})
+            except Exception as e:
+                request.update({"status": False, "error": str(e)})
+                print(f"Error writing to {write_file_path}: {e}")
+
+            return super().handle(request)
         
         # Convert the content to a JSON string if it's a dictionary
         if isinstance(text, dict):
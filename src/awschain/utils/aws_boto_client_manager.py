@@ -1,16 +1,109 @@
-import boto3
-from botocore.config import Config
+import os
+import threading
 from .config_loader import ConfigLoader
+from .lazy_import import lazy_import
+from . import concurrency, metrics, rate_limiter
+
+boto3 = lazy_import("boto3")
+Config = lazy_import("botocore.config", "Config", package="boto3")
 
 class AWSBotoClientManager:
+    """
+    Shares boto3 clients between handlers and threads. Clients are keyed by
+    service, region and client settings, created once under a lock, and hooked
+    for metrics, rate limits and adaptive concurrency.
+
+    Settings come from AWS_MAX_POOL_CONNECTIONS, AWS_RETRY_MODE, AWS_MAX_ATTEMPTS,
+    AWS_CONNECT_TIMEOUT and AWS_READ_TIMEOUT, overridden per service by
+    AWS_CLIENT_CONFIG (e.g. {"bedrock-runtime": {"read_timeout": 900}}) and
+    then by the keyword arguments of get_client. Resolved settings are cached
+    per service, region, overrides and raw setting values, so repeated calls do
+    not re-parse AWS_CLIENT_CONFIG.
+    """
     _clients = {}
+    # (service, region, overrides, raw settings) -> client, filled by get_client.
+    _resolved = {}
+    _lock = threading.Lock()
+
+    # Setting name -> environment variable holding its default.
+    SETTINGS = {
+        "max_pool_connections": "AWS_MAX_POOL_CONNECTIONS",
+        "retry_mode": "AWS_RETRY_MODE",
+        "max_attempts": "AWS_MAX_ATTEMPTS",
+        "connect_timeout": "AWS_CONNECT_TIMEOUT",
+        "read_timeout": "AWS_READ_TIMEOUT",
+    }
+
+    @classmethod
+    def client_settings(cls, service_name, **overrides) -> dict:
+        """
+        Resolves the client settings of a service. Unset settings are left to botocore.
+        """
+        settings = {"max_pool_connections": 50}
+        for name, variable in cls.SETTINGS.items():
+            value = os.getenv(variable)
+            if value:
+                settings[name] = value
+        settings.update(ConfigLoader.get_mapping("AWS_CLIENT_CONFIG").get(service_name, {}))
+        settings.update({name: value for name, value in overrides.items() if value is not None})
+
+        unknown = set(settings) - set(cls.SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown client settings for {service_name}: {', '.join(sorted(unknown))}")
+        for name in ("max_pool_connections", "max_attempts"):
+            if name in settings:
+                settings[name] = int(settings[name])
+        for name in ("connect_timeout", "read_timeout"):
+            if name in settings:
+                settings[name] = float(settings[name])
+        return settings
+
+    @classmethod
+    def create_config(cls, region, settings: dict):
+        retries = {}
+        if "retry_mode" in settings:
+            retries["mode"] = settings["retry_mode"]
+        if "max_attempts" in settings:
+            retries["max_attempts"] = settings["max_attempts"]
+        options = {name: settings[name] for name in ("max_pool_connections", "connect_timeout", "read_timeout") if name in settings}
+        if retries:
+            options["retries"] = retries
+        return Config(region_name=region, **options)
+
+    @classmethod
+    def get_client(cls, service_name, region=None, **settings):
+        """
+        Returns the shared client for service_name in region (AWS_DEFAULT_REGION
+        by default), creating it on first use. Keyword arguments override the
+        configured client settings, e.g. read_timeout=900 or retry_mode="adaptive".
+        """
+        region = region or ConfigLoader.get_config('AWS_DEFAULT_REGION', 'us-east-1')
+        lookup = (service_name, region, tuple(sorted(settings.items())),
+                  tuple(os.getenv(variable) for variable in (*cls.SETTINGS.values(), "AWS_CLIENT_CONFIG")))
+        client = cls._resolved.get(lookup)
+        if client is not None:
+            return client
+
+        settings = cls.client_settings(service_name, **settings)
+        key = (service_name, region, tuple(sorted(settings.items())))
+
+        client = cls._clients.get(key)
+        if client is None:
+            # boto3's default session is not safe for concurrent client creation.
+            with cls._lock:
+                client = cls._clients.get(key)
+                if client is None:
+                    client = boto3.client(service_name, config=cls.create_config(region, settings))
+                    client = concurrency.register_client(rate_limiter.register_client(metrics.register_client(client)))
+                    cls._clients[key] = client
+        cls._resolved[lookup] = client
+        return client
 
     @classmethod
-    def get_client(cls, service_name, region=ConfigLoader.get_config('AWS_DEFAULT_REGION', 'us-east-1')):
-        AWS_DEFAULT_REGION = region
-        
-        my_config = Config(region_name=AWS_DEFAULT_REGION)
-                
-        if service_name not in cls._clients:
-            cls._clients[service_name] = boto3.client(service_name, config=my_config)
-        return cls._clients[service_name]
+    def clear(cls):
+        """
+        Drops all cached clients, e.g. after changing credentials or settings.
+        """
+        with cls._lock:
+            cls._clients.clear()
+            cls._resolved.clear()
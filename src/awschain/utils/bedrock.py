@@ -2,69 +2,373 @@
 # SPDX-License-Identifier: MIT-0
 
 # Python Built-Ins:
+import contextvars
+import copy
+import hashlib
 import json
 import os
-from jsonpath_ng import jsonpath, parse
+import threading
+from contextlib import contextmanager
+# Local Dependencies:
+from .aws_boto_client_manager import AWSBotoClientManager
+from .config_loader import ConfigLoader
+from . import result_cache
+# External Dependencies (imported on first use):
+from .lazy_import import lazy_import
+parse = lazy_import("jsonpath_ng", "parse", package="jsonpath-ng")
+jsonpath = lazy_import("jsonpath_ng.jsonpath", package="jsonpath-ng")
 
-# External Dependencies:
-import boto3
-from botocore.client import Config
+DEFAULT_MODEL_ID = "anthropic.claude-v2"
+DEFAULT_MODEL_PROPS = '{"prompt": "", "max_tokens_to_sample": 4096, "temperature": 0.5, "top_k": 250, "top_p": 0.5, "stop_sequences": []}'
 
-def invoke_model(prompt_text, modelId=os.environ.get("AMAZON_BEDROCK_MODEL_ID", 'anthropic.claude-v2')):
+# Where the text delta sits in the stream events of common model families
+# (Claude messages, Claude text completions, Titan, Llama, Mistral, Cohere),
+# tried in order when AMAZON_BEDROCK_STREAM_OUTPUT_JSONPATH is not set.
+DEFAULT_STREAM_OUTPUT_JSONPATHS = ("$.delta.text", "$.completion", "$.outputText", "$.generation", "$.outputs[0].text", "$.text")
+
+# Placeholder written into the body template where the prompt goes.
+_PROMPT_SLOT = "\u0000awschain-prompt\u0000"
+
+def bedrock_client_settings() -> dict:
+    """
+    Client settings for bedrock-runtime: a 900 second connect timeout unless
+    AWS_CONNECT_TIMEOUT or AWS_CLIENT_CONFIG set one.
+    """
+    configured = ConfigLoader.get_mapping("AWS_CLIENT_CONFIG").get("bedrock-runtime", {})
+    if os.getenv("AWS_CONNECT_TIMEOUT") or "connect_timeout" in configured:
+        return {}
+    return {"connect_timeout": 900}
+
+def _compile_getter(expression: str):
+    """
+    Compiles a JSONPath expression into a function returning its first match.
+    Plain paths ($.content[0].text) become direct key / index lookups; anything
+    else goes through jsonpath_ng. Raises KeyError, IndexError or TypeError when
+    nothing matches.
+    """
+    parsed = parse(expression)
+    steps = []
+
+    def walk(node):
+        if isinstance(node, (jsonpath.Root, jsonpath.This)):
+            return True
+        if isinstance(node, jsonpath.Child):
+            return walk(node.left) and walk(node.right)
+        if isinstance(node, jsonpath.Fields) and len(node.fields) == 1 and node.fields[0] != "*":
+            steps.append(node.fields[0])
+            return True
+        if isinstance(node, jsonpath.Index):
+            indices = getattr(node, "indices", None) or (node.index,)
+            if len(indices) == 1:
+                steps.append(indices[0])
+                return True
+        return False
+
+    if walk(parsed):
+        def get(document):
+            for step in steps:
+                document = document[step]
+            return document
+        return get
+
+    def find(document):
+        return parsed.find(document)[0].value
+    return find
+
+class InvocationPlan:
+    """
+    Everything invoke_model needs for one model configuration, prepared once:
+    the bedrock-runtime client, the request body serialized around a slot for
+    the prompt, and a compiled extractor for the output.
+    """
+
+    def __init__(self, model_id: str, model_props: str, prompt_template: str, prompt_var: str, output_json_path: str,
+                 stream_output_json_path: str = None, client=None):
+        self.model_id = model_id
+        self.prompt_template = prompt_template
+        self.output_json_path = output_json_path
+
+        body = json.loads(model_props) if isinstance(model_props, str) else copy.deepcopy(model_props)
+        self.model_props = copy.deepcopy(body)
+        parse(prompt_var).update_or_create(body, _PROMPT_SLOT)
+        # The body is kept as JSON text split at the prompt slot(s): building a
+        # request only serializes the prompt itself.
+        self._body_parts = json.dumps(body).split(json.dumps(_PROMPT_SLOT))
+        if len(self._body_parts) < 2:
+            raise ValueError(f"AMAZON_BEDROCK_PROMPT_INPUT_VAR {prompt_var} does not select a field of the model properties")
+        self._extract = _compile_getter(output_json_path)
+        stream_paths = (stream_output_json_path,) if stream_output_json_path else DEFAULT_STREAM_OUTPUT_JSONPATHS
+        self._stream_extractors = [_compile_getter(path) for path in stream_paths]
+        self._client = client
+
+    @property
+    def client(self):
+        # Created on first use: rendering bodies (e.g. for batch jobs) needs no client.
+        if self._client is None:
+            self._client = AWSBotoClientManager.get_client("bedrock-runtime", **bedrock_client_settings())
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @classmethod
+    def from_env(cls, model_id: str = None) -> "InvocationPlan":
+        return cls(*plan_config(model_id))
+
+    def build_body(self, prompt_text) -> str:
+        prompt = self.prompt_template.format(prompt_text=prompt_text)
+        return json.dumps(prompt).join(self._body_parts)
+
+    @property
+    def supports_messages(self) -> bool:
+        """
+        Whether the model takes an Anthropic Messages API body (anthropic_version and messages).
+        """
+        return "anthropic_version" in self.model_props and "messages" in self.model_props
+
+    def build_messages_body(self, messages: list, system=None) -> str:
+        """
+        Returns a Messages API body with the given messages and system prompt
+        (a string or a list of content blocks) and the configured inference parameters.
+        """
+        body = {key: value for key, value in self.model_props.items() if key not in ("messages", "system")}
+        if system:
+            body["system"] = system
+        body["messages"] = messages
+        return json.dumps(body)
+
+    def extract(self, response_body):
+        """
+        Returns the output selected by the output JSONPath, or the whole body when it does not match.
+        """
+        try:
+            value = self._extract(response_body)
+        except (KeyError, IndexError, TypeError):
+            print(f"Failed to apply JSONPAth: {self.output_json_path}, returning the whole body")
+            return response_body
+        return value if value else None
+
+    def invoke(self, prompt_text, use_cache: bool = None):
+        return self.invoke_body(self.build_body(prompt_text), use_cache)
+
+    def invoke_body(self, body: str, use_cache: bool = None):
+        """
+        Invokes the model with a complete request body (see build_body, build_messages_body).
+        """
+        cache = get_response_cache(use_cache)
+        key = response_cache_key(self.model_id, body) if cache is not None else None
+        if key is not None:
+            entry = cache.get(key)
+            if entry is not result_cache._MISSING:
+                record_cache_hit(cache, entry)
+                return self.extract(entry["body"])
+            cache.stats.record("misses")
+        try:
+            response = self.client.invoke_model(body=body, modelId=self.model_id,
+                                                accept='application/json', contentType='application/json')
+            response_body = json.loads(response.get('body').read())
+        except Exception as e:
+            print(f"Failed to invoke model: {e}")
+            raise e
+        if key is not None:
+            cache.set(key, {"body": response_body, **token_counts(response, response_body)})
+            cache.stats.record("stores")
+        return self.extract(response_body)
+
+    def invoke_stream(self, prompt_text, use_cache: bool = None):
+        """
+        Invokes the model with a streamed response and returns an iterator of
+        text deltas. The request is sent right away, so errors such as a too long
+        prompt are raised here; the deltas are read as the iterator is consumed.
+        A cached response is returned as a single delta.
+        """
+        return self.invoke_body_stream(self.build_body(prompt_text), use_cache)
+
+    def invoke_body_stream(self, body: str, use_cache: bool = None):
+        cache = get_response_cache(use_cache)
+        key = response_cache_key(self.model_id, body, stream=True) if cache is not None else None
+        if key is not None:
+            entry = cache.get(key)
+            if entry is not result_cache._MISSING:
+                record_cache_hit(cache, entry)
+                return iter([entry["text"]] if entry["text"] else [])
+            cache.stats.record("misses")
+        try:
+            response = self.client.invoke_model_with_response_stream(body=body, modelId=self.model_id,
+                                                                     accept='application/json', contentType='application/json')
+        except Exception as e:
+            print(f"Failed to invoke model: {e}")
+            raise e
+        deltas = self._iter_deltas(response.get('body'))
+        return deltas if key is None else self._store_when_complete(deltas, cache, key, response)
+
+    def _store_when_complete(self, deltas, cache, key, response):
+        # Only a stream read to the end is cached.
+        parts = []
+        for text in deltas:
+            parts.append(text)
+            yield text
+        cache.set(key, {"text": "".join(parts), **token_counts(response)})
+        cache.stats.record("stores")
+
+    def _iter_deltas(self, events):
+        for event in events:
+            if "chunk" not in event:
+                # modelStreamErrorException, throttlingException, ...
+                name, detail = next(iter(event.items()))
+                raise RuntimeError(f"Model stream failed with {name}: {detail.get('message', detail) if isinstance(detail, dict) else detail}")
+            chunk = json.loads(event["chunk"]["bytes"])
+            for extract in self._stream_extractors:
+                try:
+                    text = extract(chunk)
+                except (KeyError, IndexError, TypeError):
+                    continue
+                if isinstance(text, str):
+                    if text:
+                        yield text
+                    break
+
+def plan_config(model_id: str = None) -> tuple:
+    """
+    Returns the settings an invocation plan is built from, read from the environment.
+    """
+    return (
+        model_id or os.environ.get("AMAZON_BEDROCK_MODEL_ID", DEFAULT_MODEL_ID),
+        os.environ.get("AMAZON_BEDROCK_MODEL_PROPS") or DEFAULT_MODEL_PROPS,
+        os.environ.get("AMAZON_BEDROCK_PROMPT_TEMPLATE") or "{prompt_text}",
+        os.environ.get("AMAZON_BEDROCK_PROMPT_INPUT_VAR", "prompt"),
+        os.environ.get("AMAZON_BEDROCK_OUTPUT_JSONPATH", "$"),
+        os.environ.get("AMAZON_BEDROCK_STREAM_OUTPUT_JSONPATH") or None,
+    )
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+def get_invocation_plan(model_id: str = None) -> InvocationPlan:
+    """
+    Returns the cached plan for the current model configuration, compiling it on first use.
+    """
+    config = plan_config(model_id)
+    plan = _plans.get(config)
+    if plan is None:
+        with _plans_lock:
+            plan = _plans.get(config)
+            if plan is None:
+                plan = _plans[config] = InvocationPlan(*config)
+    return plan
+
+def clear_invocation_plans():
+    """
+    Drops the cached plans, e.g. after changing the client settings.
+    """
+    with _plans_lock:
+        _plans.clear()
+
+def invoke_model(prompt_text, modelId=None, use_cache=None):
     """
     Summarizes the given text using Amazon Bedrock, based on a prompt specified by prompt_file_name.
-    """        
+    """
+    return get_invocation_plan(modelId).invoke(prompt_text, use_cache)
 
+def invoke_model_stream(prompt_text, modelId=None, use_cache=None):
+    """
+    Streaming counterpart of invoke_model: returns an iterator of text deltas.
+    """
+    return get_invocation_plan(modelId).invoke_stream(prompt_text, use_cache)
+
+# Response cache: exact-match model responses, keyed by model and request body.
+RESPONSE_CACHE_FIELDS = ("hits", "misses", "stores", "evictions", "expired", "saved_input_tokens", "saved_output_tokens")
+
+_use_response_cache = contextvars.ContextVar("awschain_bedrock_response_cache", default=True)
+_response_cache = None
+_response_cache_config = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache(use_cache: bool = None):
+    """
+    Returns the response cache configured by AMAZON_BEDROCK_RESPONSE_CACHE ("directory"
+    or "sqlite"; unset disables it), AMAZON_BEDROCK_RESPONSE_CACHE_PATH,
+    AMAZON_BEDROCK_RESPONSE_CACHE_MAX_BYTES and AMAZON_BEDROCK_RESPONSE_CACHE_TTL, or
+    None when it is disabled or bypassed (use_cache=False, or use_response_cache(False)).
+    """
+    global _response_cache, _response_cache_config
+    if use_cache is False or (use_cache is None and not _use_response_cache.get()):
+        return None
+    backend = os.getenv("AMAZON_BEDROCK_RESPONSE_CACHE", "").lower()
+    if backend in ("", "false", "off", "none"):
+        return None
+    config = (backend, os.getenv("AMAZON_BEDROCK_RESPONSE_CACHE_PATH"), os.getenv("AMAZON_BEDROCK_RESPONSE_CACHE_MAX_BYTES"),
+              os.getenv("AMAZON_BEDROCK_RESPONSE_CACHE_TTL"))
+    if _response_cache is not None and _response_cache_config == config:
+        return _response_cache
+    with _response_cache_lock:
+        if _response_cache is None or _response_cache_config != config:
+            _response_cache = result_cache.create_cache(
+                backend, config[1], "bedrock_response_cache", int(config[2] or 1 << 30), float(config[3] or 0),
+                setting="AMAZON_BEDROCK_RESPONSE_CACHE")
+            _response_cache.stats = result_cache.CacheStats(RESPONSE_CACHE_FIELDS)
+            _response_cache_config = config
+    return _response_cache
+
+@contextmanager
+def use_response_cache(enabled: bool = True):
+    """
+    Enables or bypasses the response cache for the invocations made inside the block
+    (including threads started with a copy of the context), e.g. per request.
+    """
+    token = _use_response_cache.set(enabled)
     try:
-        # boto3_bedrock = bedrock.get_bedrock_client( assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None), region=os.environ.get("AWS_DEFAULT_REGION", None))
-        config = Config(connect_timeout=900)
-        boto3_bedrock = boto3.client(service_name="bedrock-runtime", region_name=os.environ.get("AWS_DEFAULT_REGION", 'us-east-1'), config=config)
-
-    except e:
-        print(f"Failed to create Bedrock client: {e}")
-        raise e
-    
-    body = json.loads(os.environ.get("AMAZON_BEDROCK_MODEL_PROPS", {"max_tokens_to_sample":4096, "temperature":0.5, "top_k":250, "top_p":0.5, "stop_sequences":[] }))
-    prompt_template = os.environ.get("AMAZON_BEDROCK_PROMPT_TEMPLATE", None)
-    prompt_var = os.environ.get("AMAZON_BEDROCK_PROMPT_INPUT_VAR", "prompt")
-    output_json_path = os.environ.get("AMAZON_BEDROCK_OUTPUT_JSONPATH", "$")
-    
-    # Format the prompt.
-    prompt_template = prompt_template.format(prompt_text=prompt_text) 
-
-    # JSONPath expression
-    jsonpath_expr = parse(prompt_var)
-    # Find the path and set the new content
-    for match in jsonpath_expr.find(body):
-        # Check if the matched element is not at the root level
-        if hasattr(match.full_path, 'left'):
-            parent_path = match.full_path.left
-            jsonpath_expr_update = parse(str(parent_path))
-            for match_update in jsonpath_expr_update.find(body):
-                match_update.value['content'] = prompt_template
-        else: 
-            # Directly modify the root element's value
-            body[ str(match.full_path) ] = prompt_template
-    
-    body = json.dumps(body)
-    try:
-        accept = 'application/json'
-        contentType = 'application/json'
-        
-        response = boto3_bedrock.invoke_model(body=body, modelId=modelId, accept=accept, contentType=contentType)
-        response_body = json.loads(response.get('body').read())
-
-        # Trying to fetch data from the response body based on pre-configured JSONPath expression
-        jsonpath_expression = parse(output_json_path)        
-        try: 
-            result = jsonpath_expression.find(response_body)
-        
-            if result[0].value: 
-                return result[0].value
-        except: 
-            print(f"Failed to apply JSONPAth: {output_json_path}, returning the whole body")
-            return response_body
-        
-    except Exception as e:
-        print(f"Failed to invoke model: {e}")
-        raise e
+        yield
+    finally:
+        _use_response_cache.reset(token)
+
+def response_cache_key(model_id: str, body: str, stream: bool = False) -> str:
+    """
+    The body holds the rendered prompt and all inference parameters.
+    """
+    digest = hashlib.sha256()
+    for part in (model_id, "stream" if stream else "invoke", body):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def token_counts(response: dict, response_body=None) -> dict:
+    """
+    Input and output token counts of a response, from the Bedrock response headers
+    or, failing that, the usage block of the body.
+    """
+    headers = (response.get("ResponseMetadata") or {}).get("HTTPHeaders") or {}
+    usage = response_body.get("usage", {}) if isinstance(response_body, dict) else {}
+    return {
+        "input_tokens": int(headers.get("x-amzn-bedrock-input-token-count") or usage.get("input_tokens") or 0),
+        "output_tokens": int(headers.get("x-amzn-bedrock-output-token-count") or usage.get("output_tokens") or 0),
+    }
+
+def record_cache_hit(cache, entry: dict):
+    cache.stats.record("hits")
+    cache.stats.record("saved_input_tokens", count=entry.get("input_tokens", 0))
+    cache.stats.record("saved_output_tokens", count=entry.get("output_tokens", 0))
+
+def response_cache_stats() -> dict:
+    """
+    Hit, miss, store and eviction counts, the hit rate and the tokens not billed
+    thanks to the response cache; empty when it is disabled.
+    """
+    cache = get_response_cache(True)
+    if cache is None:
+        return {}
+    stats = cache.stats.snapshot()
+    stats.pop("handlers", None)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+def streaming_enabled(request: dict = None) -> bool:
+    """
+    Whether model responses are streamed: request["stream_response"] when set,
+    else AMAZON_BEDROCK_STREAM.
+    """
+    if request is not None and request.get("stream_response") is not None:
+        return bool(request.get("stream_response"))
+    return os.getenv("AMAZON_BEDROCK_STREAM", "false").lower() == "true"
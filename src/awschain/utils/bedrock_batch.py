@@ -0,0 +1,396 @@
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from .aws_boto_client_manager import AWSBotoClientManager
+from .bedrock import get_invocation_plan
+from .checkpoint import chain_signature
+from .chunking import ChunkPlanner
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Bedrock batch job states (GetModelInvocationJob).
+DONE_STATES = ("Completed", "PartiallyCompleted")
+FAILED_STATES = ("Failed", "Stopped", "Expired")
+
+
+def batch_enabled(request: dict = None) -> bool:
+    """
+    Whether AmazonBedrockHandler stages prompts for a batch job instead of invoking
+    the model: request["bedrock_batch"] when set, else AMAZON_BEDROCK_BATCH.
+    """
+    if request is not None and request.get("bedrock_batch") is not None:
+        return bool(request.get("bedrock_batch"))
+    return os.getenv("AMAZON_BEDROCK_BATCH", "false").lower() == "true"
+
+
+def batch_directory() -> str:
+    return os.getenv("AMAZON_BEDROCK_BATCH_DIR") or os.path.join(os.getenv("DIR_STORAGE", "./downloads"), "bedrock_batch")
+
+
+def chain_file_name(signature: list) -> str:
+    return hashlib.sha256(json.dumps(signature).encode("utf-8")).hexdigest()[:16]
+
+
+def split_s3_uri(uri: str):
+    bucket, _, key = uri[len("s3://"):].partition("/") if uri.startswith("s3://") else ("", "", "")
+    if not bucket:
+        raise ValueError(f"Not an S3 URI: {uri}")
+    return bucket, key
+
+
+class BedrockBatch:
+    """
+    One Bedrock batch inference job, staged in a local directory:
+
+    - records.jsonl: the rendered model inputs, one {"recordId", "modelInput"} per line
+    - requests/<id>.pkl: each parked request, the record IDs of its chunks and the
+      signature of the chain it stopped in (the Bedrock handler and those after it)
+    - chains/<hash>.pkl: the handlers after the Bedrock stage, when they can be pickled
+    - job.json: the submitted job
+    - outputs.jsonl: the model outputs, when the records were invoked directly
+
+    enqueue() is called by AmazonBedrockHandler in batch mode; submit() uploads the
+    records through S3 and creates the job; resume() downloads the outputs and runs
+    the rest of each chain. Staging and submitting hold a lock on the directory, so
+    several processes can stage into the same batch. The S3 and Bedrock clients can
+    be replaced, e.g. by stubs.
+    """
+
+    def __init__(self, directory: str = None, s3_uri: str = None, role_arn: str = None,
+                 s3_client=None, bedrock_client=None):
+        self.directory = directory or batch_directory()
+        self.s3_uri = (s3_uri or os.getenv("AMAZON_BEDROCK_BATCH_S3_URI", "")).rstrip("/")
+        self.role_arn = role_arn or os.getenv("AMAZON_BEDROCK_BATCH_ROLE_ARN")
+        self._s3 = s3_client
+        self._bedrock = bedrock_client
+        self._lock = threading.Lock()
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            self._s3 = AWSBotoClientManager.get_client("s3")
+        return self._s3
+
+    @property
+    def bedrock(self):
+        if self._bedrock is None:
+            self._bedrock = AWSBotoClientManager.get_client("bedrock")
+        return self._bedrock
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.directory, *parts)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # The thread lock for this process, a file lock for other processes.
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(".lock"), "a+b") as file:
+                if fcntl is not None:
+                    fcntl.flock(file, fcntl.LOCK_EX)
+                else:
+                    file.seek(0)
+                    msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(file, fcntl.LOCK_UN)
+                    else:
+                        file.seek(0)
+                        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def job(self) -> dict:
+        """
+        Returns the submitted job's details, or None before submit().
+        """
+        try:
+            with open(self._path("job.json")) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _write_json(self, name: str, value: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(value, file)
+        os.replace(tmp_path, self._path(name))
+
+    def enqueue(self, handler, request: dict, text: str, prefix: str = "", suffix: str = "") -> list:
+        """
+        Renders the prompt(s) for text with the current model configuration, appends
+        them to the staging file and parks the request until resume(). Text longer
+        than one call (see ChunkPlanner.for_bedrock) becomes several records, each with
+        prefix and suffix (the instructions of a PromptHandler prompt) around its chunk;
+        resume() combines their outputs.
+        """
+        plan = get_invocation_plan()
+        request_id = uuid.uuid4().hex
+        planner = ChunkPlanner.for_bedrock()
+        if prefix or suffix:
+            room = max(planner.max_size - planner.measure(prefix + suffix), 1)
+            planner = ChunkPlanner(room, unit=planner.unit, overlap=min(planner.overlap, room - 1),
+                                   chars_per_token=planner.chars_per_token)
+        chunks = planner.split(text) or [text]
+        records = [{"recordId": f"{request_id}{index:05d}", "modelInput": json.loads(plan.build_body(prefix + chunk + suffix))}
+                   for index, chunk in enumerate(chunks)]
+        signature = chain_signature(handler)
+        state = {"request": request, "records": [record["recordId"] for record in records], "chain": signature}
+
+        with self._locked():
+            if self.job() is not None:
+                raise RuntimeError(f"Bedrock batch in {self.directory} was already submitted; "
+                                   "resume it or set another AMAZON_BEDROCK_BATCH_DIR.")
+            os.makedirs(self._path("requests"), exist_ok=True)
+            meta = self._read_meta()
+            if meta.setdefault("model_id", plan.model_id) != plan.model_id:
+                raise ValueError(f"Bedrock batch in {self.directory} uses {meta['model_id']}, not {plan.model_id}")
+            self._store_chain(handler, signature, meta)
+            with open(self._path("requests", f"{request_id}.pkl"), "wb") as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(self._path("records.jsonl"), "a", encoding="utf-8") as file:
+                for record in records:
+                    file.write(json.dumps(record) + "\n")
+            self._write_json("meta.json", meta)
+        return state["records"]
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self._path("meta.json")) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"chains": {}}
+
+    def _store_chain(self, handler, signature: list, meta: dict):
+        # The rest of the chain, so resume() works without rebuilding it.
+        name = chain_file_name(signature)
+        if name in meta["chains"]:
+            return
+        meta["chains"][name] = signature
+        rest = handler.get_next()
+        try:
+            data = pickle.dumps(rest, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"Could not store the chain after {type(handler).__name__}, resume() will need it: {e}")
+            return
+        os.makedirs(self._path("chains"), exist_ok=True)
+        with open(self._path("chains", f"{name}.pkl"), "wb") as file:
+            file.write(data)
+
+    def record_count(self) -> int:
+        try:
+            with open(self._path("records.jsonl"), encoding="utf-8") as file:
+                return sum(1 for line in file if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def submit(self, job_name: str = None, direct: bool = None) -> str:
+        """
+        Uploads the staged records to AMAZON_BEDROCK_BATCH_S3_URI and creates the batch
+        inference job. Returns the job ARN.
+
+        Bedrock rejects jobs with fewer than AMAZON_BEDROCK_BATCH_MIN_RECORDS records
+        (100 by default). Such a batch raises ValueError, unless direct (or
+        AMAZON_BEDROCK_BATCH_DIRECT_FALLBACK) is true: then the records are sent to the
+        model one by one now, and None is returned. resume() works the same either way.
+        """
+        with self._locked():
+            if self.job() is not None:
+                return self.job()["job_arn"]
+            meta = self._read_meta()
+            if not meta.get("model_id"):
+                raise RuntimeError(f"No prompts staged in {self.directory}")
+            count = self.record_count()
+            min_records = int(os.getenv("AMAZON_BEDROCK_BATCH_MIN_RECORDS", 100))
+            if count < min_records:
+                if direct is None:
+                    direct = os.getenv("AMAZON_BEDROCK_BATCH_DIRECT_FALLBACK", "false").lower() == "true"
+                if not direct:
+                    raise ValueError(f"Only {count} record(s) staged in {self.directory}; Bedrock batch jobs need at least "
+                                     f"{min_records} (AMAZON_BEDROCK_BATCH_MIN_RECORDS). Stage more requests, or submit "
+                                     "with direct=True to invoke the model for each record instead.")
+                self._invoke_directly(meta["model_id"])
+                self._write_json("job.json", {"job_arn": None, "direct": True})
+                print(f"Invoked {meta['model_id']} directly for {count} record(s)")
+                return None
+            if not self.s3_uri or not self.role_arn:
+                raise ValueError("AMAZON_BEDROCK_BATCH_S3_URI and AMAZON_BEDROCK_BATCH_ROLE_ARN are required to submit a batch job")
+            job_name = job_name or f"awschain-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+            input_uri = f"{self.s3_uri}/input/{job_name}.jsonl"
+            output_uri = f"{self.s3_uri}/output/{job_name}/"
+            bucket, key = split_s3_uri(input_uri)
+            print(f"Uploading batch records to {input_uri}")
+            self.s3.upload_file(self._path("records.jsonl"), bucket, key)
+            response = self.bedrock.create_model_invocation_job(
+                jobName=job_name, roleArn=self.role_arn, modelId=meta["model_id"],
+                inputDataConfig={"s3InputDataConfig": {"s3Uri": input_uri, "s3InputFormat": "JSONL"}},
+                outputDataConfig={"s3OutputDataConfig": {"s3Uri": output_uri}})
+            job = {"job_arn": response["jobArn"], "job_name": job_name, "input_uri": input_uri, "output_uri": output_uri}
+            self._write_json("job.json", job)
+        print(f"Submitted Bedrock batch job {job['job_arn']}")
+        return job["job_arn"]
+
+    def _invoke_directly(self, model_id: str):
+        # Writes one line per record in the format of the batch job output.
+        plan = get_invocation_plan(model_id)
+        tmp_path = self._path("outputs.jsonl.tmp")
+        with open(self._path("records.jsonl"), encoding="utf-8") as records, open(tmp_path, "w", encoding="utf-8") as outputs:
+            for line in records:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                try:
+                    response = plan.client.invoke_model(body=json.dumps(record["modelInput"]), modelId=model_id,
+                                                        accept="application/json", contentType="application/json")
+                    result = {"recordId": record["recordId"], "modelOutput": json.loads(response["body"].read())}
+                except Exception as e:
+                    print(f"Failed to invoke model for record {record['recordId']}: {e}")
+                    result = {"recordId": record["recordId"], "error": {"errorMessage": str(e)}}
+                outputs.write(json.dumps(result) + "\n")
+        os.replace(tmp_path, self._path("outputs.jsonl"))
+
+    def status(self) -> str:
+        job = self.job()
+        if job is None:
+            return "NotSubmitted"
+        if job.get("direct"):
+            return "Completed"
+        return self.bedrock.get_model_invocation_job(jobIdentifier=job["job_arn"])["status"]
+
+    def wait(self, poll_interval: float = None, timeout: float = None) -> str:
+        """
+        Polls the job every AMAZON_BEDROCK_BATCH_POLL_INTERVAL seconds until it ends.
+        Returns the final status; raises RuntimeError if the job failed.
+        """
+        poll_interval = poll_interval if poll_interval is not None else float(os.getenv("AMAZON_BEDROCK_BATCH_POLL_INTERVAL", 60))
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            status = self.status()
+            if status in DONE_STATES:
+                return status
+            if status in FAILED_STATES or status == "NotSubmitted":
+                raise RuntimeError(f"Bedrock batch job ended with status {status}")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Bedrock batch job still {status}")
+            print(f"Bedrock batch job is {status}, checking again in {poll_interval:g}s")
+            time.sleep(poll_interval)
+
+    def _submitted_job(self) -> dict:
+        job = self.job()
+        if job is None:
+            raise RuntimeError(f"Bedrock batch in {self.directory} has not been submitted; call submit() first")
+        return job
+
+    def outputs(self) -> dict:
+        """
+        Downloads the job output: recordId -> (modelOutput, error), one of them None.
+        Raises RuntimeError before submit().
+        """
+        job = self._submitted_job()
+        if job.get("direct"):
+            with open(self._path("outputs.jsonl"), encoding="utf-8") as file:
+                records = [json.loads(line) for line in file if line.strip()]
+            return {record["recordId"]: (record.get("modelOutput"), record.get("error")) for record in records}
+        bucket, prefix = split_s3_uri(job["output_uri"])
+        results = {}
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                if not item["Key"].endswith(".jsonl.out"):
+                    continue
+                body = self.s3.get_object(Bucket=bucket, Key=item["Key"])["Body"]
+                for line in body.iter_lines():
+                    if line.strip():
+                        record = json.loads(line)
+                        results[record["recordId"]] = (record.get("modelOutput"), record.get("error"))
+        return results
+
+    def resume(self, chain=None) -> list:
+        """
+        Matches the job outputs to the parked requests and runs each through the rest
+        of its chain: the handlers after the Bedrock stage of chain (when given, found
+        by the chain's handler names) or the ones stored at enqueue time. Returns the
+        results. The outputs of a text staged as several records are combined with
+        AMAZON_BEDROCK_REDUCE_PROMPT, invoking the model directly (see
+        AmazonBedrockHandler.reduce_summaries). A request with a failed record, or whose
+        chain raises, gets request["bedrock_batch_error"], stops there and stays parked;
+        the other requests carry on.
+        """
+        outputs = self.outputs()
+        plan = get_invocation_plan(self._read_meta()["model_id"])
+        results = []
+        requests_dir = self._path("requests")
+        for name in sorted(os.listdir(requests_dir)):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                with open(os.path.join(requests_dir, name), "rb") as file:
+                    state = pickle.load(file)
+            except Exception as e:
+                print(f"Could not load parked request {name}: {e}")
+                continue
+            request = state["request"]
+            records = [outputs.get(record_id, (None, "missing from the job output")) for record_id in state["records"]]
+            errors = [error or "no model output" for output, error in records if error or output is None]
+            if errors:
+                print(f"Bedrock batch record failed: {errors[0]}")
+                request["bedrock_batch_error"] = errors[0]
+                results.append(request)
+                continue
+            try:
+                summaries = [str(plan.extract(output)) for output, _ in records]
+                request["text"] = summaries[0] if len(summaries) == 1 else self._reduce(summaries)
+                rest = self._rest_of_chain(chain, state["chain"])
+                result = rest.handle(request) if rest is not None else request
+            except Exception as e:
+                print(f"Resuming parked request {name} failed: {e}")
+                request["bedrock_batch_error"] = str(e)
+                results.append(request)
+                continue
+            results.append(result)
+            os.remove(os.path.join(requests_dir, name))
+        return results
+
+    def _reduce(self, summaries: list) -> str:
+        # Imported here: the handler module imports this one.
+        from ..handlers.processors.amazon_bedrock_handler import AmazonBedrockHandler
+        return AmazonBedrockHandler().reduce_summaries(summaries, ChunkPlanner.for_bedrock())
+
+    def _rest_of_chain(self, chain, signature: list):
+        if chain is not None:
+            for handler in chain.iter_chain():
+                if chain_signature(handler) == signature:
+                    return handler.get_next()
+            raise ValueError(f"Chain does not contain the handlers {signature}")
+        path = self._path("chains", f"{chain_file_name(signature)}.pkl")
+        if len(signature) == 1:
+            return None
+        if not os.path.exists(path):
+            raise ValueError("The chain after the Bedrock stage was not stored; pass it to resume()")
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+
+_batches = {}
+_batches_lock = threading.Lock()
+
+
+def get_batch() -> BedrockBatch:
+    """
+    Returns the batch staged in AMAZON_BEDROCK_BATCH_DIR, shared by the handlers of this process.
+    """
+    directory = batch_directory()
+    with _batches_lock:
+        if directory not in _batches:
+            _batches[directory] = BedrockBatch(directory)
+        return _batches[directory]
@@ -0,0 +1,149 @@
+import json
+import os
+
+MODES = ("full", "window", "summary")
+
+# Bedrock models that accept cache_control blocks (prompt caching) in Messages API bodies.
+PROMPT_CACHE_MODELS = ("claude-3-5-haiku", "claude-3-7-sonnet", "claude-sonnet-4", "claude-opus-4", "claude-haiku-4")
+
+DEFAULT_SUMMARY_PROMPT = (
+    "Update the summary of a conversation about a document with the new turns below. Keep facts, names, "
+    "decisions and open questions, and stay under {max_chars} characters.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}")
+
+
+def prompt_cache_supported(model_id: str) -> bool:
+    return any(name in (model_id or "") for name in PROMPT_CACHE_MODELS)
+
+
+class ChatContext:
+    """
+    The state of a chat session about a document, and what is sent to the model each turn.
+
+    mode "full" resends the document and every turn (the original behaviour).
+    "window" sends the document and the last window_turns question / answer pairs.
+    "summary" also folds older turns into a rolling summary of at most summary_chars
+    characters, so the request size stays roughly constant however long the session.
+    For Messages API models the document goes into the system prompt; with
+    prompt_cache it is marked as a cache point and reused across turns.
+    With a retriever (question -> list of passages), only the passages retrieved
+    for the latest question are sent in place of the document, which can be None.
+    """
+
+    def __init__(self, document: str, mode: str = "full", window_turns: int = 6, summary_chars: int = 2000,
+                 prompt_cache: bool = False, summary_prompt: str = None, retriever=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown chat context mode: {mode}. Use one of {MODES}.")
+        self.document = document
+        self.mode = mode
+        self.window_turns = max(window_turns, 1)
+        self.summary_chars = summary_chars
+        self.prompt_cache = prompt_cache
+        self.summary_prompt = summary_prompt or DEFAULT_SUMMARY_PROMPT
+        self.retriever = retriever
+        self.passages = []
+        self.history = []
+        self.summary = ""
+        # Number of history messages covered by the summary.
+        self.folded = 0
+
+    @classmethod
+    def from_env(cls, document: str, model_id: str = None, retriever=None) -> "ChatContext":
+        """
+        Reads AMAZON_BEDROCK_CHAT_CONTEXT (full, window or summary), AMAZON_BEDROCK_CHAT_WINDOW_TURNS,
+        AMAZON_BEDROCK_CHAT_SUMMARY_CHARS, AMAZON_BEDROCK_CHAT_SUMMARY_PROMPT and
+        AMAZON_BEDROCK_CHAT_PROMPT_CACHE (auto, true or false; auto enables it for models that support it).
+        """
+        model_id = model_id or os.getenv("AMAZON_BEDROCK_MODEL_ID", "")
+        prompt_cache = os.getenv("AMAZON_BEDROCK_CHAT_PROMPT_CACHE", "auto").lower()
+        return cls(document,
+                   mode=os.getenv("AMAZON_BEDROCK_CHAT_CONTEXT", "full").lower(),
+                   window_turns=int(os.getenv("AMAZON_BEDROCK_CHAT_WINDOW_TURNS", 6)),
+                   summary_chars=int(os.getenv("AMAZON_BEDROCK_CHAT_SUMMARY_CHARS", 2000)),
+                   prompt_cache=prompt_cache == "true" or (prompt_cache == "auto" and prompt_cache_supported(model_id)),
+                   summary_prompt=os.getenv("AMAZON_BEDROCK_CHAT_SUMMARY_PROMPT"), retriever=retriever)
+
+    def add(self, role: str, content: str):
+        if role == "user" and self.retriever is not None:
+            self.passages = list(self.retriever(content))
+        self.history.append({"role": role, "content": content})
+
+    def context_text(self) -> str:
+        """
+        The document, or with a retriever the passages retrieved for the latest question.
+        """
+        if self.retriever is None:
+            return self.document
+        return "\n\n".join(self.passages)
+
+    def transcript(self) -> list:
+        """
+        The whole conversation. In full mode it starts with the document as the first
+        user message; the bounded and retrieval modes leave the document out.
+        """
+        if self.mode == "full" and self.retriever is None:
+            return [{"role": "user", "content": self.document}] + self.history
+        return list(self.history)
+
+    def recent(self) -> list:
+        """
+        The turns sent with the next request: all of them in full mode, else the last
+        window_turns pairs (and the pending question) not covered by the summary.
+        """
+        if self.mode == "full":
+            return list(self.history)
+        start = max(self.folded, len(self.history) - 2 * self.window_turns - 1)
+        # The Messages API expects the conversation to start with the user.
+        while start < len(self.history) and self.history[start]["role"] != "user":
+            start += 1
+        return self.history[start:]
+
+    def system_blocks(self) -> list:
+        """
+        System prompt content blocks: the document (a cache point with prompt_cache) or
+        the retrieved passages, followed by the summary of earlier turns.
+        """
+        if self.retriever is not None:
+            # The passages change with every question: not worth a cache point.
+            document = {"type": "text", "text": "Answer the user's questions using these excerpts of a document.\n\n"
+                                                f"<excerpts>\n{self.context_text()}\n</excerpts>"}
+        else:
+            document = {"type": "text", "text": f"Answer the user's questions about this document.\n\n<document>\n{self.document}\n</document>"}
+        if self.prompt_cache and self.retriever is None:
+            document["cache_control"] = {"type": "ephemeral"}
+        blocks = [document]
+        if self.summary:
+            blocks.append({"type": "text", "text": f"Summary of the earlier conversation:\n{self.summary}"})
+        return blocks
+
+    def messages_body(self, plan) -> str:
+        """
+        The request body for a Messages API model (see InvocationPlan.build_messages_body).
+        """
+        return plan.build_messages_body(self.recent(), self.system_blocks())
+
+    def prompt_text(self) -> str:
+        """
+        The conversation as one prompt, for models without a Messages API body.
+        """
+        messages = [{"role": "user", "content": self.context_text()}]
+        if self.mode == "full":
+            return json.dumps({"messages": messages + self.history})
+        if self.summary:
+            messages.append({"role": "user", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        return json.dumps({"messages": messages + self.recent()})
+
+    def fold(self, summarize) -> bool:
+        """
+        In summary mode, once more than window_turns pairs are unsummarized, folds the
+        oldest half of them into the summary with summarize(prompt) -> str.
+        Returns whether the summary changed.
+        """
+        if self.mode != "summary" or (len(self.history) - self.folded) // 2 <= self.window_turns:
+            return False
+        end = self.folded + 2 * max(self.window_turns // 2, 1)
+        turns = "\n".join(f"{message['role']}: {message['content']}" for message in self.history[self.folded:end])
+        prompt = self.summary_prompt.format(max_chars=self.summary_chars, summary=self.summary or "(none)", turns=turns)
+        self.summary = str(summarize(prompt) or "")[:self.summary_chars]
+        self.folded = end
+        return True
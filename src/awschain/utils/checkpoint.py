@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from .executors import run_in_thread
+
+DEFAULT_KEY_FIELDS = ("type", "path", "prompt_file_name")
+
+
+def chain_signature(chain) -> list:
+    return [type(handler).__name__ for handler in chain.iter_chain()]
+
+
+class CheckpointStore:
+    """
+    Local store of the request state after the last completed stage of a chain,
+    one pickle file per (chain, input). Writes are atomic, so an interrupted
+    run never leaves a truncated checkpoint behind.
+    """
+
+    def __init__(self, directory: str = None, key_fields=None):
+        self.directory = directory or os.getenv("CHECKPOINT_DIR") or os.path.join(os.getenv("DIR_STORAGE", "./downloads"), "checkpoints")
+        if key_fields is None:
+            configured = os.getenv("CHECKPOINT_KEY_FIELDS")
+            key_fields = [field.strip() for field in configured.split(",")] if configured else DEFAULT_KEY_FIELDS
+        self.key_fields = tuple(key_fields)
+
+    def key(self, chain, request: dict) -> str:
+        """
+        Identifies a request on a chain. request["checkpoint_id"] takes precedence
+        over the key fields (by default type, path and prompt_file_name).
+        """
+        identity = request.get("checkpoint_id")
+        if identity is None:
+            identity = {field: request.get(field) for field in self.key_fields}
+        payload = json.dumps([chain_signature(chain), identity], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def load(self, key: str):
+        """
+        Returns (completed stage count, handler names, request) or None.
+        """
+        try:
+            with open(self.path(key), "rb") as file:
+                checkpoint = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            print(f"Ignoring unreadable checkpoint {self.path(key)}: {e}")
+            return None
+        return checkpoint["stage"], checkpoint["handlers"], checkpoint["request"]
+
+    def save(self, key: str, stage: int, handlers: list, request: dict) -> bool:
+        try:
+            data = pickle.dumps({"stage": stage, "handlers": handlers, "request": request}, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            # A request holding something unpicklable only loses resumability.
+            print(f"Could not checkpoint stage {stage} ({handlers[stage - 1]}): {e}")
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return True
+
+    def clear(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def resume_point(self, chain, request: dict):
+        """
+        Returns (key, handlers to skip, request to continue with).
+        """
+        key = self.key(chain, request)
+        handlers = chain_signature(chain)
+        checkpoint = self.load(key)
+        if checkpoint is None:
+            return key, 0, request
+        stage, saved_handlers, saved_request = checkpoint
+        if saved_handlers != handlers:
+            print(f"Checkpoint {key} was written by a different chain, starting over.")
+            return key, 0, request
+        print(f"Resuming after stage {stage} ({handlers[stage - 1]}).")
+        return key, stage, saved_request
+
+
+def run_resumable(chain, request: dict, store: CheckpointStore = None) -> dict:
+    """
+    Runs the chain one stage at a time, checkpointing the request after each
+    stage. If a previous run of the same input failed, the chain resumes after
+    its last completed stage. The checkpoint is removed once the chain finishes.
+    """
+    store = store or CheckpointStore()
+    key, skip, request = store.resume_point(chain, request)
+    handlers = list(chain.iter_chain())
+    names = chain_signature(chain)
+    for stage, handler in enumerate(handlers[skip:], start=skip + 1):
+        request, forwarded = handler.run_stage(request)
+        if not forwarded:
+            break
+        if stage < len(handlers):
+            store.save(key, stage, names, request)
+    store.clear(key)
+    return request
+
+
+async def arun_resumable(chain, request: dict, store: CheckpointStore = None) -> dict:
+    """
+    Asynchronous counterpart of run_resumable; stages run in the shared thread pool.
+    """
+    store = store or CheckpointStore()
+    key, skip, request = await run_in_thread(store.resume_point, chain, request)
+    handlers = list(chain.iter_chain())
+    names = chain_signature(chain)
+    for stage, handler in enumerate(handlers[skip:], start=skip + 1):
+        request, forwarded = await handler.arun_stage(request)
+        if not forwarded:
+            break
+        if stage < len(handlers):
+            await run_in_thread(store.save, key, stage, names, request)
+    store.clear(key)
+    return request
@@ -0,0 +1,150 @@
+import math
+import os
+
+UNITS = ("chars", "bytes", "tokens")
+
+# Boundaries tried in order of preference; a cut goes right after the separator.
+_PARAGRAPH = ("\n\n", "\r\n\r\n")
+_SENTENCE = (". ", ".\n", "! ", "!\n", "? ", "?\n", ".\" ", ".) ", "。", "！", "？")
+_WHITESPACE = (" ", "\n", "\t", "\r", "\f")
+
+
+class Chunk:
+    """
+    A piece of a text: text == source[start:end], with start and end as
+    character offsets into the source.
+    """
+
+    __slots__ = ("text", "start", "end")
+
+    def __init__(self, text: str, start: int, end: int):
+        self.text = text
+        self.start = start
+        self.end = end
+
+    def __eq__(self, other):
+        if isinstance(other, Chunk):
+            return (self.text, self.start, self.end) == (other.text, other.start, other.end)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Chunk(start={self.start}, end={self.end}, text={self.text[:20]!r}{'...' if len(self.text) > 20 else ''})"
+
+
+class ChunkPlanner:
+    """
+    Splits text into chunks that fit a service or model input limit.
+
+    max_size is counted in unit: characters, UTF-8 bytes (Comprehend), or
+    tokens, estimated at chars_per_token characters per token (Bedrock models).
+    Cuts are placed at the last paragraph break in the chunk, else the last
+    sentence end, else the last whitespace, else at a character boundary, and
+    never leave a chunk less than min_fill of the limit for the sake of a nicer
+    boundary. With overlap, each chunk starts up to that many units before the
+    end of the previous one, at a word boundary.
+
+    The text is scanned once from left to right; each window is encoded at
+    most once to measure it in bytes.
+    """
+
+    def __init__(self, max_size: int, unit: str = "chars", overlap: int = 0, chars_per_token: float = 4.0,
+                 min_fill: float = 0.5):
+        if unit not in UNITS:
+            raise ValueError(f"Unsupported unit: {unit}. Use one of {UNITS}.")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if not 0 <= overlap < max_size:
+            raise ValueError("overlap must be between 0 and max_size")
+        self.max_size = max_size
+        self.unit = unit
+        self.overlap = overlap
+        self.chars_per_token = chars_per_token
+        self.min_fill = min_fill
+
+    @classmethod
+    def for_bedrock(cls) -> "ChunkPlanner":
+        """
+        The planner for Bedrock prompts: AMAZON_BEDROCK_MAX_INPUT_TOKENS estimated tokens
+        (AMAZON_BEDROCK_CHARS_PER_TOKEN characters each) when set, else
+        AMAZON_BEDROCK_MAX_INPUT_CHARS characters, overlapping by AMAZON_BEDROCK_CHUNK_OVERLAP.
+        """
+        overlap = int(os.getenv("AMAZON_BEDROCK_CHUNK_OVERLAP", 0))
+        max_tokens = os.getenv("AMAZON_BEDROCK_MAX_INPUT_TOKENS")
+        if max_tokens:
+            return cls(int(max_tokens), unit="tokens", overlap=overlap,
+                       chars_per_token=float(os.getenv("AMAZON_BEDROCK_CHARS_PER_TOKEN", 4.0)))
+        return cls(int(os.getenv("AMAZON_BEDROCK_MAX_INPUT_CHARS", 100000)), overlap=overlap)
+
+    def measure(self, text: str) -> int:
+        """
+        Returns the size of text in the planner's unit.
+        """
+        if self.unit == "bytes":
+            return len(text.encode("utf-8"))
+        if self.unit == "tokens":
+            return math.ceil(len(text) / self.chars_per_token)
+        return len(text)
+
+    def plan(self, text: str) -> list:
+        return list(self.iter_chunks(text))
+
+    def split(self, text: str) -> list:
+        """
+        Returns the chunk texts only.
+        """
+        return [chunk.text for chunk in self.iter_chunks(text)]
+
+    def iter_chunks(self, text: str):
+        """
+        Yields the Chunks of text in order. Chunks that are only whitespace are skipped.
+        """
+        text = text or ""
+        start = 0
+        while start < len(text):
+            limit = self._window_end(text, start)
+            end = len(text) if limit >= len(text) else self._cut(text, start, limit)
+            if not text[start:end].isspace():
+                yield Chunk(text[start:end], start, end)
+            if end >= len(text):
+                return
+            start = self._next_start(text, start, end)
+
+    def _window_end(self, text: str, start: int) -> int:
+        """
+        Returns the end of the longest slice starting at start that fits max_size.
+        """
+        if self.unit == "tokens":
+            return start + max(int(self.max_size * self.chars_per_token), 1)
+        end = start + self.max_size
+        if self.unit == "bytes":
+            # A character is at least one byte: the window holds the whole fitting prefix.
+            encoded = text[start:end].encode("utf-8")
+            if len(encoded) > self.max_size:
+                end = start + len(encoded[:self.max_size].decode("utf-8", "ignore"))
+        return max(end, start + 1)
+
+    def _cut(self, text: str, start: int, limit: int) -> int:
+        floor = start + int((limit - start) * self.min_fill)
+        for separators in (_PARAGRAPH, _SENTENCE, _WHITESPACE):
+            if separators is _WHITESPACE and text[limit].isspace():
+                # The window already ends at a word.
+                return limit
+            cut = max((index + len(separator) for index, separator in
+                       ((text.rfind(separator, floor, limit), separator) for separator in separators) if index >= 0), default=-1)
+            if cut > floor:
+                return cut
+        return limit
+
+    def _next_start(self, text: str, start: int, end: int) -> int:
+        if not self.overlap:
+            return end
+        if self.unit == "bytes":
+            tail = text[max(end - self.overlap, start):end].encode("utf-8")[-self.overlap:]
+            back = len(tail.decode("utf-8", "ignore"))
+        else:
+            back = self.overlap if self.unit == "chars" else int(self.overlap * self.chars_per_token)
+        candidate = max(end - back, start + 1)
+        # Start the overlap at the first word that begins inside it.
+        cut = min((index for index in (text.find(separator, candidate - 1, end) for separator in _WHITESPACE) if index >= 0),
+                  default=-1)
+        return cut + 1 if 0 <= cut < end - 1 else end
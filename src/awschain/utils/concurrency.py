@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+
+# Error codes AWS services use to signal throttling.
+THROTTLING_ERROR_CODES = frozenset({
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "TooManyRequestsException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "RequestLimitExceeded",
+    "ProvisionedThroughputExceededException",
+    "SlowDown",
+})
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of calls in flight to one service.
+
+    Every call that succeeds with a healthy latency (at most latency_tolerance
+    times the smoothed latency of earlier healthy calls) grows the limit by
+    increase / limit, roughly one slot per round of calls. A throttled call
+    multiplies it by decrease. Throttles from calls that started before the last
+    cut are ignored, so one burst of throttles cuts the limit only once.
+    """
+
+    def __init__(self, service: str, initial: float = 4, minimum: float = 1, maximum: float = 64,
+                 increase: float = 1.0, decrease: float = 0.5, latency_tolerance: float = 2.0):
+        self.service = service
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.throttles = 0
+        self.latency = None
+        self._last_cut = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a slot is free and returns the time the call started.
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return time.monotonic()
+
+    def on_throttle(self, started: float):
+        """
+        Records a throttled attempt of a call started at started.
+        """
+        with self._condition:
+            self.throttles += 1
+            if started >= self._last_cut:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self._last_cut = time.monotonic()
+
+    def release(self, started: float, throttled: bool = False, failed: bool = False):
+        """
+        Frees the slot of a finished call and adjusts the limit.
+        """
+        latency = time.monotonic() - started
+        with self._condition:
+            self.in_flight -= 1
+            if not throttled and not failed:
+                healthy = self.latency is None or latency <= self.latency * self.latency_tolerance
+                if healthy:
+                    self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+                    self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self._condition.notify_all()
+        if throttled:
+            self.on_throttle(started)
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "throttles": self.throttles,
+                "latency_seconds": self.latency,
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.getenv("AWS_ADAPTIVE_CONCURRENCY", "false").lower() == "true"
+
+
+def get_limiter(service: str) -> AdaptiveLimiter:
+    """
+    Returns the process-wide limiter of a service, created from the
+    AWS_CONCURRENCY_* settings on first use.
+    """
+    limiter = _limiters.get(service)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(service)
+            if limiter is None:
+                limiter = AdaptiveLimiter(
+                    service,
+                    initial=float(os.getenv("AWS_CONCURRENCY_INITIAL", 4)),
+                    minimum=float(os.getenv("AWS_CONCURRENCY_MIN", 1)),
+                    maximum=float(os.getenv("AWS_CONCURRENCY_MAX", 64)),
+                    latency_tolerance=float(os.getenv("AWS_CONCURRENCY_LATENCY_TOLERANCE", 2.0)),
+                )
+                _limiters[service] = limiter
+    return limiter
+
+
+def reset():
+    """
+    Forgets all limiters, e.g. after changing the AWS_CONCURRENCY_* settings.
+    """
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def snapshot() -> dict:
+    """
+    Returns the current limit, calls in flight and throttle count per service.
+    """
+    return {service: limiter.snapshot() for service, limiter in list(_limiters.items())}
+
+
+def to_prometheus() -> str:
+    """
+    Renders the limiter state per service in the Prometheus text exposition format.
+    """
+    lines = []
+    for name, kind, description, field in (
+        ("awschain_aws_concurrency_limit", "gauge", "Current adaptive limit on AWS calls in flight.", "limit"),
+        ("awschain_aws_concurrency_in_flight", "gauge", "AWS calls currently in flight.", "in_flight"),
+        ("awschain_aws_throttles_total", "counter", "Throttled AWS call attempts.", "throttles"),
+    ):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for service, state in sorted(snapshot().items()):
+            lines.append(f'{name}{{service="{service}"}} {state[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def register_client(client):
+    """
+    Hooks a boto3 client so its calls wait for a slot of the service's adaptive
+    limiter while AWS_ADAPTIVE_CONCURRENCY is enabled.
+    """
+    events = client.meta.events
+    # before-call runs after parameter validation, so every acquired slot is
+    # released by after-call or after-call-error.
+    events.register("before-call", _before_call, unique_id="awschain-concurrency-before-call")
+    events.register("needs-retry", _needs_retry, unique_id="awschain-concurrency-needs-retry")
+    events.register("after-call", _after_call, unique_id="awschain-concurrency-after-call")
+    events.register("after-call-error", _after_call_error, unique_id="awschain-concurrency-after-call-error")
+    return client
+
+
+def _error_code(response) -> str:
+    # needs-retry passes (http_response, parsed) or None; after-call passes parsed.
+    if isinstance(response, tuple):
+        response = response[1]
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def _before_call(event_name=None, context=None, **kwargs):
+    if context is None or not enabled():
+        return
+    # event_name looks like "before-call.comprehend.DetectEntities"
+    limiter = get_limiter(event_name.split(".")[1])
+    context["awschain_concurrency"] = (limiter, limiter.acquire())
+
+
+def _needs_retry(response=None, request_dict=None, attempts=None, **kwargs):
+    # Throttled attempts that are retried still cut the limit.
+    context = (request_dict or {}).get("context") or {}
+    slot = context.get("awschain_concurrency")
+    if slot is not None and _error_code(response) in THROTTLING_ERROR_CODES:
+        limiter, started = slot
+        limiter.on_throttle(started)
+        context["awschain_throttled"] = True
+
+
+def _after_call(parsed=None, http_response=None, context=None, **kwargs):
+    context = context or {}
+    slot = context.pop("awschain_concurrency", None)
+    if slot is not None:
+        limiter, started = slot
+        if context.pop("awschain_throttled", False):
+            # Already recorded by needs-retry; the call does not grow the limit.
+            limiter.release(started, failed=True)
+            return
+        status = getattr(http_response, "status_code", 200)
+        limiter.release(started, throttled=_error_code(parsed) in THROTTLING_ERROR_CODES, failed=status >= 300)
+
+
+def _after_call_error(context=None, **kwargs):
+    context = context or {}
+    context.pop("awschain_throttled", None)
+    slot = context.pop("awschain_concurrency", None)
+    if slot is not None:
+        limiter, started = slot
+        limiter.release(started, failed=True)
@@ -1,6 +1,9 @@
+import ast
 import os
 import json
-import yaml
+from .lazy_import import lazy_import
+
+yaml = lazy_import("yaml", package="pyyaml")
 
 class ConfigLoader:
     @staticmethod
@@ -40,4 +43,18 @@ class ConfigLoader:
 
     @staticmethod
     def get_config(key, default=None):
-        return os.getenv(key, default)
\ No newline at end of file
+        return os.getenv(key, default)
+
+    @staticmethod
+    def get_mapping(key, default=None):
+        """
+        Returns a setting holding a mapping: a JSON object, or the str() of a
+        nested YAML mapping as stored by load_config.
+        """
+        value = os.getenv(key)
+        if not value:
+            return {} if default is None else default
+        try:
+            return json.loads(value)
+        except ValueError:
+            return ast.literal_eval(value)
@@ -0,0 +1,107 @@
+import contextvars
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .aws_boto_client_manager import AWSBotoClientManager
+from .bedrock import bedrock_client_settings
+
+DEFAULT_EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+# Only Titan v2 takes a dimensions parameter (256, 512 or 1024).
+DIMENSIONS_MODEL_PREFIX = "amazon.titan-embed-text-v2"
+# Cohere embedding models take at most 96 texts per call.
+COHERE_MAX_BATCH = 96
+
+
+class BedrockEmbedder:
+    """
+    Embeds texts with a Bedrock embedding model.
+
+    Cohere models embed batch_size texts per call; Titan models take one text
+    per call. Calls are made concurrency at a time.
+    """
+
+    def __init__(self, model_id: str = None, batch_size: int = 32, concurrency: int = 4, dimensions: int = None,
+                 client=None):
+        self.model_id = model_id or DEFAULT_EMBEDDING_MODEL_ID
+        self.batch_size = max(min(batch_size, COHERE_MAX_BATCH) if self.batched else batch_size, 1)
+        self.concurrency = max(concurrency, 1)
+        self.dimensions = dimensions
+        self._client = client
+
+    @classmethod
+    def from_env(cls, model_id: str = None, dimensions: int = None) -> "BedrockEmbedder":
+        """
+        Reads AMAZON_BEDROCK_EMBEDDING_MODEL_ID, AMAZON_BEDROCK_EMBEDDING_BATCH_SIZE,
+        AMAZON_BEDROCK_EMBEDDING_CONCURRENCY and AMAZON_BEDROCK_EMBEDDING_DIMENSIONS (Titan v2 only).
+        dimensions, e.g. those of an existing index, overrides AMAZON_BEDROCK_EMBEDDING_DIMENSIONS.
+        """
+        model_id = model_id or os.getenv("AMAZON_BEDROCK_EMBEDDING_MODEL_ID", DEFAULT_EMBEDDING_MODEL_ID)
+        dimensions = dimensions or os.getenv("AMAZON_BEDROCK_EMBEDDING_DIMENSIONS")
+        if not model_id.startswith(DIMENSIONS_MODEL_PREFIX):
+            dimensions = None
+        return cls(model_id,
+                   batch_size=int(os.getenv("AMAZON_BEDROCK_EMBEDDING_BATCH_SIZE", 32)),
+                   concurrency=int(os.getenv("AMAZON_BEDROCK_EMBEDDING_CONCURRENCY", 4)),
+                   dimensions=int(dimensions) if dimensions else None)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = AWSBotoClientManager.get_client("bedrock-runtime", **bedrock_client_settings())
+        return self._client
+
+    @property
+    def batched(self) -> bool:
+        return self.model_id.startswith("cohere.")
+
+    def _invoke(self, body: dict) -> dict:
+        response = self.client.invoke_model(body=json.dumps(body), modelId=self.model_id,
+                                            accept="application/json", contentType="application/json")
+        return json.loads(response["body"].read())
+
+    def embed_batch(self, texts: list, input_type: str = "search_document") -> list:
+        """
+        Returns one vector per text. input_type is "search_document" for indexed
+        chunks and "search_query" for questions (used by Cohere models).
+        """
+        if self.batched:
+            embeddings = self._invoke({"texts": texts, "input_type": input_type, "truncate": "END"})["embeddings"]
+            # With embedding_types set, Cohere returns {"float": [...]}.
+            return embeddings["float"] if isinstance(embeddings, dict) else embeddings
+        return [self._invoke(self._titan_body(text))["embedding"] for text in texts]
+
+    def _titan_body(self, text: str) -> dict:
+        body = {"inputText": text}
+        if self.dimensions:
+            body["dimensions"] = self.dimensions
+        return body
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_batch([text], input_type="search_query")[0]
+
+    def iter_batches(self, texts: list):
+        """
+        Yields (start, vectors) for each call's texts as it completes, not necessarily in order.
+        """
+        size = self.batch_size if self.batched else 1
+        batches = [(start, texts[start:start + size]) for start in range(0, len(texts), size)]
+        if len(batches) <= 1:
+            for start, batch in batches:
+                yield start, self.embed_batch(batch)
+            return
+        workers = min(self.concurrency, len(batches))
+        # A private pool, like AmazonBedrockHandler.summarize_chunks, with the caller's context per call.
+        with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="awschain-embed") as executor:
+            futures = {executor.submit(contextvars.copy_context().run, self.embed_batch, batch): start
+                       for start, batch in batches}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def embed(self, texts: list) -> list:
+        """
+        Returns the vectors of texts, in order.
+        """
+        vectors = [None] * len(texts)
+        for start, batch in self.iter_batches(texts):
+            vectors[start:start + len(batch)] = batch
+        return vectors
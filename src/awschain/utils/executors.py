@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import copy
+import functools
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+_lock = threading.Lock()
+_thread_pool = None
+_process_pool = None
+# Handler class -> whether its instances can be sent to a worker process.
+_process_safe = {}
+
+
+def get_thread_pool():
+    """
+    Returns the process-wide thread pool used to run blocking handler code
+    (boto3 calls, file I/O) from async chains. Sized by ASYNC_MAX_WORKERS.
+    """
+    global _thread_pool
+    if _thread_pool is None:
+        with _lock:
+            if _thread_pool is None:
+                max_workers = int(os.getenv("ASYNC_MAX_WORKERS", 64))
+                _thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="awschain")
+    return _thread_pool
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    Runs a blocking callable in the shared thread pool and awaits its result.
+    The caller's context variables are carried over to the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_thread_pool(), call)
+
+
+def process_pool_enabled() -> bool:
+    return os.getenv("CPU_BOUND_EXECUTOR", "process").lower() == "process"
+
+
+def get_process_pool():
+    """
+    Returns the process-wide pool used to run CPU-bound handler stages outside
+    the GIL. Sized by PROCESS_POOL_MAX_WORKERS (CPU count by default). Workers
+    are started with forkserver where available (forking a process that runs
+    threads is unsafe), or PROCESS_POOL_START_METHOD.
+    """
+    global _process_pool
+    if _process_pool is None:
+        with _lock:
+            if _process_pool is None:
+                max_workers = int(os.getenv("PROCESS_POOL_MAX_WORKERS", os.cpu_count() or 1))
+                methods = multiprocessing.get_all_start_methods()
+                method = os.getenv("PROCESS_POOL_START_METHOD") or ("forkserver" if "forkserver" in methods else "spawn")
+                _process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+    return _process_pool
+
+
+def _detached(handler):
+    # A copy of the handler without the rest of the chain, which would otherwise
+    # be pickled along with it.
+    stage = copy.copy(handler)
+    stage._next_handler = None
+    return stage
+
+
+def _can_run_in_process(stage) -> bool:
+    cls = type(stage)
+    if cls not in _process_safe:
+        try:
+            pickle.dumps(stage)
+            _process_safe[cls] = True
+        except Exception as e:
+            # e.g. custom handlers loaded from a file path are not importable by name.
+            print(f"{cls.__name__} cannot run in a worker process, using a thread instead: {e}")
+            _process_safe[cls] = False
+    return _process_safe[cls]
+
+
+# Values of these exact types cannot change in place: the same object is unchanged.
+_IMMUTABLE = (str, bytes, int, float, bool, type(None))
+
+
+def _dumps(value) -> bytes:
+    # memoryviews (Request payloads) cannot be pickled; they are sent as bytes.
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _run_stage_in_process(stage, request: dict, pickled: dict):
+    # Runs in the worker process. request is an empty request of the caller's
+    # type and pickled holds its values as pickled by the caller. Only the keys
+    # the stage changed, added or removed are sent back; values are compared to
+    # those input pickles, which also catches in-place changes to nested dicts
+    # and lists. Each value is pickled at most once here.
+    originals = {}
+    for key, data in pickled.items():
+        originals[key] = request[key] = pickle.loads(data)
+    result, forwarded = stage.run_stage(request)
+    if result is not request:
+        return result, None, forwarded
+    changed = {}
+    for key, value in result.items():
+        if key not in pickled:
+            changed[key] = value
+        elif value is originals[key] and type(value) in _IMMUTABLE:
+            continue
+        elif _dumps(value) != pickled[key]:
+            changed[key] = value
+    removed = [key for key in pickled if key not in result]
+    return changed, removed, forwarded
+
+
+async def run_in_process(handler, request: dict):
+    """
+    Runs one stage of a CPU-bound handler in the shared process pool and
+    returns (request, forwarded) like AbstractHandler.run_stage. The request
+    is updated in place with the keys the stage changed, so unchanged values
+    are never copied back. Falls back to the thread pool for handlers that
+    cannot be pickled.
+    """
+    stage = _detached(handler)
+    if not _can_run_in_process(stage):
+        return await run_in_thread(handler.run_stage, request)
+    loop = asyncio.get_running_loop()
+    # The values are pickled once here; the worker compares its results to these pickles.
+    pickled = {key: _dumps(value) for key, value in request.items()}
+    changed, removed, forwarded = await loop.run_in_executor(get_process_pool(), _run_stage_in_process, stage,
+                                                             type(request)(), pickled)
+    if removed is None:
+        # The stage returned a different request object.
+        return changed, forwarded
+    for key in removed:
+        request.pop(key, None)
+    request.update(changed)
+    return request, forwarded
@@ -0,0 +1,53 @@
+import importlib
+import threading
+
+
+class LazyImport:
+    """
+    Stand-in for a module, or an attribute of a module, that is imported the
+    first time it is used: attribute access and calls are forwarded to the
+    real object. Handler modules bind their optional dependencies with it so
+    importing a handler, or awschain itself, does not import them.
+    """
+
+    __slots__ = ("_module_name", "_attribute", "_package", "_target", "_lock")
+
+    def __init__(self, module_name: str, attribute: str = None, package: str = None):
+        self._module_name = module_name
+        self._attribute = attribute
+        self._package = package
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    try:
+                        module = importlib.import_module(self._module_name)
+                    except ImportError as e:
+                        package = self._package or self._module_name.split(".")[0]
+                        raise ImportError(
+                            f"{self._module_name} is required for this handler. Install it with: pip install {package}") from e
+                    self._target = getattr(module, self._attribute) if self._attribute else module
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        target = f"{self._module_name}.{self._attribute}" if self._attribute else self._module_name
+        state = "loaded" if self._target is not None else "not loaded"
+        return f"<LazyImport {target} ({state})>"
+
+
+def lazy_import(module_name: str, attribute: str = None, package: str = None) -> LazyImport:
+    """
+    Returns a lazy stand-in for a module (lazy_import("fitz")) or one of its
+    attributes (lazy_import("bs4", "BeautifulSoup")). package names the pip
+    distribution suggested when the import fails.
+    """
+    return LazyImport(module_name, attribute, package)
@@ -0,0 +1,193 @@
+import json
+import os
+import time
+import contextvars
+
+# Reserved request key holding the list of per-stage measurements.
+METRICS_KEY = "_metrics"
+
+# Stage currently executing in this thread / task; None while control is in a
+# downstream handler or outside any instrumented stage.
+_current_stage = contextvars.ContextVar("awschain_current_stage", default=None)
+
+
+def metrics_enabled(request=None) -> bool:
+    """
+    Instrumentation is opt-in: set AWSCHAIN_METRICS to true, or "collect_metrics": True on a request.
+    """
+    if request is not None and hasattr(request, "get") and request.get("collect_metrics"):
+        return True
+    return os.getenv("AWSCHAIN_METRICS", "false").lower() in ("true", "1")
+
+
+def text_size(value):
+    """
+    Returns len() of a text value, or None when it cannot be measured without
+    materializing it (streamed text) or is not text at all.
+    """
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return len(value)
+    size_hint = getattr(value, "size_hint", None)
+    if callable(size_hint):
+        return size_hint()
+    return None
+
+
+class StageRecorder:
+    """
+    Measures one execution of one handler. Time spent in downstream handlers
+    (between forwarding the request and getting it back) is excluded, so the
+    figures are exclusive to the stage.
+    """
+
+    __slots__ = ("handler", "record", "_wall", "_cpu", "_paused_wall", "_paused_cpu")
+
+    def __init__(self, handler, request):
+        self.handler = handler
+        self.record = {
+            "handler": type(handler).__name__,
+            "wall_seconds": 0.0,
+            "cpu_seconds": 0.0,
+            "input_size": text_size(request.get("text")),
+            "output_size": None,
+            "aws_calls": 0,
+            "aws_seconds": 0.0,
+            "aws_operations": {},
+        }
+        # Appending at start keeps the records in chain order despite the recursion.
+        request.setdefault(METRICS_KEY, []).append(self.record)
+        self._paused_wall = 0.0
+        self._paused_cpu = 0.0
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def before_forward(self, request):
+        self.record["output_size"] = text_size(request.get("text"))
+        self._paused_wall -= time.perf_counter()
+        self._paused_cpu -= time.thread_time()
+
+    def after_forward(self):
+        self._paused_wall += time.perf_counter()
+        self._paused_cpu += time.thread_time()
+
+    def finish(self, result=None, error=None):
+        self.record["wall_seconds"] = time.perf_counter() - self._wall - self._paused_wall
+        self.record["cpu_seconds"] = time.thread_time() - self._cpu - self._paused_cpu
+        if self.record["output_size"] is None and result is not None and hasattr(result, "get"):
+            self.record["output_size"] = text_size(result.get("text"))
+        if error is not None:
+            self.record["error"] = repr(error)
+
+    def add_aws_call(self, operation, seconds):
+        self.record["aws_calls"] += 1
+        self.record["aws_seconds"] += seconds
+        stats = self.record["aws_operations"].setdefault(operation, {"count": 0, "seconds": 0.0})
+        stats["count"] += 1
+        stats["seconds"] += seconds
+
+
+def current_stage():
+    return _current_stage.get()
+
+
+def set_current_stage(stage):
+    """
+    Makes stage (or None) the current stage; returns a token for reset_current_stage.
+    """
+    return _current_stage.set(stage)
+
+
+def reset_current_stage(token):
+    _current_stage.reset(token)
+
+
+def register_client(client):
+    """
+    Hooks a boto3 client so every API call made while a stage is running is
+    counted and timed on that stage.
+    """
+    events = client.meta.events
+    # before-parameter-build is emitted to every handler (before-call stops at the
+    # first handler returning a response), so the call is always timed.
+    events.register("before-parameter-build", _before_call, unique_id="awschain-metrics-before-call")
+    events.register("after-call", _after_call, unique_id="awschain-metrics-after-call")
+    events.register("after-call-error", _after_call, unique_id="awschain-metrics-after-call-error")
+    return client
+
+
+def _before_call(context=None, **kwargs):
+    if context is not None:
+        context["awschain_call_started"] = time.perf_counter()
+
+
+def _after_call(event_name=None, context=None, **kwargs):
+    stage = _current_stage.get()
+    if stage is None or context is None or "awschain_call_started" not in context:
+        return
+    seconds = time.perf_counter() - context.pop("awschain_call_started")
+    # event_name looks like "after-call.s3.GetObject"
+    operation = ".".join(event_name.split(".")[1:]) if event_name else "unknown"
+    stage.add_aws_call(operation, seconds)
+
+
+def collect(requests) -> list:
+    """
+    Returns the stage records of one request or a list of requests.
+    """
+    if hasattr(requests, "get"):
+        requests = [requests]
+    return [record for request in requests for record in (request.get(METRICS_KEY) or [])]
+
+
+def to_json(requests, indent=None) -> str:
+    """
+    Serializes the stage records of one request or a list of requests as JSON.
+    """
+    return json.dumps(collect(requests), indent=indent)
+
+
+def to_prometheus(requests) -> str:
+    """
+    Aggregates the stage records of one request or a list of requests per handler
+    and renders them in the Prometheus text exposition format.
+    """
+    stages = {}
+    calls = {}
+    for record in collect(requests):
+        totals = stages.setdefault(record["handler"], {"runs": 0, "errors": 0, "wall": 0.0, "cpu": 0.0, "input": 0, "output": 0})
+        totals["runs"] += 1
+        totals["errors"] += 1 if "error" in record else 0
+        totals["wall"] += record["wall_seconds"]
+        totals["cpu"] += record["cpu_seconds"]
+        totals["input"] += record["input_size"] or 0
+        totals["output"] += record["output_size"] or 0
+        for operation, stats in record["aws_operations"].items():
+            call = calls.setdefault((record["handler"], operation), {"count": 0, "seconds": 0.0})
+            call["count"] += stats["count"]
+            call["seconds"] += stats["seconds"]
+
+    metrics = [
+        ("awschain_stage_runs_total", "counter", "Number of times the handler ran.", "runs"),
+        ("awschain_stage_errors_total", "counter", "Number of handler runs that raised.", "errors"),
+        ("awschain_stage_wall_seconds_total", "counter", "Wall time spent in the handler, excluding downstream handlers.", "wall"),
+        ("awschain_stage_cpu_seconds_total", "counter", "CPU time spent in the handler, excluding downstream handlers.", "cpu"),
+        ("awschain_stage_input_size_total", "counter", "Size of the request text received by the handler.", "input"),
+        ("awschain_stage_output_size_total", "counter", "Size of the request text produced by the handler.", "output"),
+    ]
+    lines = []
+    for name, kind, description, field in metrics:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for handler, totals in sorted(stages.items()):
+            lines.append(f'{name}{{handler="{handler}"}} {totals[field]}')
+
+    for name, description, field in (
+        ("awschain_aws_calls_total", "Number of AWS API calls made by the handler.", "count"),
+        ("awschain_aws_call_seconds_total", "Time spent in AWS API calls made by the handler.", "seconds"),
+    ):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} counter")
+        for (handler, operation), stats in sorted(calls.items()):
+            lines.append(f'{name}{{handler="{handler}",operation="{operation}"}} {stats[field]}')
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from .config_loader import ConfigLoader
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at rate tokens per second, holding at
+    most burst tokens. Callers reserve tokens up front (the balance may go
+    negative) and sleep for their share of the deficit, so concurrent callers
+    are served in order at a steady rate instead of retrying in bursts.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive, got {rate}")
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Takes tokens from the bucket and returns the seconds to wait before using them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Blocks until tokens are available and returns the seconds waited.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def _normalize(key: str) -> str:
+    # "comprehend.DetectEntities" and "comprehend.detect_entities" name the same API.
+    service, _, operation = key.partition(".")
+    return f"{service.lower()}.{operation.replace('_', '').lower()}" if operation else service.lower()
+
+
+class RateLimiter:
+    """
+    Client-side limits for AWS API calls, shared by every thread of the process.
+
+    limits maps a service ("comprehend") or a service API
+    ("comprehend.DetectEntities") to requests per second, or to a dict with
+    "rate" and optional "burst". A call waits for the bucket of its API and the
+    bucket of its service, so service limits cap the sum of all its APIs.
+    """
+
+    def __init__(self, limits: dict = None):
+        self.buckets = {}
+        for key, limit in (limits or {}).items():
+            if isinstance(limit, dict):
+                bucket = TokenBucket(limit["rate"], limit.get("burst"))
+            else:
+                bucket = TokenBucket(limit)
+            self.buckets[_normalize(key)] = bucket
+        self._stats_lock = threading.Lock()
+        self.waits = {}
+
+    def acquire(self, service: str, operation: str) -> float:
+        """
+        Waits until a call to service.operation is allowed and returns the seconds waited.
+        """
+        waited = 0.0
+        for key in (_normalize(f"{service}.{operation}"), _normalize(service)):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                waited += bucket.acquire()
+        if waited:
+            with self._stats_lock:
+                stats = self.waits.setdefault(f"{service}.{operation}", {"count": 0, "seconds": 0.0})
+                stats["count"] += 1
+                stats["seconds"] += waited
+        return waited
+
+    def stats(self) -> dict:
+        """
+        Returns how often and how long calls waited, per service API.
+        """
+        with self._stats_lock:
+            return {key: dict(value) for key, value in self.waits.items()}
+
+
+_limiter = None
+_limiter_config = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Returns the process-wide limiter configured by AWS_RATE_LIMITS. It is
+    rebuilt when the setting changes (e.g. after loading another config file).
+    """
+    global _limiter, _limiter_config
+    config = os.getenv("AWS_RATE_LIMITS", "")
+    if _limiter is None or config != _limiter_config:
+        with _limiter_lock:
+            if _limiter is None or config != _limiter_config:
+                _limiter = RateLimiter(ConfigLoader.get_mapping("AWS_RATE_LIMITS"))
+                _limiter_config = config
+    return _limiter
+
+
+def register_client(client):
+    """
+    Hooks a boto3 client so every HTTP attempt, retries included, waits for
+    the configured rate limits first.
+    """
+    client.meta.events.register("before-send", _before_send, unique_id="awschain-rate-limit-before-send")
+    return client
+
+
+def _before_send(event_name=None, **kwargs):
+    # event_name looks like "before-send.comprehend.DetectEntities"
+    parts = (event_name or "").split(".")
+    if len(parts) >= 3:
+        get_rate_limiter().acquire(parts[1], parts[2])
@@ -0,0 +1,123 @@
+from collections.abc import MutableMapping
+
+_MISSING = object()
+
+
+class Request(MutableMapping):
+    """
+    Compact alternative to the plain dict requests passed through a chain.
+
+    The core fields shared by most handlers live in __slots__; any other key
+    (token_map, email fields, handler specific options) goes to a side dict
+    created only when needed. A Request behaves like a dict, so handlers keep
+    using request["text"], request.get(...), update() and pop(), and it can be
+    passed wherever a request dict is accepted.
+
+    Binary content belongs in payload. Buffers (bytearray, mmap, memoryview)
+    are wrapped in a memoryview instead of being copied; bytes are kept as they
+    are.
+    """
+
+    __slots__ = ("type", "path", "text", "payload", "metadata", "prompt_file_name", "write_file_path", "_extra")
+
+    type: str
+    path: str
+    text: str
+    payload: memoryview
+    metadata: dict
+    prompt_file_name: str
+    write_file_path: str
+
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, mapping=(), **fields):
+        self._extra = None
+        self.update(mapping, **fields)
+
+    @classmethod
+    def from_dict(cls, request: dict) -> "Request":
+        return request if isinstance(request, cls) else cls(request)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the request as a plain dict (values are not copied).
+        """
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            if key == "payload" and not isinstance(value, (bytes, memoryview)) and value is not None:
+                value = memoryview(value)
+            setattr(self, key, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self.FIELDS:
+            if getattr(self, key, _MISSING) is _MISSING:
+                raise KeyError(key)
+            delattr(self, key)
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key, _MISSING) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in self.FIELDS:
+            if getattr(self, key, _MISSING) is not _MISSING:
+                yield key
+        if self._extra:
+            yield from list(self._extra)
+
+    def __len__(self):
+        return sum(1 for key in self.FIELDS if getattr(self, key, _MISSING) is not _MISSING) + len(self._extra or ())
+
+    def get(self, key, default=None):
+        # Faster than the MutableMapping default, which goes through a KeyError.
+        if key in self.FIELDS:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def copy(self) -> "Request":
+        return Request(self)
+
+    def __getstate__(self):
+        # memoryviews cannot be pickled (checkpoints, process pools, deepcopy):
+        # the payload is copied into bytes only here.
+        state = self.to_dict()
+        if isinstance(state.get("payload"), memoryview):
+            state["payload"] = state["payload"].tobytes()
+        return state
+
+    def __setstate__(self, state):
+        self._extra = None
+        self.update(state)
+
+    def __reduce__(self):
+        return (Request, (), self.__getstate__())
+
+    def __repr__(self):
+        # Long values are summarized so logging a request does not dump whole documents.
+        parts = []
+        for key, value in self.items():
+            if isinstance(value, (str, bytes, memoryview)) and len(value) > 80:
+                parts.append(f"{key}=<{type(value).__name__} of length {len(value)}>")
+            else:
+                parts.append(f"{key}={value!r}")
+        return f"Request({', '.join(parts)})"
@@ -0,0 +1,419 @@
+import contextvars
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from . import metrics
+from .text_stream import LazyText, TextStream
+
+# Entry being computed by the handler currently running; stored when the
+# handler forwards the request (see AbstractHandler.handle).
+_pending = contextvars.ContextVar("awschain_pending_cache_entry", default=None)
+
+_MISSING = object()
+
+
+class CacheStats:
+    """
+    Thread-safe hit / miss / store / eviction counters, in total and per handler.
+    """
+
+    FIELDS = ("hits", "misses", "stores", "evictions", "expired")
+
+    def __init__(self, fields: tuple = None):
+        self.fields = fields or self.FIELDS
+        self._lock = threading.Lock()
+        self._totals = dict.fromkeys(self.fields, 0)
+        self._handlers = {}
+
+    def record(self, field: str, handler: str = None, count: int = 1):
+        with self._lock:
+            self._totals[field] += count
+            if handler:
+                self._handlers.setdefault(handler, dict.fromkeys(self.fields, 0))[field] += count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self._totals, "handlers": {name: dict(counts) for name, counts in self._handlers.items()}}
+
+
+class DirectoryCache:
+    """
+    One file per entry under a local directory. The modification time doubles
+    as last access time for LRU eviction once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30, ttl: float = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                created, value = pickle.load(file)
+        except FileNotFoundError:
+            return _MISSING
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            self._remove(path)
+            return _MISSING
+        if self.ttl and time.time() - created > self.ttl:
+            self._remove(path)
+            self.stats.record("expired")
+            return _MISSING
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value):
+        data = pickle.dumps((time.time(), value), protocol=pickle.HIGHEST_PROTOCOL)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += len(data) - previous
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def _evict(self):
+        # Least recently used first, until the cache fits again.
+        for _, size, path in sorted(self._entries()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if self._remove(path):
+                self._total_bytes -= size
+                self.stats.record("evictions")
+
+    def _remove(self, path) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in list(self._entries()):
+                self._remove(path)
+            self._total_bytes = 0
+
+
+class SQLiteCache:
+    """
+    Entries in a single SQLite database, evicted least recently used first once
+    the stored size exceeds max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1 << 30, ttl: float = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._connection.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return _MISSING
+            value, created = row
+            now = time.time()
+            if self.ttl and now - created > self.ttl:
+                self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.stats.record("expired")
+                return _MISSING
+            self._connection.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        try:
+            return pickle.loads(value)
+        except (pickle.UnpicklingError, EOFError, ValueError):
+            return _MISSING
+
+    def set(self, key: str, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), len(data), now, now))
+            total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._connection.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall()
+                evicted = []
+                for old_key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    total -= size
+                self._connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+                self.stats.record("evictions", count=len(evicted))
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM entries")
+
+
+_cache = None
+_cache_config = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Returns the cache configured by RESULT_CACHE ("directory" or "sqlite"; unset
+    disables caching), RESULT_CACHE_PATH, RESULT_CACHE_MAX_BYTES and
+    RESULT_CACHE_TTL (seconds, 0 for no expiry). The instance is reused while
+    the configuration does not change.
+    """
+    global _cache, _cache_config
+    backend = os.getenv("RESULT_CACHE", "").lower()
+    if backend in ("", "false", "off", "none"):
+        return None
+    config = (backend, os.getenv("RESULT_CACHE_PATH"), os.getenv("RESULT_CACHE_MAX_BYTES"), os.getenv("RESULT_CACHE_TTL"))
+    if _cache is not None and _cache_config == config:
+        return _cache
+    with _cache_lock:
+        if _cache is None or _cache_config != config:
+            _cache = create_cache(backend, config[1], "result_cache", int(os.getenv("RESULT_CACHE_MAX_BYTES", 1 << 30)),
+                                  float(os.getenv("RESULT_CACHE_TTL", 0)), setting="RESULT_CACHE")
+            _cache_config = config
+    return _cache
+
+
+def create_cache(backend: str, path: str, name: str, max_bytes: int, ttl: float, setting: str = "cache backend"):
+    """
+    Creates a DirectoryCache or SQLiteCache; path defaults to name under DIR_STORAGE.
+    """
+    storage = os.getenv("DIR_STORAGE", "./downloads")
+    if backend == "sqlite":
+        return SQLiteCache(path or os.path.join(storage, f"{name}.sqlite3"), max_bytes, ttl)
+    if backend == "directory":
+        return DirectoryCache(path or os.path.join(storage, name), max_bytes, ttl)
+    raise ValueError(f"Unknown {setting} backend: {backend}")
+
+
+def _hash_value(digest, value) -> bool:
+    if value is None:
+        digest.update(b"N")
+    elif isinstance(value, str):
+        digest.update(b"S")
+        digest.update(value.encode("utf-8", "surrogatepass"))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        digest.update(b"B")
+        digest.update(value)
+    elif isinstance(value, TextStream):
+        # A single-pass stream cannot be hashed without consuming it.
+        if value.size_hint() is None:
+            return False
+        digest.update(b"S")
+        digest.update(value.materialize().encode("utf-8", "surrogatepass"))
+    elif isinstance(value, LazyText):
+        digest.update(b"S")
+        for chunk in value.iter_chunks():
+            digest.update(chunk.encode("utf-8", "surrogatepass"))
+    else:
+        digest.update(b"J")
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(b"\0")
+    return True
+
+
+def _hash_file(digest, path) -> bool:
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return False
+    digest.update(b"F")
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    digest.update(b"\0")
+    return True
+
+
+def make_key(handler, request: dict):
+    """
+    Hashes the handler identity with its declared inputs: cache_key_fields from
+    the request (local files named by cache_file_fields are hashed by content)
+    and the cache_config_vars environment variables. Returns None when an input
+    cannot be hashed without consuming it.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{type(handler).__module__}.{type(handler).__qualname__}:{handler.cache_version}\0".encode("utf-8"))
+    for field in handler.cache_key_fields:
+        digest.update(f"{field}=".encode("utf-8"))
+        value = request.get(field)
+        if field in handler.cache_file_fields and _hash_file(digest, value):
+            continue
+        if not _hash_value(digest, value):
+            return None
+    for name in handler.cache_config_vars:
+        digest.update(f"${name}=".encode("utf-8"))
+        _hash_value(digest, os.getenv(name))
+    extra = handler.cache_key_extra(request)
+    if extra is None:
+        return None
+    if extra != "":
+        digest.update(b"+")
+        _hash_value(digest, extra)
+    return digest.hexdigest()
+
+
+class PendingEntry:
+    """
+    A cache miss in progress: remembers the request before the handler ran so
+    the keys it changed can be stored once it forwards the request.
+    """
+
+    __slots__ = ("handler", "key", "cache", "before", "done")
+
+    def __init__(self, handler, key, cache, request):
+        self.handler = handler
+        self.key = key
+        self.cache = cache
+        self.before = dict(request)
+        self.done = False
+
+    def store(self, request: dict):
+        self.done = True
+        changed = {}
+        for field, value in request.items():
+            if field == metrics.METRICS_KEY:
+                continue
+            previous = self.before.get(field, _MISSING)
+            # Lazy values are not compared: that would read them.
+            if previous is not value and (previous is _MISSING or isinstance(value, LazyText)
+                                          or isinstance(previous, LazyText) or previous != value):
+                changed[field] = value
+        removed = [field for field in self.before if field not in request and field != metrics.METRICS_KEY]
+
+        streams = [value for value in changed.values() if isinstance(value, TextStream) and value.size_hint() is None]
+        if streams:
+            # Storing now would read the stream before the next handler sees it.
+            buffered = [stream for stream in streams if stream.buffered]
+            if len(buffered) < len(streams):
+                print(f"Not caching the result of {type(self.handler).__name__}: it is a single-pass stream")
+                return
+            remaining = [len(buffered)]
+            lock = threading.Lock()
+
+            def stream_complete(_):
+                with lock:
+                    remaining[0] -= 1
+                    if remaining[0]:
+                        return
+                self._set(changed, removed)
+            for stream in buffered:
+                stream.when_complete(stream_complete)
+            return
+        self._set(changed, removed)
+
+    def _set(self, changed: dict, removed: list):
+        try:
+            self.cache.set(self.key, {"changed": changed, "removed": removed})
+        except Exception as e:
+            print(f"Could not cache the result of {type(self.handler).__name__}: {e}")
+            return
+        self.cache.stats.record("stores", type(self.handler).__name__)
+
+
+def store_pending(handler, request: dict):
+    """
+    Called when handler forwards the request: stores its cache entry, if any.
+    """
+    pending = _pending.get()
+    if pending is not None and pending.handler is handler and not pending.done:
+        pending.store(request)
+
+
+def is_cached(handler, request: dict) -> bool:
+    """
+    Whether call_with_cache would answer the request from the cache, e.g. to
+    leave it out of a batch API call.
+    """
+    if handler.cache_key_fields is None or request.get("use_cache", True) is False:
+        return False
+    cache = get_result_cache()
+    if cache is None:
+        return False
+    key = make_key(handler, request)
+    return key is not None and cache.get(key) is not _MISSING
+
+
+def call_with_cache(handle, handler, request: dict, forward):
+    """
+    Runs handle(handler, request) through the result cache. On a hit the stored
+    changes are applied to the request and it is forwarded without running the
+    handler; on a miss the changes are recorded when the handler forwards.
+    """
+    pending = _pending.get()
+    if handler.cache_key_fields is None or (pending is not None and pending.handler is handler) \
+            or request.get("use_cache", True) is False:
+        return handle(handler, request)
+    cache = get_result_cache()
+    if cache is None:
+        return handle(handler, request)
+    key = make_key(handler, request)
+    if key is None:
+        return handle(handler, request)
+
+    name = type(handler).__name__
+    stage = metrics.current_stage()
+    entry = cache.get(key)
+    if entry is not _MISSING:
+        cache.stats.record("hits", name)
+        if stage is not None:
+            stage.record["cache"] = "hit"
+        for field in entry["removed"]:
+            request.pop(field, None)
+        request.update(entry["changed"])
+        return forward(handler, request)
+
+    cache.stats.record("misses", name)
+    if stage is not None:
+        stage.record["cache"] = "miss"
+    token = _pending.set(PendingEntry(handler, key, cache, request))
+    try:
+        return handle(handler, request)
+    finally:
+        _pending.reset(token)
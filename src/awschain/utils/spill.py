@@ -0,0 +1,125 @@
+import codecs
+import mmap
+import os
+import tempfile
+import weakref
+from .text_stream import LazyText
+
+# Characters encoded per write when spilling, so the UTF-8 copy of a large
+# text never exists in memory all at once.
+_ENCODE_CHUNK = 1024 * 1024
+
+
+class SpilledText(LazyText):
+    """
+    Text spilled to a temporary file and read back through a memory map.
+
+    Handlers that only pass the text along never load it: the pages of the map
+    are paged in by the OS only when read. len() is known without reading.
+    Chunk-aware handlers use iter_chunks / write_to; everything else (str(),
+    str methods, slicing) decodes the full text on demand without keeping it.
+    The file is deleted when the object is garbage collected.
+    """
+
+    def __init__(self, text: str, directory: str = None, chunk_size: int = 1024 * 1024):
+        directory = directory or os.getenv("SPILL_DIR") or os.path.join(tempfile.gettempdir(), "awschain-spill")
+        os.makedirs(directory, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.length = len(text)
+        fd, self.path = tempfile.mkstemp(prefix="text-", suffix=".txt", dir=directory)
+        with os.fdopen(fd, "wb") as file:
+            for start in range(0, len(text), _ENCODE_CHUNK):
+                file.write(text[start:start + _ENCODE_CHUNK].encode("utf-8"))
+            file.flush()
+            self.nbytes = file.tell()
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.nbytes else None
+        self._finalizer = weakref.finalize(self, _cleanup, self._map, self.path)
+
+    def iter_chunks(self):
+        if self._map is None:
+            return
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for start in range(0, self.nbytes, self.chunk_size):
+            text = decoder.decode(self._map[start:start + self.chunk_size])
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def materialize(self) -> str:
+        return str(self._map[:], "utf-8") if self._map is not None else ""
+
+    def size_hint(self):
+        return self.length
+
+    def __len__(self):
+        return self.length
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # Immutable, so copies of a request (e.g. parallel branches) share the file.
+        return self
+
+    def __reduce__(self):
+        # The file belongs to this process; pickles (checkpoints, worker processes) carry the text.
+        return (str, (self.materialize(),))
+
+    def __repr__(self):
+        return f"SpilledText(length={self.length}, path={self.path!r})"
+
+    def close(self):
+        self._finalizer()
+
+
+def _cleanup(mapping, path):
+    if mapping is not None:
+        mapping.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def current_rss() -> int:
+    """
+    Returns the resident memory of this process in bytes, or 0 when unknown.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def spill_fields() -> tuple:
+    return tuple(field.strip() for field in os.getenv("SPILL_FIELDS", "text").split(",") if field.strip())
+
+
+def maybe_spill(request: dict) -> dict:
+    """
+    Spills large text values of the request to disk in place.
+
+    A value is spilled when it is longer than SPILL_THRESHOLD characters, or,
+    while the process uses more than SPILL_MEMORY_BUDGET bytes of memory, when
+    it is longer than SPILL_MIN_SIZE. Both are off (0) by default.
+    """
+    threshold = int(os.getenv("SPILL_THRESHOLD", 0))
+    budget = int(os.getenv("SPILL_MEMORY_BUDGET", 0))
+    if not threshold and not budget:
+        return request
+    over_budget = None
+    for field in spill_fields():
+        value = request.get(field)
+        if type(value) is not str:
+            continue
+        spill = threshold and len(value) > threshold
+        if not spill and budget and len(value) > int(os.getenv("SPILL_MIN_SIZE", 1024 * 1024)):
+            if over_budget is None:
+                over_budget = current_rss() > budget
+            spill = over_budget
+        if spill:
+            request[field] = SpilledText(value)
+    return request
@@ -0,0 +1,317 @@
+import codecs
+import itertools
+from abc import ABC, abstractmethod
+
+WHITESPACE = (" ", "\n", "\t", "\r", "\f")
+
+
+class LazyText(ABC):
+    """
+    Base class for text values that are produced or stored lazily instead of as
+    one in-memory string.
+
+    Chunk-aware handlers (AbstractHandler.accepts_lazy_text) read the text piece
+    by piece through iter_chunks or write_to. Other handlers never see it: the
+    value is materialized to a str before their handle runs. Within a chunk-aware
+    handler, str(), formatting, comparisons and str methods also materialize it.
+    """
+
+    @abstractmethod
+    def iter_chunks(self):
+        """
+        Yields the text in order, one str chunk at a time.
+        """
+
+    @abstractmethod
+    def materialize(self) -> str:
+        """
+        Returns the whole text as one str.
+        """
+
+    def size_hint(self):
+        """
+        Returns the length of the text if it is known without reading it, else None.
+        """
+        return None
+
+    def write_to(self, file):
+        """
+        Writes the text to an open text file chunk by chunk.
+        """
+        for chunk in self.iter_chunks():
+            file.write(chunk)
+
+    def rechunk(self, max_size: int, unit: str = "chars") -> "TextStream":
+        """
+        Returns a stream of pieces no larger than max_size characters (unit="chars")
+        or UTF-8 bytes (unit="bytes"), cut at whitespace where possible.
+        """
+        return TextStream(rechunk(self.iter_chunks(), max_size, unit))
+
+    def __str__(self):
+        return self.materialize()
+
+    def __repr__(self):
+        # Does not read the text, so printing a request stays cheap.
+        size = self.size_hint()
+        return f"<{type(self).__name__} of {size if size is not None else 'unknown'} characters>"
+
+    def __format__(self, format_spec):
+        return format(self.materialize(), format_spec)
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __bool__(self):
+        size = self.size_hint()
+        return size > 0 if size is not None else len(self) > 0
+
+    def __eq__(self, other):
+        if isinstance(other, (str, LazyText)):
+            return self.materialize() == str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.materialize())
+
+    def __contains__(self, item):
+        return item in self.materialize()
+
+    def __getitem__(self, key):
+        return self.materialize()[key]
+
+    def __add__(self, other):
+        return self.materialize() + other
+
+    def __radd__(self, other):
+        return other + self.materialize()
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined on the class: delegate str methods.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+
+class TextStream(LazyText):
+    """
+    Text passed between handlers as an iterator of segments.
+
+    A stream is single-pass: chunks are handed out as they are produced and not
+    kept, so peak memory is bounded by the segment size. With buffer=True the
+    segments are kept as they are consumed, so the full text can still be
+    assembled after a chunk-aware consumer has read them (used for model output
+    that is both streamed and needed as a whole downstream).
+    """
+
+    def __init__(self, segments, buffer: bool = False):
+        self._source = iter(segments)
+        self._buffer = [] if buffer else None
+        self._text = None
+        self._consumed = False
+        self._on_complete = []
+
+    @property
+    def buffered(self) -> bool:
+        return self._buffer is not None or self._text is not None
+
+    def when_complete(self, callback):
+        """
+        Calls callback(text) once the whole text has been produced, e.g. after a
+        downstream handler read a buffered stream to the end (at once if it already was).
+        """
+        if self._text is not None:
+            callback(self._text)
+        else:
+            self._on_complete.append(callback)
+
+    def _complete(self, text: str):
+        callbacks, self._on_complete = self._on_complete, []
+        for callback in callbacks:
+            callback(text)
+
+    @classmethod
+    def concat(cls, *parts) -> "TextStream":
+        """
+        Builds a stream from strings and other streams without materializing them.
+        """
+        return cls(itertools.chain.from_iterable(
+            part.iter_chunks() if isinstance(part, LazyText) else [part] for part in parts if part is not None))
+
+    def iter_chunks(self):
+        if self._text is not None:
+            yield self._text
+            return
+        if self._buffer is not None:
+            # Replay what was consumed already, then keep pulling from the source.
+            index = 0
+            while True:
+                if index < len(self._buffer):
+                    yield self._buffer[index]
+                    index += 1
+                    continue
+                segment = next(self._source, None)
+                if segment is None:
+                    if self._text is None:
+                        self._text = "".join(self._buffer)
+                        self._complete(self._text)
+                    return
+                self._buffer.append(segment)
+        else:
+            if self._consumed:
+                raise RuntimeError("TextStream has already been consumed.")
+            self._consumed = True
+            for segment in self._source:
+                yield segment
+
+    def materialize(self) -> str:
+        if self._text is None:
+            self._text = "".join(self.iter_chunks())
+            self._buffer = None
+            self._source = iter(())
+            self._complete(self._text)
+        return self._text
+
+    def size_hint(self):
+        return len(self._text) if self._text is not None else None
+
+    def __bool__(self):
+        # Peeks at the next non-empty segment instead of reading the whole stream.
+        if self._text is not None:
+            return bool(self._text)
+        if self._buffer and any(self._buffer):
+            return True
+        for segment in self._source:
+            if segment:
+                self._source = itertools.chain([segment], self._source)
+                return True
+        return False
+
+    def __reduce__(self):
+        # Pickling (checkpoints, worker processes, the result cache) and deepcopy need the
+        # full text; the copy is buffered since it holds that text anyway and can be re-read.
+        return (TextStream, ((self.materialize(),), True))
+
+    def map(self, func) -> "TextStream":
+        """
+        Returns a new stream applying func to every segment.
+        """
+        return TextStream(func(chunk) for chunk in self.iter_chunks())
+
+
+class PromptedText(TextStream):
+    """
+    A prompt template around streamed text: reads as prefix, source, suffix.
+    The parts are kept so a consumer that splits the text into several model
+    calls can repeat the instructions around every chunk of the source.
+    """
+
+    def __init__(self, prefix: str, source: LazyText, suffix: str):
+        super().__init__(itertools.chain([prefix], _lazy_chunks(source), [suffix]))
+        self.prefix = prefix
+        self.source = source
+        self.suffix = suffix
+
+
+def _lazy_chunks(text: LazyText):
+    # Defers iter_chunks so a single-pass source is only claimed when read.
+    yield from text.iter_chunks()
+
+
+class FileText(LazyText):
+    """
+    Text stored in a region of a UTF-8 file, read back in chunks on demand.
+    Unlike a TextStream it can be read any number of times.
+    """
+
+    def __init__(self, path: str, start: int = 0, end: int = None, chunk_size: int = 1024 * 1024):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.chunk_size = chunk_size
+
+    def iter_chunks(self):
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        with open(self.path, "rb") as file:
+            file.seek(self.start)
+            remaining = self.end - self.start if self.end is not None else None
+            while remaining is None or remaining > 0:
+                size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                data = file.read(size)
+                if not data:
+                    break
+                if remaining is not None:
+                    remaining -= len(data)
+                text = decoder.decode(data)
+                if text:
+                    yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def materialize(self) -> str:
+        return "".join(self.iter_chunks())
+
+
+def materialize_lazy_values(request) -> None:
+    """
+    Replaces the LazyText values of a request with str, in place.
+    """
+    for key, value in list(request.items()):
+        if isinstance(value, LazyText):
+            request[key] = value.materialize()
+
+
+def iter_text_chunks(text, max_size: int, unit: str = "chars"):
+    """
+    Yields pieces of a str or LazyText no larger than max_size, cut at whitespace
+    where possible, without materializing lazy text.
+    """
+    segments = text.iter_chunks() if isinstance(text, LazyText) else [text or ""]
+    return rechunk(segments, max_size, unit)
+
+
+def rechunk(segments, max_size: int, unit: str = "chars"):
+    """
+    Regroups an iterable of text segments into pieces of at most max_size
+    characters or UTF-8 bytes. Pieces end at the last whitespace that fits,
+    or are hard-cut when a single word is longer than max_size. The pieces
+    concatenate back to the exact input.
+    """
+    if unit not in ("chars", "bytes"):
+        raise ValueError(f"Unsupported unit: {unit}")
+
+    if unit == "bytes":
+        # Whitespace bytes never occur inside a multi-byte UTF-8 sequence, so cutting
+        # at them (or at a character boundary) always yields valid text.
+        encoded = (segment.encode("utf-8") for segment in segments)
+        for piece in _rechunk(encoded, max_size, (b" ", b"\n", b"\t", b"\r", b"\f"), _utf8_boundary):
+            yield piece.decode("utf-8")
+    else:
+        yield from _rechunk(segments, max_size, WHITESPACE, lambda buffer, end: end)
+
+
+def _rechunk(segments, max_size, separators, align):
+    buffer = None
+    for segment in segments:
+        buffer = segment if buffer is None else buffer + segment
+        start = 0
+        while len(buffer) - start > max_size:
+            end = start + max_size
+            cut = max(buffer.rfind(separator, start, end) for separator in separators) + 1
+            if cut <= start:
+                cut = align(buffer, end)
+                if cut <= start:
+                    cut = end
+            yield buffer[start:cut]
+            start = cut
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+
+def _utf8_boundary(buffer: bytes, cut: int) -> int:
+    # Step back over continuation bytes (0b10xxxxxx) to the start of a character.
+    while cut > 0 and (buffer[cut] & 0xC0) == 0x80:
+        cut -= 1
+    return cut
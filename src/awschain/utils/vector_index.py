@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from .chunking import ChunkPlanner
+# External Dependencies (imported on first use):
+from .lazy_import import lazy_import
+numpy = lazy_import("numpy")
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.jsonl"
+META_FILE = "meta.json"
+
+
+def index_directory() -> str:
+    return os.getenv("AMAZON_BEDROCK_VECTOR_INDEX_DIR") or os.path.join(os.getenv("DIR_STORAGE", "./downloads"), "vector_index")
+
+
+def retrieval_planner() -> ChunkPlanner:
+    """
+    The planner for retrieval chunks: AMAZON_BEDROCK_EMBEDDING_CHUNK_CHARS characters
+    overlapping by AMAZON_BEDROCK_EMBEDDING_CHUNK_OVERLAP.
+    """
+    return ChunkPlanner(int(os.getenv("AMAZON_BEDROCK_EMBEDDING_CHUNK_CHARS", 2000)),
+                        overlap=int(os.getenv("AMAZON_BEDROCK_EMBEDDING_CHUNK_OVERLAP", 200)))
+
+
+def index_key(text: str, model_id: str, planner: ChunkPlanner, dimensions: int = None) -> str:
+    """
+    Names the index of a text: the same text, model, dimensions and chunking reuse it.
+    """
+    digest = hashlib.sha256()
+    for part in (model_id, str(dimensions or ""), planner.unit, str(planner.max_size), str(planner.overlap), text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:24]
+
+
+class VectorIndex:
+    """
+    A local index of the chunks of one document and their embeddings, stored in a directory:
+
+    - vectors.npy: one L2-normalized float32 row per chunk, memory-mapped on open,
+      so a large index is paged in by the OS rather than loaded up front
+    - chunks.jsonl: the text and source offsets of each chunk, one per line
+    - meta.json: the embedding model, dimensions and chunk count
+
+    search() ranks the chunks by cosine similarity to a query vector.
+    """
+
+    def __init__(self, directory: str, vectors, chunks: list, meta: dict):
+        self.directory = directory
+        self.vectors = vectors
+        self.chunks = chunks
+        self.meta = meta
+
+    @property
+    def model_id(self) -> str:
+        return self.meta["model_id"]
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, META_FILE))
+
+    @classmethod
+    def open(cls, directory: str) -> "VectorIndex":
+        with open(os.path.join(directory, META_FILE)) as file:
+            meta = json.load(file)
+        with open(os.path.join(directory, CHUNKS_FILE), encoding="utf-8") as file:
+            chunks = [json.loads(line) for line in file if line.strip()]
+        vectors = numpy.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        return cls(directory, vectors, chunks, meta)
+
+    @classmethod
+    def build(cls, directory: str, chunks: list, embedder) -> "VectorIndex":
+        """
+        Embeds the chunks (ChunkPlanner Chunks) with embedder (see BedrockEmbedder) and
+        writes the index to directory. Vectors are written to the memory-mapped file
+        batch by batch as they arrive. The index is assembled in a temporary directory
+        and moved into place, so a partly written index is never opened.
+        """
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".vector_index-")
+        try:
+            vectors = None
+            for start, batch in embedder.iter_batches([chunk.text for chunk in chunks]):
+                batch = numpy.asarray(batch, dtype=numpy.float32)
+                if vectors is None:
+                    vectors = numpy.lib.format.open_memmap(os.path.join(tmp_dir, VECTORS_FILE), mode="w+",
+                                                           dtype=numpy.float32, shape=(len(chunks), batch.shape[1]))
+                norms = numpy.linalg.norm(batch, axis=1, keepdims=True)
+                vectors[start:start + len(batch)] = batch / numpy.where(norms == 0, 1, norms)
+            if vectors is None:
+                raise ValueError("No text to index")
+            vectors.flush()
+            dimensions = vectors.shape[1]
+            del vectors
+            with open(os.path.join(tmp_dir, CHUNKS_FILE), "w", encoding="utf-8") as file:
+                for chunk in chunks:
+                    file.write(json.dumps({"text": chunk.text, "start": chunk.start, "end": chunk.end}) + "\n")
+            with open(os.path.join(tmp_dir, META_FILE), "w") as file:
+                json.dump({"model_id": embedder.model_id, "dimensions": dimensions, "count": len(chunks)}, file)
+            try:
+                os.replace(tmp_dir, directory)
+            except OSError:
+                # Another process built the same index first.
+                if not cls.exists(directory):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return cls.open(directory)
+
+    def search(self, query_vector, top_k: int = 5) -> list:
+        """
+        Returns the top_k most similar chunks as (score, chunk) pairs, best first.
+        """
+        if not len(self):
+            return []
+        query = numpy.asarray(query_vector, dtype=numpy.float32)
+        norm = numpy.linalg.norm(query)
+        scores = self.vectors @ (query / norm if norm else query)
+        top_k = min(top_k, len(scores))
+        best = numpy.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[numpy.argsort(-scores[best])]
+        return [(float(scores[index]), self.chunks[index]) for index in best]
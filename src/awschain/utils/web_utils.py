@@ -1,5 +1,7 @@
 from urllib.request import urlopen
-from bs4 import BeautifulSoup
+from .lazy_import import lazy_import
+
+BeautifulSoup = lazy_import("bs4", "BeautifulSoup", package="beautifulsoup4")
 
 def fetch_webpage(url):
     try:
@@ -0,0 +1,4 @@
+from .queues import Message, SQLiteQueue, SQSQueue, open_queue
+from .worker import Worker
+
+__all__ = ['Message', 'SQLiteQueue', 'SQSQueue', 'open_queue', 'Worker']
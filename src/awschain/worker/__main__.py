@@ -0,0 +1,5 @@
+import sys
+from ..cli import main
+
+if __name__ == "__main__":
+    sys.exit(main(["worker", *sys.argv[1:]]))
@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from ..utils.aws_boto_client_manager import AWSBotoClientManager
+
+
+class Message:
+    """
+    A request taken from a queue. It stays invisible to other consumers until it
+    is acknowledged (deleted) or its visibility timeout expires, which gives
+    at-least-once delivery.
+    """
+
+    __slots__ = ("id", "body", "receipt", "receive_count")
+
+    def __init__(self, id, body: dict, receipt, receive_count: int = 1):
+        self.id = id
+        self.body = body
+        self.receipt = receipt
+        self.receive_count = receive_count
+
+    def __repr__(self):
+        return f"Message(id={self.id!r}, receive_count={self.receive_count})"
+
+
+class SQLiteQueue:
+    """
+    Durable local queue in a SQLite file, safe to share between threads and
+    processes. Messages received more than max_receives times are moved to the
+    dead_letters table instead of being delivered again.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = None, max_receives: int = None):
+        self.path = path
+        self.visibility_timeout = visibility_timeout if visibility_timeout is not None else float(os.getenv("WORKER_VISIBILITY_TIMEOUT", 300))
+        self.max_receives = max_receives if max_receives is not None else int(os.getenv("WORKER_MAX_RECEIVES", 5))
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, body TEXT NOT NULL, "
+            "available_at REAL NOT NULL, receive_count INTEGER NOT NULL DEFAULT 0, receipt TEXT)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS messages_available ON messages (available_at)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters (id INTEGER PRIMARY KEY, body TEXT NOT NULL, "
+            "receive_count INTEGER NOT NULL, failed_at REAL NOT NULL)")
+
+    def put(self, request: dict, delay: float = 0):
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO messages (body, available_at) VALUES (?, ?)", (json.dumps(dict(request)), time.time() + delay))
+        return cursor.lastrowid
+
+    def receive(self, max_messages: int = 1, wait_time: float = 0) -> list:
+        """
+        Claims up to max_messages available messages, waiting up to wait_time
+        seconds for at least one.
+        """
+        deadline = time.monotonic() + wait_time
+        while True:
+            messages = self._claim(max_messages)
+            if messages or time.monotonic() >= deadline:
+                return messages
+            time.sleep(min(0.2, max(0.0, deadline - time.monotonic())))
+
+    def _claim(self, max_messages: int) -> list:
+        now = time.time()
+        messages = []
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._connection.execute(
+                    "SELECT id, body, receive_count FROM messages WHERE available_at <= ? ORDER BY id LIMIT ?",
+                    (now, max_messages)).fetchall()
+                for id, body, receive_count in rows:
+                    if receive_count >= self.max_receives:
+                        self._connection.execute(
+                            "INSERT OR REPLACE INTO dead_letters (id, body, receive_count, failed_at) VALUES (?, ?, ?, ?)",
+                            (id, body, receive_count, now))
+                        self._connection.execute("DELETE FROM messages WHERE id = ?", (id,))
+                        continue
+                    receipt = uuid.uuid4().hex
+                    self._connection.execute(
+                        "UPDATE messages SET available_at = ?, receive_count = receive_count + 1, receipt = ? WHERE id = ?",
+                        (now + self.visibility_timeout, receipt, id))
+                    messages.append(Message(id, json.loads(body), receipt, receive_count + 1))
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return messages
+
+    def ack(self, message: Message):
+        """
+        Deletes a processed message. A stale receipt (the message timed out and
+        was delivered again) leaves the newer delivery in place.
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM messages WHERE id = ? AND receipt = ?", (message.id, message.receipt))
+
+    def nack(self, message: Message, delay: float = 0):
+        """
+        Makes a message available again after delay seconds.
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE messages SET available_at = ?, receipt = NULL WHERE id = ? AND receipt = ?",
+                (time.time() + delay, message.id, message.receipt))
+
+    def extend(self, message: Message):
+        """
+        Keeps a message being processed hidden for another visibility timeout.
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE messages SET available_at = ? WHERE id = ? AND receipt = ?",
+                (time.time() + self.visibility_timeout, message.id, message.receipt))
+
+    def size(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def dead_letters(self) -> list:
+        with self._lock:
+            rows = self._connection.execute("SELECT body FROM dead_letters ORDER BY id").fetchall()
+        return [json.loads(body) for body, in rows]
+
+    def close(self):
+        self._connection.close()
+
+
+class SQSQueue:
+    """
+    Amazon SQS queue (or any service implementing the same API). The client is
+    injectable so a local stand-in can be used; by default it comes from
+    AWSBotoClientManager. Retries beyond the queue's redrive policy are left to
+    SQS dead-letter queues.
+    """
+
+    def __init__(self, queue_url: str, client=None, wait_time: int = 20, visibility_timeout: int = None):
+        self.queue_url = queue_url
+        self.client = client or AWSBotoClientManager.get_client("sqs")
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+
+    def put(self, request: dict, delay: float = 0):
+        response = self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(dict(request)), DelaySeconds=int(delay))
+        return response.get("MessageId")
+
+    def receive(self, max_messages: int = 1, wait_time: float = None) -> list:
+        params = {
+            "QueueUrl": self.queue_url,
+            # SQS returns at most 10 messages per call.
+            "MaxNumberOfMessages": max(1, min(10, max_messages)),
+            "WaitTimeSeconds": int(self.wait_time if wait_time is None else wait_time),
+            "AttributeNames": ["ApproximateReceiveCount"],
+        }
+        if self.visibility_timeout is not None:
+            params["VisibilityTimeout"] = int(self.visibility_timeout)
+        response = self.client.receive_message(**params)
+        return [
+            Message(item["MessageId"], json.loads(item["Body"]), item["ReceiptHandle"],
+                    int(item.get("Attributes", {}).get("ApproximateReceiveCount", 1)))
+            for item in response.get("Messages", [])
+        ]
+
+    def ack(self, message: Message):
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message.receipt)
+
+    def nack(self, message: Message, delay: float = 0):
+        self.client.change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=message.receipt, VisibilityTimeout=int(delay))
+
+    def extend(self, message: Message):
+        """
+        Keeps a message being processed hidden for another visibility timeout
+        (visibility_timeout, or WORKER_VISIBILITY_TIMEOUT when the queue default is used).
+        """
+        timeout = self.visibility_timeout if self.visibility_timeout is not None else float(os.getenv("WORKER_VISIBILITY_TIMEOUT", 300))
+        self.client.change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=message.receipt, VisibilityTimeout=int(timeout))
+
+    def close(self):
+        pass
+
+
+def open_queue(url: str):
+    """
+    Opens a queue from a URL: sqlite:///absolute/path.db, sqlite:relative/path.db,
+    or an SQS queue URL (https://sqs.<region>.amazonaws.com/<account>/<name>).
+    """
+    if url.startswith("sqlite:"):
+        path = url[len("sqlite:"):]
+        if path.startswith("//"):
+            path = path[2:]
+        return SQLiteQueue(path)
+    if url.startswith(("https://", "http://")):
+        return SQSQueue(url)
+    raise ValueError(f"Unsupported queue URL: {url}")
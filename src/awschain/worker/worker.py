@@ -0,0 +1,170 @@
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ..handlers.abstract_handler import AbstractHandler
+
+
+class Worker:
+    """
+    Long-running consumer that pulls request dicts from a queue and runs them
+    through a handler chain, keeping handler classes, compiled chains and boto3
+    clients warm between requests.
+
+    chain is a handler instance shared by every request, or a callable that
+    receives the request and returns a chain (e.g. built from a ChainRegistry).
+    Up to concurrency requests run at the same time. A message is acknowledged
+    only after its chain finished; a failing chain negatively acknowledges it so
+    it is delivered again after retry_delay seconds (at-least-once). While a
+    chain runs, its message's visibility is extended every heartbeat_interval
+    seconds, so long requests are not delivered to another worker.
+    """
+
+    def __init__(self, queue, chain, concurrency: int = None, retry_delay: float = None, poll_wait: float = None, on_result=None,
+                 heartbeat_interval: float = None):
+        self.queue = queue
+        self.chain = chain
+        self.concurrency = concurrency or int(os.getenv("WORKER_CONCURRENCY", 4))
+        self.retry_delay = retry_delay if retry_delay is not None else float(os.getenv("WORKER_RETRY_DELAY", 30))
+        self.poll_wait = poll_wait if poll_wait is not None else float(os.getenv("WORKER_POLL_WAIT", 1))
+        self.on_result = on_result
+        # 0 disables the heartbeat.
+        self.heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else float(os.getenv("WORKER_HEARTBEAT_INTERVAL", 60))
+        self.processed = 0
+        self.failed = 0
+        self._stopping = threading.Event()
+        self._slots = threading.Semaphore(self.concurrency)
+        self._counter_lock = threading.Lock()
+        self._in_flight = 0
+        # Message id -> message whose chain is running, extended by the heartbeat.
+        self._running = {}
+
+    def build_chain(self, request: dict) -> AbstractHandler:
+        if isinstance(self.chain, AbstractHandler):
+            return self.chain
+        return self.chain(request)
+
+    def stop(self):
+        """
+        Stops taking new messages; requests already running are finished and acknowledged.
+        """
+        self._stopping.set()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def run(self, stop_when_empty: bool = False, install_signal_handlers: bool = None):
+        """
+        Processes messages until stop() is called (or SIGTERM / SIGINT is
+        received), then drains the requests in flight. With stop_when_empty the
+        worker also stops once the queue has no available message and nothing is
+        running.
+        """
+        if install_signal_handlers is None:
+            install_signal_handlers = threading.current_thread() is threading.main_thread()
+        previous_handlers = self._install_signal_handlers() if install_signal_handlers else {}
+
+        print(f"[Worker] Started with concurrency {self.concurrency}")
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="awschain-worker")
+        heartbeat_stop = threading.Event()
+        heartbeat = None
+        if self.heartbeat_interval > 0:
+            heartbeat = threading.Thread(target=self._heartbeat, args=(heartbeat_stop,), name="awschain-worker-heartbeat", daemon=True)
+            heartbeat.start()
+        try:
+            while not self.stopping:
+                # Only fetch as many messages as there are free slots, so nothing
+                # sits claimed (and invisible to other workers) while waiting.
+                self._slots.acquire()
+                free = 1
+                while free < self.concurrency and self._slots.acquire(blocking=False):
+                    free += 1
+                try:
+                    messages = [] if self.stopping else self.queue.receive(max_messages=free, wait_time=self.poll_wait)
+                except Exception as e:
+                    print(f"[Worker] Failed to receive messages: {e}")
+                    messages = []
+                    time.sleep(self.poll_wait)
+                for _ in range(free - len(messages)):
+                    self._slots.release()
+                if not messages:
+                    if stop_when_empty and self._idle():
+                        break
+                    continue
+                for message in messages:
+                    with self._counter_lock:
+                        self._in_flight += 1
+                    executor.submit(self._process, message)
+        finally:
+            print("[Worker] Draining requests in flight...")
+            executor.shutdown(wait=True)
+            heartbeat_stop.set()
+            if heartbeat is not None:
+                heartbeat.join()
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            print(f"[Worker] Stopped: {self.processed} processed, {self.failed} failed")
+
+    def _idle(self) -> bool:
+        with self._counter_lock:
+            return self._in_flight == 0
+
+    def _heartbeat(self, stop: threading.Event):
+        while not stop.wait(self.heartbeat_interval):
+            with self._counter_lock:
+                messages = list(self._running.values())
+            for message in messages:
+                try:
+                    self.queue.extend(message)
+                except Exception as e:
+                    print(f"[Worker] Failed to extend the visibility of message {message.id}: {e}")
+
+    def _process(self, message):
+        try:
+            with self._counter_lock:
+                self._running[message.id] = message
+            try:
+                # Stage by stage, so spilled texts are freed between handlers.
+                result = self.build_chain(message.body).handle_in_stages(message.body)
+            except Exception as e:
+                print(f"[Worker] Request {message.id} failed (attempt {message.receive_count}): {e}")
+                with self._counter_lock:
+                    self.failed += 1
+                try:
+                    self.queue.nack(message, delay=self.retry_delay)
+                except Exception as nack_error:
+                    # The message becomes visible again when its visibility timeout expires.
+                    print(f"[Worker] Failed to release message {message.id}: {nack_error}")
+                return
+            finally:
+                with self._counter_lock:
+                    self._running.pop(message.id, None)
+            try:
+                self.queue.ack(message)
+            except Exception as e:
+                print(f"[Worker] Failed to acknowledge message {message.id}: {e}")
+                return
+            with self._counter_lock:
+                self.processed += 1
+            if self.on_result is not None:
+                try:
+                    self.on_result(message, result)
+                except Exception as e:
+                    # The request succeeded and stays acknowledged.
+                    print(f"[Worker] Failed to handle the result of message {message.id}: {e}")
+        finally:
+            with self._counter_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def _install_signal_handlers(self) -> dict:
+        def handle_signal(signum, frame):
+            print(f"[Worker] Received signal {signum}, finishing requests in flight...")
+            self.stop()
+
+        previous = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous[signum] = signal.signal(signum, handle_signal)
+        return previous
@@ -0,0 +1,357 @@
+import io
+import os
+import json
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from awschain.utils import bedrock
+from awschain.utils.text_stream import TextStream, PromptedText
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.processors import amazon_bedrock_handler
+from awschain.handlers.processors.amazon_bedrock_handler import AmazonBedrockHandler
+from awschain.handlers.processors.amazon_bedrock_chat_handler import AmazonBedrockChatHandler
+from awschain.handlers.processors.amazon_bedrock_embeddings_handler import AmazonBedrockEmbeddingsHandler
+from awschain.handlers.writers.local_file_writer_handler import LocalFileWriterHandler
+
+CLAUDE_3 = {
+    "AMAZON_BEDROCK_MODEL_ID": "anthropic.claude-3-haiku-20240307-v1:0",
+    "AMAZON_BEDROCK_MODEL_PROPS": '{"max_tokens": 100, "anthropic_version": "bedrock-2023-05-31", "messages": [{"role": "user", "content": ""}]}',
+    "AMAZON_BEDROCK_PROMPT_TEMPLATE": "{prompt_text}",
+    "AMAZON_BEDROCK_PROMPT_INPUT_VAR": "$.messages[0].content",
+    "AMAZON_BEDROCK_OUTPUT_JSONPATH": "$.content[0].text",
+    "RESULT_CACHE": "",
+}
+
+def delta(text):
+    return {"chunk": {"bytes": json.dumps({"type": "content_block_delta", "delta": {"text": text}}).encode("utf-8")}}
+
+class StreamingClient:
+    """
+    Streams the given tokens; on_token is called before each token is handed out.
+    """
+
+    def __init__(self, tokens, on_token=None):
+        self.tokens = tokens
+        self.on_token = on_token
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        def events():
+            for index, token in enumerate(self.tokens):
+                if self.on_token:
+                    self.on_token(index)
+                yield delta(token)
+        return {"body": events()}
+
+class RecordHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        request["final_text"] = str(request["text"])
+        return super().handle(request)
+
+class TestAmazonBedrockStreaming(unittest.TestCase):
+    def setUp(self):
+        bedrock.clear_invocation_plans()
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = patch.dict(os.environ, CLAUDE_3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        bedrock.clear_invocation_plans()
+        self.tmp.cleanup()
+
+    def use_client(self, client):
+        patcher = patch.object(bedrock.AWSBotoClientManager, "get_client", return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tokens_reach_writer_as_they_arrive(self):
+        path = os.path.join(self.tmp.name, "summary.txt")
+        written = []
+
+        def snapshot(index):
+            if os.path.exists(path):
+                with open(path) as f:
+                    written.append(f.read())
+
+        self.use_client(StreamingClient(["The ", "summary", "."], on_token=snapshot))
+        chain = AmazonBedrockHandler()
+        chain.set_next(LocalFileWriterHandler()).set_next(RecordHandler())
+        with redirect_stdout(io.StringIO()):
+            result = chain.handle({"text": "long document", "stream_response": True, "write_file_path": path})
+
+        # Earlier tokens were in the file before the model produced the next ones.
+        self.assertEqual(written, ["", "The ", "The summary"])
+        self.assertEqual(result["final_text"], "The summary.")
+        with open(path) as f:
+            self.assertEqual(f.read(), "The summary.\n")
+
+    def test_streamed_summary_is_buffered(self):
+        self.use_client(StreamingClient(["a", "b"]))
+        with redirect_stdout(io.StringIO()):
+            result = AmazonBedrockHandler().handle({"text": "doc", "stream_response": True})
+        self.assertIsInstance(result["text"], TextStream)
+        self.assertEqual("".join(result["text"].iter_chunks()), "ab")
+        self.assertEqual(str(result["text"]), "ab")
+
+    def test_chat_prints_tokens_incrementally(self):
+        self.use_client(StreamingClient(["Hi", " there"]))
+        output = io.StringIO()
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_STREAM": "true"}), \
+                patch("builtins.input", side_effect=["hello?", KeyboardInterrupt, "yes"]), redirect_stdout(output):
+            result = AmazonBedrockChatHandler().handle({"text": "document"})
+        self.assertIn("Model: Hi there\n", output.getvalue())
+        history = json.loads(result["text"])["messages"]
+        self.assertEqual(history[-1], {"role": "assistant", "content": "Hi there"})
+
+class ChatClient:
+    """
+    Answers every chat turn and records the request bodies.
+    """
+
+    def __init__(self):
+        self.bodies = []
+
+    def invoke_model(self, **kwargs):
+        self.bodies.append(kwargs["body"])
+        text = "summary of the chat" if "Current summary" in kwargs["body"] else f"answer {len(self.bodies)}"
+        return {"body": io.BytesIO(json.dumps({"content": [{"text": text}]}).encode("utf-8"))}
+
+class TestBoundedChat(unittest.TestCase):
+    def test_request_size_stays_bounded(self):
+        client = ChatClient()
+        env = {**CLAUDE_3, "AMAZON_BEDROCK_MODEL_ID": "anthropic.claude-3-5-haiku-20241022-v1:0",
+               "AMAZON_BEDROCK_CHAT_CONTEXT": "summary", "AMAZON_BEDROCK_CHAT_WINDOW_TURNS": "4"}
+        questions = [f"question number {turn} about the document?" for turn in range(30)]
+        output = io.StringIO()
+        with patch.dict(os.environ, env), patch.object(bedrock.AWSBotoClientManager, "get_client", return_value=client), \
+                patch("builtins.input", side_effect=questions + [KeyboardInterrupt, "yes"]), redirect_stdout(output):
+            bedrock.clear_invocation_plans()
+            self.addCleanup(bedrock.clear_invocation_plans)
+            result = AmazonBedrockChatHandler().handle({"text": "the document " * 200})
+
+        turns = [json.loads(body) for body in client.bodies if "Current summary" not in body]
+        self.assertEqual(len(turns), 30)
+        sizes = [len(json.dumps(turn)) for turn in turns]
+        self.assertLess(max(sizes[10:]), sizes[0] + 1000)
+        # The document is a cached system prefix, sent once per turn rather than in the messages.
+        self.assertEqual(turns[-1]["system"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertLessEqual(len(turns[-1]["messages"]), 9)
+        self.assertEqual(turns[-1]["messages"][-1]["content"], questions[-1])
+        # The history handed on holds the turns but not the document.
+        history = json.loads(result["text"])["messages"]
+        self.assertEqual(len(history), 60)
+        self.assertEqual(history[0]["content"], questions[0])
+        # Only a preview of the document is printed.
+        self.assertIn("Document of 2600 characters:", output.getvalue())
+        self.assertNotIn("the document " * 30, output.getvalue())
+        self.assertIn("questions on this document", output.getvalue())
+
+    def test_full_mode_prints_the_whole_text(self):
+        client = ChatClient()
+        env = {**CLAUDE_3, "AMAZON_BEDROCK_CHAT_CONTEXT": "full"}
+        output = io.StringIO()
+        with patch.dict(os.environ, env), patch.object(bedrock.AWSBotoClientManager, "get_client", return_value=client), \
+                patch("builtins.input", side_effect=["what is it?", KeyboardInterrupt, "no"]), redirect_stdout(output):
+            bedrock.clear_invocation_plans()
+            self.addCleanup(bedrock.clear_invocation_plans)
+            AmazonBedrockChatHandler().handle({"text": "the document " * 200})
+        self.assertIn("the document " * 200, output.getvalue())
+        self.assertIn("questions on the text above", output.getvalue())
+        self.assertNotIn("Document of", output.getvalue())
+
+class CountingClient:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        return {"body": io.BytesIO(json.dumps({"content": [{"text": "summary"}]}).encode("utf-8"))}
+
+class TestResponseCacheBypass(unittest.TestCase):
+    def test_use_cache_false_calls_the_model(self):
+        client = CountingClient()
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.dict(os.environ, {**CLAUDE_3, "AMAZON_BEDROCK_RESPONSE_CACHE": "directory", "AMAZON_BEDROCK_RESPONSE_CACHE_PATH": tmp}), \
+                patch.object(bedrock.AWSBotoClientManager, "get_client", return_value=client), redirect_stdout(io.StringIO()):
+            bedrock.clear_invocation_plans()
+            self.addCleanup(bedrock.clear_invocation_plans)
+            for use_cache in (True, True, False):
+                result = AmazonBedrockHandler().handle({"text": "same document", "use_cache": use_cache})
+                self.assertEqual(result["text"], "summary")
+        self.assertEqual(client.calls, 2)
+
+class FakeModel:
+    """
+    Stands in for invoke_model: rejects prompts over max_chars, fails the chunks
+    in fail_once with a throttling error the first time, and "summarizes" a
+    prompt to its first word.
+    """
+
+    def __init__(self, max_chars, fail_once=()):
+        self.max_chars = max_chars
+        self.fail_once = set(fail_once)
+        self.calls = []
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self.lock:
+            self.calls.append(prompt)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            # Not time.sleep: the tests patch it to skip the retry backoff.
+            threading.Event().wait(0.02)
+            if len(prompt) > self.max_chars:
+                raise ClientError({"Error": {"Code": "ValidationException", "Message": "too long"}}, "InvokeModel")
+            first = prompt.split()[0]
+            with self.lock:
+                if first in self.fail_once:
+                    self.fail_once.discard(first)
+                    raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "InvokeModel")
+            return "S:" + first
+        finally:
+            with self.lock:
+                self.active -= 1
+
+class TestMapReduce(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.dict(os.environ, {"AMAZON_BEDROCK_SUMMARIZE_MODE": "map_reduce", "AMAZON_BEDROCK_MAX_INPUT_CHARS": "100",
+                                          "AMAZON_BEDROCK_MAP_CONCURRENCY": "3", "AMAZON_BEDROCK_REDUCE_PROMPT": "R {input_text}",
+                                          "RESULT_CACHE": ""})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sleep = patch.object(amazon_bedrock_handler.time, "sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def run_handler(self, text, model):
+        with patch.object(amazon_bedrock_handler, "invoke_model", side_effect=model), redirect_stdout(io.StringIO()):
+            return AmazonBedrockHandler().handle({"text": text})["text"]
+
+    def test_chunks_are_sized_up_front_and_summarized_concurrently(self):
+        words = [f"w{i:02d}" for i in range(60)]
+        model = FakeModel(max_chars=100, fail_once={"w25"})
+        summary = self.run_handler(" ".join(words), model)
+
+        # 239 characters: three chunks of up to 100, no full-size call first.
+        self.assertNotIn(" ".join(words), model.calls)
+        map_calls = [call for call in model.calls if not call.startswith("R ")]
+        self.assertEqual(sorted(call.split()[0] for call in map_calls), ["w00", "w25", "w25", "w50"])
+        self.assertEqual(model.peak, 3)
+        # The throttled chunk was retried alone; the partials were combined in one call.
+        self.assertEqual(model.calls[-1], "R S:w00\n\nS:w25\n\nS:w50")
+        self.assertEqual(summary, "S:R")
+
+    def test_hierarchical_reduce(self):
+        calls = []
+
+        def model(prompt):
+            calls.append(prompt)
+            return ("R" if prompt.startswith("R ") else "S") + "x" * 19
+
+        # 649 characters in eleven chunks; only two 20 character summaries fit a reduce call.
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_MAX_INPUT_CHARS": "60"}):
+            summary = self.run_handler(" ".join(f"w{i:02d}" for i in range(150)), model)
+        reduce_calls = [call for call in calls if call.startswith("R ")]
+        self.assertEqual(len(calls) - len(reduce_calls), 11)
+        # 11 -> 6 -> 3 -> 2 partial summaries, then the final combine.
+        self.assertEqual(len(reduce_calls), 5 + 3 + 1 + 1)
+        self.assertTrue(all(len(call) <= 60 for call in calls))
+        self.assertEqual(summary, "R" + "x" * 19)
+
+    def test_rejected_chunk_is_split(self):
+        model = FakeModel(max_chars=60)
+        summary = self.run_handler(" ".join(f"w{i:02d}" for i in range(20)), model)
+        # The one 79 character chunk was rejected and summarized in two halves.
+        self.assertEqual(len([call for call in model.calls if len(call) > 60]), 1)
+        self.assertEqual(summary, "S:w00\nS:w10")
+
+    def test_streamed_prompt_is_repeated_for_every_chunk(self):
+        calls = []
+
+        def model(prompt):
+            calls.append(prompt)
+            return "R" if prompt.startswith("R ") else "S" + str(len(calls))
+
+        source = TextStream(iter(["w%02d " % i for i in range(30)]))
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_STREAM_CHUNK_CHARS": "60"}):
+            summary = self.run_handler(PromptedText("Summarize: ", source, " END"), model)
+        map_calls = [call for call in calls if not call.startswith("R ")]
+        self.assertEqual(len(map_calls), 3)
+        self.assertTrue(all(call.startswith("Summarize: w") and call.endswith(" END") for call in map_calls))
+        self.assertTrue(all(len(call) <= 60 for call in map_calls))
+        # The partial summaries are combined, not just joined.
+        self.assertEqual(calls[-1], "R S1\n\nS2\n\nS3")
+        self.assertEqual(summary, "R")
+
+    def test_default_mode_is_unchanged(self):
+        model = FakeModel(max_chars=1000)
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_SUMMARIZE_MODE": "retry"}):
+            self.assertEqual(self.run_handler("w00 " * 100, model), "S:w00")
+        self.assertEqual(len(model.calls), 1)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class RetrievalClient:
+    """
+    Embeds texts (Titan) as counts of topic words and answers chat turns, recording both.
+    """
+
+    topics = ("harbor", "glacier", "orchard", "volcano")
+
+    def __init__(self):
+        self.embedded = []
+        self.turns = []
+
+    def invoke_model(self, body, modelId, **kwargs):
+        body = json.loads(body)
+        if "inputText" in body:
+            self.embedded.append(body["inputText"])
+            result = {"embedding": [float(body["inputText"].count(topic)) for topic in self.topics] + [0.01]}
+        else:
+            self.turns.append(body)
+            result = {"content": [{"text": "an answer"}]}
+        return {"body": io.BytesIO(json.dumps(result).encode("utf-8"))}
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+class TestRetrievalChat(unittest.TestCase):
+    def test_chat_sends_only_relevant_chunks(self):
+        client = RetrievalClient()
+        paragraphs = [f"Paragraph {i} is about the {RetrievalClient.topics[i % 3]} and nothing else." for i in range(300)]
+        paragraphs[150] = "Paragraph 150 is about the volcano that erupted."
+        document = "\n\n".join(paragraphs)
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.dict(os.environ, {**CLAUDE_3, "AMAZON_BEDROCK_CHAT_CONTEXT": "window", "AMAZON_BEDROCK_VECTOR_INDEX_DIR": tmp,
+                                        "AMAZON_BEDROCK_EMBEDDING_CHUNK_CHARS": "200", "AMAZON_BEDROCK_EMBEDDING_CHUNK_OVERLAP": "0",
+                                        "AMAZON_BEDROCK_CHAT_RETRIEVAL_TOP_K": "3"}), \
+                patch.object(bedrock.AWSBotoClientManager, "get_client", return_value=client), \
+                patch("builtins.input", side_effect=["Tell me about the volcano?", "And the glacier?", KeyboardInterrupt, "no"]), \
+                redirect_stdout(io.StringIO()):
+            bedrock.clear_invocation_plans()
+            self.addCleanup(bedrock.clear_invocation_plans)
+            chain = AmazonBedrockEmbeddingsHandler()
+            chain.set_next(AmazonBedrockChatHandler())
+            result = chain.handle({"text": document})
+            # The same document reuses its index.
+            self.assertEqual(AmazonBedrockEmbeddingsHandler().handle({"text": document})["vector_index"], result["vector_index"])
+
+        # One embedding call per chunk, then one per question.
+        self.assertEqual(len(client.embedded), 102)
+        self.assertEqual(client.embedded[-2:], ["Tell me about the volcano?", "And the glacier?"])
+        self.assertEqual(len(client.turns), 2)
+        first, second = (turn["system"][0]["text"] for turn in client.turns)
+        self.assertIn("the volcano that erupted", first)
+        self.assertEqual(first.count("Paragraph"), 9)
+        self.assertIn("glacier", second)
+        self.assertLess(max(len(json.dumps(turn)) for turn in client.turns), 1500)
+        self.assertEqual(result["text"], document)
+
+if __name__ == '__main__':
+    unittest.main()
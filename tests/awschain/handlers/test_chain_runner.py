@@ -0,0 +1,78 @@
+import asyncio
+import time
+import unittest
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.chain_runner import ChainRunner
+
+class AppendHandler(AbstractHandler):
+    def __init__(self, value, delay=0):
+        self.value = value
+        self.delay = delay
+
+    def handle(self, request: dict) -> dict:
+        time.sleep(self.delay)
+        request.setdefault("trace", []).append(self.value)
+        return super().handle(request)
+
+class StopHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        request["stopped"] = True
+        return request
+
+class AsyncHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        raise AssertionError("sync path should not be used")
+
+    async def ahandle(self, request: dict) -> dict:
+        await asyncio.sleep(0)
+        request.setdefault("trace", []).append("async")
+        return await self.ahandle_next(request)
+
+class TestChainRunner(unittest.TestCase):
+    def test_run_stage_does_not_forward(self):
+        first = AppendHandler("a")
+        first.set_next(AppendHandler("b"))
+        result, forwarded = first.run_stage({})
+        self.assertEqual(result["trace"], ["a"])
+        self.assertTrue(forwarded)
+
+    def test_sync_handle_unchanged(self):
+        first = AppendHandler("a")
+        first.set_next(AppendHandler("b")).set_next(AppendHandler("c"))
+        self.assertEqual(first.handle({})["trace"], ["a", "b", "c"])
+
+    def test_ahandle_runs_whole_chain(self):
+        first = AppendHandler("a")
+        first.set_next(AsyncHandler()).set_next(AppendHandler("c"))
+        result = asyncio.run(first.ahandle({}))
+        self.assertEqual(result["trace"], ["a", "async", "c"])
+
+    def test_ahandle_respects_early_return(self):
+        first = AppendHandler("a")
+        first.set_next(StopHandler()).set_next(AppendHandler("c"))
+        result = asyncio.run(first.ahandle({}))
+        self.assertEqual(result["trace"], ["a"])
+        self.assertTrue(result["stopped"])
+
+    def test_run_many_is_concurrent_and_ordered(self):
+        runner = ChainRunner(lambda request: AppendHandler(request["id"], delay=0.2))
+        start = time.monotonic()
+        results = runner.run([{"id": i} for i in range(20)])
+        elapsed = time.monotonic() - start
+        self.assertEqual([r["trace"] for r in results], [[i] for i in range(20)])
+        self.assertLess(elapsed, 2)
+
+    def test_run_many_return_exceptions(self):
+        class FailingHandler(AbstractHandler):
+            def handle(self, request: dict) -> dict:
+                if request["id"] == 1:
+                    raise ValueError("boom")
+                return super().handle(request)
+
+        runner = ChainRunner(FailingHandler())
+        results = runner.run([{"id": 0}, {"id": 1}], return_exceptions=True)
+        self.assertEqual(results[0], {"id": 0})
+        self.assertIsInstance(results[1], ValueError)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import unittest
+from unittest.mock import patch
+from awschain.handlers.chain_template import ChainRegistry, ChainSpecError, InputTypeTable
+from awschain.handlers.handler_factory import HandlerFactory
+from awschain.handlers.parallel_handler import ParallelHandler
+
+SPEC = {
+    "chains": {
+        "tail": [
+            {"handler": "AmazonComprehendPIITokenizeHandler", "when": "anonymize"},
+            "PromptHandler",
+        ],
+        "text": [
+            "LocalFileReaderHandler",
+            {"include": "tail"},
+        ],
+        "fanout": [
+            "LocalFileReaderHandler",
+            {"parallel": [["PromptHandler"], ["PrintContextHandler"]], "merge": "last"},
+        ],
+    }
+}
+
+class TestChainTemplate(unittest.TestCase):
+    def test_build_links_handlers(self):
+        registry = ChainRegistry(SPEC)
+        chain = registry.build("text")
+        self.assertEqual([type(handler).__name__ for handler in chain.iter_chain()], ["LocalFileReaderHandler", "PromptHandler"])
+        anonymized = registry.template("text", anonymize=True)
+        self.assertEqual(anonymized.handler_names, ["LocalFileReaderHandler", "AmazonComprehendPIITokenizeHandler", "PromptHandler"])
+
+    def test_templates_are_compiled_once(self):
+        registry = ChainRegistry(SPEC)
+        registry.build("text")
+        with patch.object(HandlerFactory, "get_handler_class", side_effect=AssertionError("recompiled")):
+            first = registry.build("text")
+            second = registry.build("text")
+        # Each build is a fresh set of handler instances.
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.get_next(), second.get_next())
+
+    def test_parallel_step(self):
+        chain = ChainRegistry(SPEC).build("fanout")
+        parallel = chain.get_next()
+        self.assertIsInstance(parallel, ParallelHandler)
+        self.assertEqual(parallel.merge, "last")
+        self.assertEqual(len(parallel.branches), 2)
+
+    def test_validation(self):
+        with self.assertRaises(ChainSpecError):
+            ChainRegistry({"chains": {"a": ["NoSuchHandler"]}})
+        with self.assertRaises(ChainSpecError):
+            ChainRegistry({"chains": {"a": [{"include": "b"}], "b": [{"include": "a"}]}})
+        with self.assertRaises(ChainSpecError):
+            ChainRegistry({"chains": {"a": [{"handler": "PromptHandler", "include": "a"}]}})
+        with self.assertRaises(ChainSpecError):
+            ChainRegistry(SPEC).build("missing")
+
+    def test_input_type_table(self):
+        table = InputTypeTable()
+        self.assertEqual(table.lookup("https://www.youtube.com/watch?v=1"), "youtube_url")
+        self.assertEqual(table.lookup("https://example.com/report.pdf"), "http")
+        self.assertEqual(table.lookup("s3://bucket/key.docx"), "s3")
+        self.assertEqual(table.lookup("/tmp/Report.PDF"), "pdf")
+        self.assertEqual(table.lookup("/tmp/sheet.xlsm"), "microsoft_excel")
+        self.assertEqual(table.lookup("/tmp/notes"), "text_or_json")
+
+    def test_example_specification_loads(self):
+        path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "chains.yaml.example")
+        registry = ChainRegistry.from_file(path)
+        self.assertEqual(registry.template("pdf").handler_names, ["PDFReaderHandler", "LocalFileWriterHandler", "PromptHandler", "AmazonBedrockHandler"])
+        self.assertEqual(registry.template("s3", chat_only=True).handler_names, ["AmazonS3ReaderHandler", "AmazonBedrockChatHandler"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import textwrap
+import unittest
+from unittest.mock import patch
+from awschain.handlers.handler_factory import HandlerFactory
+from awschain.handlers import discovery_index
+
+CUSTOM_HANDLER = textwrap.dedent("""
+    from awschain.handlers.abstract_handler import AbstractHandler
+
+    class {name}(AbstractHandler):
+        def handle(self, request: dict) -> dict:
+            request["handled_by"] = "{name}"
+            return super().handle(request)
+""")
+
+class TestDiscoveryIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.custom_dir = os.path.join(self.tmp.name, "custom")
+        os.makedirs(self.custom_dir)
+        self.write_handler("FirstCustomHandler")
+        env = {"AWSCHAIN_CACHE_DIR": os.path.join(self.tmp.name, "cache"), "custom_handlers_path": self.custom_dir, "AWSCHAIN_DISCOVERY_INDEX": "true"}
+        self.env = patch.dict(os.environ, env)
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        HandlerFactory.discover_handlers()
+        self.tmp.cleanup()
+
+    def write_handler(self, name):
+        with open(os.path.join(self.custom_dir, "custom_handler.py"), "w") as f:
+            f.write(CUSTOM_HANDLER.format(name=name))
+
+    def test_warm_start_parses_nothing(self):
+        HandlerFactory.discover_handlers()
+        self.assertIn("FirstCustomHandler", HandlerFactory._custom_handler_files)
+        self.assertIn("PromptHandler", HandlerFactory._handler_paths)
+
+        with patch.object(discovery_index.ast, "parse", side_effect=AssertionError("parsed on warm start")):
+            HandlerFactory.discover_handlers()
+        self.assertIn("FirstCustomHandler", HandlerFactory._custom_handler_files)
+        self.assertIn("PromptHandler", HandlerFactory._handler_paths)
+
+    def test_changed_file_is_reparsed(self):
+        HandlerFactory.discover_handlers()
+        self.write_handler("RenamedCustomHandler")
+        HandlerFactory.discover_handlers()
+        self.assertIn("RenamedCustomHandler", HandlerFactory._custom_handler_files)
+        self.assertNotIn("FirstCustomHandler", HandlerFactory._custom_handler_files)
+        self.assertEqual(HandlerFactory.get_handler("RenamedCustomHandler").handle({})["handled_by"], "RenamedCustomHandler")
+
+    def test_bundled_index_avoids_parsing(self):
+        bundled = discovery_index.build_index(output_path=os.path.join(self.tmp.name, "bundled.json"))
+        index = discovery_index.DiscoveryIndex(os.path.join(self.tmp.name, "empty.json"), bundled_path=bundled)
+        package_root = discovery_index.BUNDLED_INDEX_PATH.parent
+        with patch.object(discovery_index.ast, "parse", side_effect=AssertionError("parsed with bundled index")):
+            handlers = index.handlers_in(package_root / "processors" / "prompt_handler.py")
+        self.assertEqual(handlers, ["PromptHandler"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch, MagicMock
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.writers.amazon_s3_writer_handler import AmazonS3WriterHandler
+from awschain.utils import metrics
+from awschain.handlers.processors.amazon_comprehend_insights_handler import AmazonComprehendInsightsHandler
+
+class TraceHandler(AbstractHandler):
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def handle(self, request: dict) -> dict:
+        self.log.append((self.name, request["id"]))
+        return super().handle(request)
+
+class GroupingHandler(AbstractHandler):
+    batch_size = 3
+
+    def __init__(self, log):
+        self.log = log
+
+    def handle(self, request: dict) -> dict:
+        raise AssertionError("process_batch should be used")
+
+    def process_batch(self, requests: list) -> list:
+        self.log.append(("group", [request["id"] for request in requests]))
+        return requests
+
+class StopOnOddHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        if request["id"] % 2:
+            request["stopped"] = True
+            return request
+        return super().handle(request)
+
+class TestHandleBatch(unittest.TestCase):
+    def test_results_in_order(self):
+        log = []
+        chain = TraceHandler("a", log)
+        chain.set_next(TraceHandler("b", log))
+        results = chain.handle_batch([{"id": i} for i in range(3)])
+        self.assertEqual([r["id"] for r in results], [0, 1, 2])
+
+    def test_items_stream_between_stages(self):
+        log = []
+        chain = TraceHandler("a", log)
+        chain.set_next(TraceHandler("b", log))
+        chain.handle_batch([{"id": i} for i in range(2)])
+        # With batch_size 1 the first item reaches "b" before "a" sees the second.
+        self.assertEqual(log, [("a", 0), ("b", 0), ("a", 1), ("b", 1)])
+
+    def test_batch_capable_stage_receives_groups(self):
+        log = []
+        chain = TraceHandler("a", log)
+        chain.set_next(GroupingHandler(log))
+        chain.handle_batch([{"id": i} for i in range(5)])
+        groups = [entry[1] for entry in log if entry[0] == "group"]
+        self.assertEqual(groups, [[0, 1, 2], [3, 4]])
+
+    def test_early_return_skips_later_stages(self):
+        log = []
+        chain = StopOnOddHandler()
+        chain.set_next(TraceHandler("b", log))
+        results = chain.handle_batch([{"id": i} for i in range(4)])
+        self.assertEqual(log, [("b", 0), ("b", 2)])
+        self.assertTrue(results[1]["stopped"])
+        self.assertEqual(len(results), 4)
+
+    @patch('awschain.handlers.processors.amazon_comprehend_insights_handler.AWSBotoClientManager.get_client')
+    def test_comprehend_insights_batch(self, mock_get_client):
+        client = MagicMock()
+        client.batch_detect_sentiment.return_value = {"ResultList": [{"Index": 0, "Sentiment": "POSITIVE"}, {"Index": 1, "Sentiment": "NEGATIVE"}], "ErrorList": []}
+        client.batch_detect_entities.return_value = {"ResultList": [{"Index": 1, "Entities": [{"Text": "AWS", "Type": "ORGANIZATION", "Score": 0.9}]}], "ErrorList": []}
+        client.batch_detect_key_phrases.return_value = {"ResultList": [], "ErrorList": []}
+        mock_get_client.return_value = client
+
+        handler = AmazonComprehendInsightsHandler()
+        results = handler.handle_batch([{"text": "good"}, {"text": "bad AWS"}])
+
+        client.batch_detect_sentiment.assert_called_once_with(TextList=["good", "bad AWS"], LanguageCode='en')
+        self.assertEqual(results[0]["text"]["sentiment"], "POSITIVE")
+        self.assertEqual(results[1]["text"]["sentiment"], "NEGATIVE")
+        self.assertEqual(results[1]["text"]["entities"][0]["Text"], "AWS")
+
+    @patch('awschain.handlers.processors.amazon_comprehend_insights_handler.AWSBotoClientManager.get_client')
+    def test_comprehend_insights_batch_uses_cache_and_metrics(self, mock_get_client):
+        client = MagicMock()
+        client.batch_detect_sentiment.side_effect = lambda TextList, LanguageCode: {
+            "ResultList": [{"Index": i, "Sentiment": "NEUTRAL"} for i in range(len(TextList))], "ErrorList": []}
+        client.batch_detect_entities.return_value = {"ResultList": [], "ErrorList": []}
+        client.batch_detect_key_phrases.return_value = {"ResultList": [], "ErrorList": []}
+        mock_get_client.return_value = client
+        handler = AmazonComprehendInsightsHandler()
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(handler.process_batch([]), [])
+        self.assertEqual(output.getvalue(), "")
+        self.assertFalse(hasattr(handler, "comprehend"))
+
+        with tempfile.TemporaryDirectory() as tmp, redirect_stdout(io.StringIO()), \
+                patch.dict(os.environ, {"RESULT_CACHE": "directory", "RESULT_CACHE_PATH": tmp, "AWSCHAIN_METRICS": "true"}):
+            first = handler.handle_batch([{"text": "one"}, {"text": "two"}])
+            second = handler.handle_batch([{"text": "one"}, {"text": "three"}])
+
+        self.assertEqual([call.kwargs["TextList"] for call in client.batch_detect_sentiment.call_args_list],
+                         [["one", "two"], ["three"]])
+        self.assertEqual(second[0]["text"], first[0]["text"])
+        self.assertEqual([result[metrics.METRICS_KEY][0]["cache"] for result in second], ["hit", "miss"])
+        self.assertFalse(hasattr(handler, "comprehend"))
+
+    @patch('awschain.handlers.writers.amazon_s3_writer_handler.time.sleep')
+    def test_s3_writer_batch(self, sleep):
+        handler = AmazonS3WriterHandler()
+        self.assertEqual(handler.process_batch([]), [])
+        sleep.assert_not_called()
+
+        inner = []
+
+        class Client:
+            def upload_file(self, path, bucket, key):
+                if key == "folder/file0.txt":
+                    # Another thread using the same handler outside the batch still waits.
+                    thread = threading.Thread(target=lambda: inner.append(handler.handle({"path": "other.txt"})))
+                    thread.start()
+                    thread.join()
+
+        with patch('awschain.handlers.writers.amazon_s3_writer_handler.AWSBotoClientManager.get_client', return_value=Client()), \
+                patch.dict(os.environ, {"BUCKET_NAME": "bucket", "S3_FOLDER": "folder/", "RESULT_CACHE": ""}), \
+                redirect_stdout(io.StringIO()):
+            results = handler.handle_batch([{"path": f"/tmp/file{i}.txt"} for i in range(3)])
+        self.assertEqual([result["path"] for result in results], [f"s3://bucket/folder/file{i}.txt" for i in range(3)])
+        self.assertEqual(inner[0]["path"], "s3://bucket/folder/other.txt")
+        # Once for the other thread's upload and once for the whole batch.
+        self.assertEqual(sleep.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import time
+import unittest
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.parallel_handler import ParallelHandler, MergeConflictError
+
+class SetHandler(AbstractHandler):
+    def __init__(self, key, value, delay=0):
+        self.key = key
+        self.value = value
+        self.delay = delay
+
+    def handle(self, request: dict) -> dict:
+        time.sleep(self.delay)
+        request[self.key] = self.value
+        return super().handle(request)
+
+class RecordHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        request["seen"] = sorted(k for k in request if k != "seen")
+        return super().handle(request)
+
+class TestParallelHandler(unittest.TestCase):
+    def test_branches_run_concurrently_and_merge(self):
+        fan_out = ParallelHandler(SetHandler("a", 1, delay=0.3), SetHandler("b", 2, delay=0.3), SetHandler("c", 3, delay=0.3))
+        fan_out.set_next(RecordHandler())
+        start = time.monotonic()
+        result = fan_out.handle({"text": "doc"})
+        self.assertLess(time.monotonic() - start, 0.8)
+        self.assertEqual(result["seen"], ["a", "b", "c", "text"])
+
+    def test_branches_work_on_snapshots(self):
+        class ReadHandler(AbstractHandler):
+            def handle(self, request: dict) -> dict:
+                request["saw_a"] = "a" in request
+                return super().handle(request)
+
+        fan_out = ParallelHandler(SetHandler("a", 1), ReadHandler())
+        result = fan_out.handle({})
+        self.assertEqual(result["a"], 1)
+        self.assertFalse(result["saw_a"])
+
+    def test_conflict_raises_by_default(self):
+        fan_out = ParallelHandler(SetHandler("text", "x"), SetHandler("text", "y"))
+        with self.assertRaises(MergeConflictError):
+            fan_out.handle({"text": "doc"})
+
+    def test_equal_values_do_not_conflict(self):
+        fan_out = ParallelHandler(SetHandler("text", "x"), SetHandler("text", "x"))
+        self.assertEqual(fan_out.handle({"text": "doc"})["text"], "x")
+
+    def test_merge_strategies(self):
+        branches = (SetHandler("text", "x"), SetHandler("text", "y"))
+        self.assertEqual(ParallelHandler(*branches, merge="first").handle({})["text"], "x")
+        self.assertEqual(ParallelHandler(*branches, merge="last").handle({})["text"], "y")
+        self.assertEqual(ParallelHandler(*branches, merge="collect").handle({})["text"], ["x", "y"])
+        joined = ParallelHandler(*branches, merge=lambda key, values: "+".join(values))
+        self.assertEqual(joined.handle({})["text"], "x+y")
+
+    def test_ahandle(self):
+        fan_out = ParallelHandler(SetHandler("a", 1), SetHandler("b", 2))
+        fan_out.set_next(RecordHandler())
+        result = asyncio.run(fan_out.ahandle({}))
+        self.assertEqual(result["seen"], ["a", "b"])
+
+if __name__ == '__main__':
+    unittest.main()
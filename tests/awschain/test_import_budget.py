@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import subprocess
+import tempfile
+import unittest
+
+# Import awschain and build a minimal chain, then report the elapsed time and
+# which optional dependencies ended up imported.
+SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import awschain
+from awschain import HandlerFactory
+chain = HandlerFactory.get_handler("LocalFileReaderHandler")
+chain.set_next(HandlerFactory.get_handler("AmazonBedrockHandler"))
+elapsed_ms = (time.perf_counter() - started) * 1000
+heavy = ("boto3", "botocore", "jsonpath_ng", "yaml", "bs4", "requests", "openpyxl", "PIL",
+         "docx", "pptx", "pdfminer", "fitz", "spacy", "moviepy", "pytube", "pytubefix", "pyperclip")
+print(json.dumps({"elapsed_ms": elapsed_ms, "loaded": sorted(name for name in heavy if name in sys.modules)}))
+"""
+
+# Generous enough for slow CI machines; the loaded-modules check is the strict guard.
+IMPORT_BUDGET_MS = float(os.getenv("AWSCHAIN_IMPORT_BUDGET_MS", "300"))
+
+class TestImportBudget(unittest.TestCase):
+    def run_script(self, cache_dir):
+        src = os.path.join(os.path.dirname(__file__), "..", "..", "src")
+        env = dict(os.environ, PYTHONPATH=os.path.abspath(src), AWSCHAIN_CACHE_DIR=cache_dir)
+        env.pop("custom_handlers_path", None)
+        output = subprocess.run([sys.executable, "-c", SCRIPT], env=env, capture_output=True, text=True, check=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_minimal_chain_import_budget(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.run_script(cache_dir)  # warm the discovery index
+            result = self.run_script(cache_dir)
+        self.assertEqual(result["loaded"], [], "optional dependencies imported eagerly")
+        self.assertLess(result["elapsed_ms"], IMPORT_BUDGET_MS)
+
+if __name__ == '__main__':
+    unittest.main()
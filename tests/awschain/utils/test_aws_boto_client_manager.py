@@ -0,0 +1,77 @@
+import os
+import threading
+import unittest
+from unittest.mock import patch
+from awschain.utils.aws_boto_client_manager import AWSBotoClientManager
+
+CREDENTIALS = {"AWS_ACCESS_KEY_ID": "x", "AWS_SECRET_ACCESS_KEY": "x", "AWS_DEFAULT_REGION": "us-east-1"}
+
+class TestAWSBotoClientManager(unittest.TestCase):
+    def setUp(self):
+        AWSBotoClientManager.clear()
+
+    def tearDown(self):
+        AWSBotoClientManager.clear()
+
+    @patch.dict(os.environ, CREDENTIALS)
+    def test_clients_are_keyed_by_region_and_settings(self):
+        default = AWSBotoClientManager.get_client("s3")
+        self.assertIs(AWSBotoClientManager.get_client("s3"), default)
+        self.assertEqual(default.meta.region_name, "us-east-1")
+
+        other_region = AWSBotoClientManager.get_client("s3", "eu-west-1")
+        self.assertEqual(other_region.meta.region_name, "eu-west-1")
+        self.assertIsNot(AWSBotoClientManager.get_client("s3", read_timeout=5), default)
+
+        # The default region is read on every call, not at import time.
+        with patch.dict(os.environ, {"AWS_DEFAULT_REGION": "ap-southeast-2"}):
+            self.assertEqual(AWSBotoClientManager.get_client("s3").meta.region_name, "ap-southeast-2")
+
+    @patch.dict(os.environ, CREDENTIALS)
+    def test_concurrent_creation_returns_one_client(self):
+        clients = []
+        barrier = threading.Barrier(8)
+
+        def get():
+            barrier.wait()
+            clients.append(AWSBotoClientManager.get_client("comprehend"))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+    @patch.dict(os.environ, {**CREDENTIALS, "AWS_MAX_POOL_CONNECTIONS": "32", "AWS_RETRY_MODE": "standard",
+                             "AWS_CLIENT_CONFIG": '{"bedrock-runtime": {"retry_mode": "adaptive", "max_attempts": 8, "read_timeout": 900}}'})
+    def test_settings_per_service(self):
+        self.assertEqual(AWSBotoClientManager.client_settings("s3"), {"max_pool_connections": 32, "retry_mode": "standard"})
+        settings = AWSBotoClientManager.client_settings("bedrock-runtime", connect_timeout=10)
+        self.assertEqual(settings, {"max_pool_connections": 32, "retry_mode": "adaptive", "max_attempts": 8,
+                                    "read_timeout": 900.0, "connect_timeout": 10.0})
+
+        client = AWSBotoClientManager.get_client("bedrock-runtime")
+        self.assertEqual(client.meta.config.max_pool_connections, 32)
+        self.assertEqual(client.meta.config.read_timeout, 900)
+        self.assertEqual(client.meta.config.retries["mode"], "adaptive")
+
+        with self.assertRaises(ValueError):
+            AWSBotoClientManager.client_settings("s3", pool_size=4)
+
+    @patch.dict(os.environ, {**CREDENTIALS, "AWS_CLIENT_CONFIG": '{"s3": {"read_timeout": 30}}'})
+    def test_settings_are_resolved_once(self):
+        with patch.object(AWSBotoClientManager, "client_settings", wraps=AWSBotoClientManager.client_settings) as resolve:
+            client = AWSBotoClientManager.get_client("s3")
+            for _ in range(5):
+                self.assertIs(AWSBotoClientManager.get_client("s3"), client)
+            self.assertEqual(resolve.call_count, 1)
+
+            # Changed settings are resolved again.
+            with patch.dict(os.environ, {"AWS_CLIENT_CONFIG": '{"s3": {"read_timeout": 60}}'}):
+                self.assertEqual(AWSBotoClientManager.get_client("s3").meta.config.read_timeout, 60)
+            self.assertEqual(resolve.call_count, 2)
+            self.assertIs(AWSBotoClientManager.get_client("s3"), client)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+from awschain.utils import bedrock
+from awschain.utils.bedrock import InvocationPlan, get_invocation_plan, invoke_model, clear_invocation_plans
+
+CLAUDE_3 = {
+    "AMAZON_BEDROCK_MODEL_ID": "anthropic.claude-3-haiku-20240307-v1:0",
+    "AMAZON_BEDROCK_MODEL_PROPS": '{"max_tokens": 100, "anthropic_version": "bedrock-2023-05-31", "messages": [{"role": "user", "content": ""}]}',
+    "AMAZON_BEDROCK_PROMPT_TEMPLATE": "Summarize: {prompt_text}",
+    "AMAZON_BEDROCK_PROMPT_INPUT_VAR": "$.messages[0].content",
+    "AMAZON_BEDROCK_OUTPUT_JSONPATH": "$.content[0].text",
+}
+
+class FakeBedrockClient:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def invoke_model(self, **kwargs):
+        self.calls.append(kwargs)
+        headers = {"x-amzn-bedrock-input-token-count": "120", "x-amzn-bedrock-output-token-count": "30"}
+        return {"body": io.BytesIO(json.dumps(self.response).encode("utf-8")), "ResponseMetadata": {"HTTPHeaders": headers}}
+
+def stream_events(*chunks):
+    return [{"chunk": {"bytes": json.dumps(chunk).encode("utf-8")}} for chunk in chunks]
+
+class FakeStreamingClient:
+    def __init__(self, events):
+        self.events = events
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        self.calls = getattr(self, "calls", 0) + 1
+        return {"body": iter(self.events)}
+
+class TestInvocationPlan(unittest.TestCase):
+    def setUp(self):
+        clear_invocation_plans()
+
+    def tearDown(self):
+        clear_invocation_plans()
+
+    def test_body_and_output(self):
+        client = FakeBedrockClient({"content": [{"type": "text", "text": "short"}]})
+        with patch.dict(os.environ, CLAUDE_3):
+            plan = InvocationPlan(*bedrock.plan_config(), client=client)
+        self.assertEqual(plan.invoke('a "quoted"\nline'), "short")
+
+        call, = client.calls
+        self.assertEqual(call["modelId"], "anthropic.claude-3-haiku-20240307-v1:0")
+        self.assertEqual(json.loads(call["body"]), {
+            "max_tokens": 100, "anthropic_version": "bedrock-2023-05-31",
+            "messages": [{"role": "user", "content": 'Summarize: a "quoted"\nline'}]})
+
+        # Output that does not match the JSONPath returns the whole body.
+        self.assertEqual(plan.extract({"error": "x"}), {"error": "x"})
+
+    def test_root_level_prompt_and_generic_jsonpath(self):
+        client = FakeBedrockClient({"results": [{"outputText": "one"}, {"outputText": "two"}]})
+        plan = InvocationPlan("amazon.titan-text-express-v1", '{"inputText": "", "textGenerationConfig": {"maxTokenCount": 10}}',
+                              "\n{prompt_text}", "$.inputText", "$.results[*].outputText", client=client)
+        self.assertEqual(plan.invoke("hi"), "one")
+        self.assertEqual(json.loads(client.calls[0]["body"])["inputText"], "\nhi")
+
+    def test_stream_deltas(self):
+        events = stream_events(
+            {"type": "message_start", "message": {"role": "assistant"}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hel"}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "lo"}},
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}},
+        )
+        with patch.dict(os.environ, CLAUDE_3):
+            plan = InvocationPlan(*bedrock.plan_config(), client=FakeStreamingClient(events))
+        self.assertEqual(list(plan.invoke_stream("hi")), ["Hel", "lo"])
+
+        # Text completion models stream {"completion": ...} chunks.
+        plan.client = FakeStreamingClient(stream_events({"completion": "a"}, {"completion": "b", "stop_reason": "stop"}))
+        self.assertEqual("".join(plan.invoke_stream("hi")), "ab")
+
+        plan.client = FakeStreamingClient([{"modelStreamErrorException": {"message": "boom"}}])
+        with self.assertRaises(RuntimeError):
+            list(plan.invoke_stream("hi"))
+
+    def test_plans_are_cached_per_config(self):
+        client = FakeBedrockClient({"content": [{"text": "ok"}]})
+        with patch.dict(os.environ, CLAUDE_3), patch.object(bedrock.AWSBotoClientManager, "get_client", return_value=client) as get_client:
+            plan = get_invocation_plan()
+            for _ in range(3):
+                self.assertEqual(invoke_model("text"), "ok")
+            self.assertIs(get_invocation_plan(), plan)
+            self.assertEqual(get_client.call_count, 1)
+            with patch.dict(os.environ, {"AMAZON_BEDROCK_PROMPT_TEMPLATE": "{prompt_text}!"}):
+                self.assertIsNot(get_invocation_plan(), plan)
+            self.assertIsNot(get_invocation_plan("other-model"), plan)
+
+    def test_defaults_without_configuration(self):
+        env = {key: "" for key in CLAUDE_3}
+        with patch.dict(os.environ, env):
+            for key in env:
+                del os.environ[key]
+            plan = InvocationPlan(*bedrock.plan_config(), client=FakeBedrockClient({"completion": "done"}))
+        self.assertEqual(plan.model_id, "anthropic.claude-v2")
+        self.assertEqual(json.loads(plan.build_body("x"))["prompt"], "x")
+        self.assertEqual(plan.invoke("x"), {"completion": "done"})
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def cache_env(self, backend):
+        return patch.dict(os.environ, {**CLAUDE_3, "AMAZON_BEDROCK_RESPONSE_CACHE": backend,
+                                       "AMAZON_BEDROCK_RESPONSE_CACHE_PATH": os.path.join(self.tmp.name, backend)})
+
+    def test_repeated_prompts_are_served_from_cache(self):
+        for backend in ("directory", "sqlite"):
+            client = FakeBedrockClient({"content": [{"text": "summary"}]})
+            with self.subTest(backend=backend), self.cache_env(backend):
+                plan = InvocationPlan(*bedrock.plan_config(), client=client)
+                for _ in range(3):
+                    self.assertEqual(plan.invoke("same text"), "summary")
+                self.assertEqual(len(client.calls), 1)
+                # Another prompt, model or inference parameter is another entry.
+                plan.invoke("other text")
+                with patch.dict(os.environ, {"AMAZON_BEDROCK_MODEL_PROPS": CLAUDE_3["AMAZON_BEDROCK_MODEL_PROPS"].replace("100", "200")}):
+                    InvocationPlan(*bedrock.plan_config(), client=client).invoke("same text")
+                self.assertEqual(len(client.calls), 3)
+
+                stats = bedrock.response_cache_stats()
+                self.assertEqual((stats["hits"], stats["misses"], stats["stores"]), (2, 3, 3))
+                self.assertEqual((stats["saved_input_tokens"], stats["saved_output_tokens"]), (240, 60))
+                self.assertAlmostEqual(stats["hit_rate"], 0.4)
+
+    def test_bypass(self):
+        client = FakeBedrockClient({"content": [{"text": "summary"}]})
+        with self.cache_env("directory"):
+            plan = InvocationPlan(*bedrock.plan_config(), client=client)
+            plan.invoke("text")
+            plan.invoke("text", use_cache=False)
+            with bedrock.use_response_cache(False):
+                plan.invoke("text")
+            plan.invoke("text")
+        self.assertEqual(len(client.calls), 3)
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_RESPONSE_CACHE": ""}):
+            self.assertEqual(bedrock.response_cache_stats(), {})
+
+    def test_streamed_responses(self):
+        events = stream_events({"delta": {"text": "Hel"}}, {"delta": {"text": "lo"}})
+        client = FakeStreamingClient(events)
+        with self.cache_env("sqlite"):
+            plan = InvocationPlan(*bedrock.plan_config(), client=client)
+            partial = plan.invoke_stream("hi")
+            next(partial)
+            # An unfinished stream is not cached.
+            self.assertEqual("".join(plan.invoke_stream("hi")), "Hello")
+            self.assertEqual(list(plan.invoke_stream("hi")), ["Hello"])
+        self.assertEqual(client.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,255 @@
+import io
+import os
+import json
+import multiprocessing
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from botocore.response import StreamingBody
+from awschain.utils import bedrock
+from awschain.utils.bedrock_batch import BedrockBatch, split_s3_uri
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.processors.amazon_bedrock_handler import AmazonBedrockHandler
+from awschain.handlers.processors.prompt_handler import PromptHandler
+
+CLAUDE_3 = {
+    "AMAZON_BEDROCK_MODEL_ID": "anthropic.claude-3-haiku-20240307-v1:0",
+    "AMAZON_BEDROCK_MODEL_PROPS": '{"max_tokens": 100, "anthropic_version": "bedrock-2023-05-31", "messages": [{"role": "user", "content": ""}]}',
+    "AMAZON_BEDROCK_PROMPT_TEMPLATE": "Summarize: {prompt_text}",
+    "AMAZON_BEDROCK_PROMPT_INPUT_VAR": "$.messages[0].content",
+    "AMAZON_BEDROCK_OUTPUT_JSONPATH": "$.content[0].text",
+    "AMAZON_BEDROCK_MAX_INPUT_CHARS": "40",
+    "RESULT_CACHE": "",
+    "AMAZON_BEDROCK_BATCH_MIN_RECORDS": "1",
+}
+
+class LocalS3:
+    """
+    The S3 calls used by BedrockBatch, on an in-memory bucket.
+    """
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_file(self, path, bucket, key):
+        with open(path, "rb") as file:
+            self.objects[(bucket, key)] = file.read()
+
+    def put(self, uri, data: bytes):
+        self.objects[split_s3_uri(uri)] = data
+
+    def read(self, uri) -> bytes:
+        return self.objects[split_s3_uri(uri)]
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(key for bucket, key in s3.objects if bucket == Bucket and key.startswith(Prefix))
+                yield {"Contents": [{"Key": key} for key in keys]}
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        data = self.objects[(Bucket, Key)]
+        return {"Body": StreamingBody(io.BytesIO(data), len(data))}
+
+class LocalBedrock:
+    """
+    Runs batch jobs against LocalS3: the job is InProgress on the first status check
+    and then writes one output line per input record, like Bedrock does.
+    """
+
+    def __init__(self, s3, fail=()):
+        self.s3 = s3
+        self.fail = fail
+        self.jobs = {}
+
+    def create_model_invocation_job(self, jobName, roleArn, modelId, inputDataConfig, outputDataConfig):
+        arn = f"arn:aws:bedrock:us-east-1:123456789012:model-invocation-job/{jobName[-6:]}"
+        self.jobs[arn] = {"input": inputDataConfig["s3InputDataConfig"]["s3Uri"],
+                          "output": outputDataConfig["s3OutputDataConfig"]["s3Uri"], "checks": 0, "model": modelId}
+        return {"jobArn": arn}
+
+    def get_model_invocation_job(self, jobIdentifier):
+        job = self.jobs[jobIdentifier]
+        job["checks"] += 1
+        if job["checks"] == 1:
+            return {"status": "InProgress"}
+        lines = []
+        for line in self.s3.read(job["input"]).decode("utf-8").splitlines():
+            record = json.loads(line)
+            prompt = record["modelInput"]["messages"][0]["content"]
+            if any(word in prompt for word in self.fail):
+                lines.append({**record, "error": {"errorCode": 400, "errorMessage": "bad input"}})
+            else:
+                lines.append({**record, "modelOutput": {"content": [{"type": "text", "text": prompt.upper()}]}})
+        job_id = jobIdentifier.rsplit("/", 1)[1]
+        name = job["input"].rsplit("/", 1)[1]
+        self.s3.put(f"{job['output']}{job_id}/{name}.out", "\n".join(json.dumps(line) for line in lines).encode("utf-8"))
+        return {"status": "Completed"}
+
+class RecordHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        if "explode" in request["text"].lower():
+            raise RuntimeError("cannot record")
+        request["final"] = request["text"]
+        return super().handle(request)
+
+class LocalRuntime:
+    """
+    InvokeModel for direct fallback: echoes the prompt in upper case.
+    """
+
+    def invoke_model(self, body, modelId, **kwargs):
+        prompt = json.loads(body)["messages"][0]["content"]
+        output = {"content": [{"type": "text", "text": prompt.upper()}]}
+        return {"body": io.BytesIO(json.dumps(output).encode("utf-8"))}
+
+def stage_in_process(directory, count):
+    handler = AmazonBedrockHandler()
+    batch = BedrockBatch(directory)
+    for i in range(count):
+        batch.enqueue(handler, {"path": f"doc{os.getpid()}-{i}.txt"}, f"document {i}")
+
+class TestBedrockBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = patch.dict(os.environ, {**CLAUDE_3, "AMAZON_BEDROCK_BATCH": "true",
+                                          "AMAZON_BEDROCK_BATCH_DIR": os.path.join(self.tmp.name, "batch")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        bedrock.clear_invocation_plans()
+        self.addCleanup(bedrock.clear_invocation_plans)
+        self.s3 = LocalS3()
+
+    def batch(self, fail=()):
+        return BedrockBatch(s3_uri="s3://bucket/jobs", role_arn="arn:aws:iam::123456789012:role/batch",
+                            s3_client=self.s3, bedrock_client=LocalBedrock(self.s3, fail))
+
+    def stage(self, texts):
+        chain = AmazonBedrockHandler()
+        chain.set_next(RecordHandler())
+        with redirect_stdout(io.StringIO()):
+            staged = chain.handle_batch([{"text": text, "path": f"doc{i}.txt"} for i, text in enumerate(texts)])
+        return chain, staged
+
+    def test_staged_prompts_resume_with_outputs(self):
+        chain, staged = self.stage(["first document", "second document", "a longer third document that needs two calls"])
+        # The chain stopped at the Bedrock stage.
+        self.assertTrue(all("final" not in request for request in staged))
+        batch = self.batch()
+        with open(os.path.join(batch.directory, "records.jsonl")) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[0]["modelInput"]["messages"][0]["content"], "Summarize: first document")
+
+        # The partial outputs of the text split in two are combined by a direct call.
+        bedrock.get_invocation_plan(CLAUDE_3["AMAZON_BEDROCK_MODEL_ID"]).client = LocalRuntime()
+        with redirect_stdout(io.StringIO()), patch.dict(os.environ, {"AMAZON_BEDROCK_MAX_INPUT_CHARS": "400"}):
+            arn = batch.submit("job-abcdef")
+            self.assertEqual(batch.submit(), arn)
+            self.assertEqual(batch.wait(poll_interval=0), "Completed")
+            results = batch.resume()
+
+        self.assertEqual(self.s3.read("s3://bucket/jobs/input/job-abcdef.jsonl").count(b"\n"), 4)
+        finals = {result["path"]: result["final"] for result in results}
+        self.assertEqual(finals["doc0.txt"], "SUMMARIZE: FIRST DOCUMENT")
+        self.assertTrue(finals["doc2.txt"].startswith("SUMMARIZE: COMBINE THE FOLLOWING PARTIAL SUMMARIES"))
+        self.assertEqual(finals["doc2.txt"].count("SUMMARIZE: A LONGER THIRD"), 1)
+        self.assertEqual(os.listdir(os.path.join(batch.directory, "requests")), [])
+
+        # Once submitted, the staging directory takes no more prompts.
+        with self.assertRaises(RuntimeError), redirect_stdout(io.StringIO()):
+            chain.handle({"text": "late document"})
+
+    def test_resume_with_chain_and_failed_records(self):
+        chain, _ = self.stage(["good text", "broken text"])
+        batch = self.batch(fail=("broken",))
+        with redirect_stdout(io.StringIO()):
+            batch.submit()
+            batch.wait(poll_interval=0)
+            results = batch.resume(chain)
+        by_path = {result["path"]: result for result in results}
+        self.assertEqual(by_path["doc0.txt"]["final"], "SUMMARIZE: GOOD TEXT")
+        self.assertNotIn("final", by_path["doc1.txt"])
+        self.assertEqual(by_path["doc1.txt"]["bedrock_batch_error"]["errorMessage"], "bad input")
+        # The failed request stays parked.
+        self.assertEqual(len(os.listdir(os.path.join(batch.directory, "requests"))), 1)
+
+    def test_resume_continues_after_a_failing_chain(self):
+        chain, _ = self.stage(["good text", "explode text", "more text"])
+        batch = self.batch()
+        with redirect_stdout(io.StringIO()):
+            batch.submit()
+            batch.wait(poll_interval=0)
+            results = batch.resume(chain)
+        by_path = {result["path"]: result for result in results}
+        self.assertEqual(by_path["doc0.txt"]["final"], "SUMMARIZE: GOOD TEXT")
+        self.assertEqual(by_path["doc2.txt"]["final"], "SUMMARIZE: MORE TEXT")
+        self.assertEqual(by_path["doc1.txt"]["bedrock_batch_error"], "cannot record")
+        self.assertEqual(len(os.listdir(os.path.join(batch.directory, "requests"))), 1)
+
+    def test_too_few_records(self):
+        chain, _ = self.stage(["first document", "second document"])
+        batch = self.batch()
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_BATCH_MIN_RECORDS": "100"}):
+            with self.assertRaisesRegex(ValueError, "at least 100"):
+                batch.submit()
+            self.assertIsNone(batch.job())
+
+            plan = bedrock.get_invocation_plan(CLAUDE_3["AMAZON_BEDROCK_MODEL_ID"])
+            plan.client = LocalRuntime()
+            with redirect_stdout(io.StringIO()):
+                self.assertIsNone(batch.submit(direct=True))
+                self.assertEqual(batch.wait(poll_interval=0), "Completed")
+                results = batch.resume()
+        self.assertEqual(sorted(result["final"] for result in results), ["SUMMARIZE: FIRST DOCUMENT", "SUMMARIZE: SECOND DOCUMENT"])
+        self.assertEqual(self.s3.objects, {})
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_processes_stage_into_one_batch(self):
+        directory = os.environ["AMAZON_BEDROCK_BATCH_DIR"]
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=stage_in_process, args=(directory, 25)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            self.assertEqual(process.exitcode, 0)
+        with open(os.path.join(directory, "records.jsonl")) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(len({record["recordId"] for record in records}), 100)
+        self.assertEqual(len(os.listdir(os.path.join(directory, "requests"))), 100)
+
+    @patch.dict(os.environ, {"AMAZON_BEDROCK_MAX_INPUT_CHARS": "100"})
+    def test_prompt_is_repeated_in_every_record(self):
+        chain = PromptHandler()
+        chain.set_next(AmazonBedrockHandler()).set_next(RecordHandler())
+        text = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda"
+        with redirect_stdout(io.StringIO()):
+            chain.handle({"text": text, "prompt_file_name": "no_such_prompt"})
+        batch = self.batch()
+        with open(os.path.join(batch.directory, "records.jsonl")) as file:
+            prompts = [json.loads(line)["modelInput"]["messages"][0]["content"] for line in file]
+        self.assertEqual(len(prompts), 2)
+        for prompt in prompts:
+            self.assertTrue(prompt.startswith("Summarize: Please provide a summary of the following text: "))
+        self.assertEqual("".join(prompt.rsplit(": ", 1)[1] for prompt in prompts), text)
+
+    def test_resume_before_submit(self):
+        self.stage(["text"])
+        with self.assertRaisesRegex(RuntimeError, "not been submitted"):
+            self.batch().resume()
+
+    def test_submit_requires_staging_and_settings(self):
+        with self.assertRaises(RuntimeError):
+            self.batch().submit()
+        self.stage(["text"])
+        with self.assertRaises(ValueError):
+            BedrockBatch(s3_uri="", role_arn=None, s3_client=self.s3).submit()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import json
+import unittest
+from unittest.mock import patch
+from awschain.utils.bedrock import InvocationPlan
+from awschain.utils.chat_context import ChatContext
+
+MESSAGES_PROPS = '{"max_tokens": 100, "anthropic_version": "bedrock-2023-05-31", "messages": [{"role": "user", "content": ""}]}'
+
+def chat(context, turns, summarize=lambda prompt: "summary"):
+    for turn in range(turns):
+        context.add("user", f"question {turn}")
+        context.add("assistant", f"answer {turn}")
+        context.fold(summarize)
+
+class TestChatContext(unittest.TestCase):
+    def test_full_mode_resends_everything(self):
+        context = ChatContext("the document")
+        chat(context, 3)
+        self.assertEqual(json.loads(context.prompt_text())["messages"], context.transcript())
+        self.assertEqual(len(context.transcript()), 7)
+
+    def test_window(self):
+        context = ChatContext("the document", mode="window", window_turns=2)
+        chat(context, 5)
+        context.add("user", "question 5")
+        self.assertEqual([message["content"] for message in context.recent()],
+                         ["question 3", "answer 3", "question 4", "answer 4", "question 5"])
+        # The whole conversation is kept for the next handler, without the document.
+        self.assertEqual(len(context.transcript()), 11)
+        self.assertEqual(context.transcript()[0]["content"], "question 0")
+
+    def test_summary_folds_older_turns(self):
+        prompts = []
+
+        def summarize(prompt):
+            prompts.append(prompt)
+            return f"summary {len(prompts)} " + "x" * 100
+
+        context = ChatContext("the document", mode="summary", window_turns=4, summary_chars=50)
+        chat(context, 5, summarize)
+        # Five turns exceed the window of four: the oldest two were folded.
+        self.assertEqual(len(prompts), 1)
+        self.assertIn("user: question 0\nassistant: answer 0\nuser: question 1", prompts[0])
+        self.assertEqual(context.recent()[0]["content"], "question 2")
+        self.assertEqual(len(context.summary), 50)
+
+        chat(context, 10, summarize)
+        self.assertIn("Current summary:\nsummary", prompts[-1])
+        self.assertLessEqual(len(context.recent()), 8)
+        self.assertTrue(context.system_blocks()[-1]["text"].startswith("Summary of the earlier conversation:\nsummary"))
+
+    def test_messages_body_with_prompt_cache(self):
+        plan = InvocationPlan("anthropic.claude-3-5-haiku-20241022-v1:0", MESSAGES_PROPS, "{prompt_text}",
+                              "$.messages[0].content", "$.content[0].text", client=object())
+        self.assertTrue(plan.supports_messages)
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_CHAT_CONTEXT": "window"}):
+            context = ChatContext.from_env("the document", plan.model_id)
+        context.add("user", "hi")
+        body = json.loads(context.messages_body(plan))
+        self.assertEqual(body["max_tokens"], 100)
+        self.assertEqual(body["messages"], [{"role": "user", "content": "hi"}])
+        self.assertEqual(body["system"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertIn("the document", body["system"][0]["text"])
+
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_CHAT_CONTEXT": "window"}):
+            self.assertFalse(ChatContext.from_env("doc", "anthropic.claude-3-haiku-20240307-v1:0").prompt_cache)
+        with self.assertRaises(ValueError):
+            ChatContext("doc", mode="sliding")
+
+    def test_retriever_replaces_the_document(self):
+        questions = []
+
+        def retriever(question):
+            questions.append(question)
+            return [f"passage for {question}", "another passage"]
+
+        context = ChatContext("the whole document", mode="window", prompt_cache=True, retriever=retriever)
+        context.add("user", "first?")
+        context.add("assistant", "answer")
+        context.add("user", "second?")
+        self.assertEqual(questions, ["first?", "second?"])
+        system = context.system_blocks()[0]
+        self.assertIn("passage for second?\n\nanother passage", system["text"])
+        self.assertNotIn("the whole document", system["text"])
+        # The passages change every turn, so they are not a cache point.
+        self.assertNotIn("cache_control", system)
+        self.assertEqual(json.loads(context.prompt_text())["messages"][0]["content"], "passage for second?\n\nanother passage")
+        # The conversation for the next handler leaves the document out.
+        self.assertEqual(context.transcript()[0]["content"], "first?")
+
+if __name__ == '__main__':
+    unittest.main()
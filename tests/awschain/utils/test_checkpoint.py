@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.chain_runner import ChainRunner
+from awschain.utils.checkpoint import CheckpointStore, run_resumable
+from awschain.utils.text_stream import TextStream
+
+class StepHandler(AbstractHandler):
+    def __init__(self, name, calls, fail=None):
+        self.name = name
+        self.calls = calls
+        self.fail = fail
+
+    def handle(self, request: dict) -> dict:
+        self.calls.append(self.name)
+        if self.fail and self.fail[0]:
+            raise RuntimeError(f"{self.name} failed")
+        request["text"] = request["text"] + self.name
+        return super().handle(request)
+
+def build_chain(calls, fail):
+    chain = StepHandler("a", calls)
+    chain.set_next(StepHandler("b", calls)).set_next(StepHandler("c", calls, fail))
+    return chain
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rerun_resumes_after_last_completed_stage(self):
+        calls, fail = [], [True]
+        with self.assertRaises(RuntimeError):
+            run_resumable(build_chain(calls, fail), {"path": "video", "text": ""}, self.store)
+        self.assertEqual(calls, ["a", "b", "c"])
+
+        calls.clear()
+        fail[0] = False
+        result = run_resumable(build_chain(calls, fail), {"path": "video", "text": ""}, self.store)
+        self.assertEqual(calls, ["c"])
+        self.assertEqual(result["text"], "abc")
+        # Finished chains leave no checkpoint behind.
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_other_inputs_start_from_scratch(self):
+        calls, fail = [], [True]
+        with self.assertRaises(RuntimeError):
+            run_resumable(build_chain(calls, fail), {"path": "video", "text": ""}, self.store)
+        calls.clear()
+        fail[0] = False
+        run_resumable(build_chain(calls, fail), {"path": "other", "text": ""}, self.store)
+        self.assertEqual(calls, ["a", "b", "c"])
+
+    def test_streamed_text_is_checkpointed(self):
+        request = {"path": "doc", "text": TextStream(iter(["x", "y"]))}
+        self.assertTrue(self.store.save("key", 1, ["StepHandler"], request))
+        stage, handlers, restored = self.store.load("key")
+        self.assertEqual((stage, handlers), (1, ["StepHandler"]))
+        self.assertEqual(str(restored["text"]), "xy")
+
+    def test_chain_runner_resumes(self):
+        calls, fail = [], [True]
+        runner = ChainRunner(lambda request: build_chain(calls, fail), checkpoints=self.store)
+        results = runner.run([{"path": "video", "text": ""}], return_exceptions=True)
+        self.assertIsInstance(results[0], RuntimeError)
+        calls.clear()
+        fail[0] = False
+        self.assertEqual(runner.run([{"path": "video", "text": ""}])[0]["text"], "abc")
+        self.assertEqual(calls, ["c"])
+
+if __name__ == '__main__':
+    unittest.main()
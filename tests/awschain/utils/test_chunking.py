@@ -0,0 +1,70 @@
+import os
+import unittest
+from unittest.mock import patch
+from awschain.utils.chunking import Chunk, ChunkPlanner
+from awschain.handlers.processors.amazon_comprehend_pii_tokenize_handler import AmazonComprehendPIITokenizeHandler
+
+class TestChunkPlanner(unittest.TestCase):
+    def assert_covers(self, planner, text, chunks):
+        for chunk in chunks:
+            self.assertEqual(text[chunk.start:chunk.end], chunk.text)
+            self.assertLessEqual(planner.measure(chunk.text), planner.max_size)
+
+    def test_prefers_paragraphs_then_sentences_then_words(self):
+        text = "First paragraph here.\n\nSecond one. It has two sentences and more words"
+        planner = ChunkPlanner(40)
+        chunks = planner.plan(text)
+        self.assert_covers(planner, text, chunks)
+        self.assertEqual(chunks[0].text, "First paragraph here.\n\n")
+        self.assertEqual(chunks[1].text, "Second one. It has two sentences and ")
+        self.assertEqual("".join(chunk.text for chunk in chunks), text)
+
+        self.assertEqual(ChunkPlanner(16).split("Second one. It has two sentences"), ["Second one. ", "It has two ", "sentences"])
+        # A word longer than the limit is cut.
+        self.assertEqual(ChunkPlanner(4).split("abcdefghij"), ["abcd", "efgh", "ij"])
+
+    def test_bytes_never_split_characters(self):
+        text = "naïve café 日本語のテキスト " * 50
+        planner = ChunkPlanner(64, unit="bytes")
+        chunks = planner.plan(text)
+        self.assert_covers(planner, text, chunks)
+        self.assertEqual("".join(chunk.text for chunk in chunks), text)
+        self.assertEqual(ChunkPlanner(4, unit="bytes").split("日本語"), ["日", "本", "語"])
+
+    def test_overlap(self):
+        text = " ".join(f"w{i}" for i in range(40))
+        planner = ChunkPlanner(30, overlap=8)
+        chunks = planner.plan(text)
+        self.assert_covers(planner, text, chunks)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertLess(chunk.start, previous.end)
+            self.assertGreaterEqual(chunk.start, previous.end - 8)
+            self.assertEqual(text[chunk.start - 1], " ")
+        self.assertEqual(chunks[-1].end, len(text))
+
+    def test_tokens(self):
+        planner = ChunkPlanner(10, unit="tokens", chars_per_token=3)
+        self.assertEqual(planner.measure("abcdefg"), 3)
+        chunks = planner.plan("word " * 30)
+        self.assertTrue(all(len(chunk.text) <= 30 for chunk in chunks))
+
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_MAX_INPUT_TOKENS": "1000", "AMAZON_BEDROCK_CHARS_PER_TOKEN": "3.5"}):
+            planner = ChunkPlanner.for_bedrock()
+        self.assertEqual((planner.unit, planner.max_size, planner.chars_per_token), ("tokens", 1000, 3.5))
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            ChunkPlanner(10, unit="words")
+        with self.assertRaises(ValueError):
+            ChunkPlanner(10, overlap=10)
+
+    def test_tokenize_offsets_map_back(self):
+        text = "Call  Jane\tDoe.\n\nHer number:   555 0100. " * 20
+        chunks = AmazonComprehendPIITokenizeHandler().chunk_text(text, 50)
+        for chunk in chunks:
+            self.assertEqual(text[chunk['offset']:chunk['offset'] + len(chunk['text'])], chunk['text'])
+        self.assertEqual(ChunkPlanner(50).plan(""), [])
+        self.assertEqual(Chunk("a", 0, 1), Chunk("a", 0, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import time
+import threading
+import unittest
+from unittest.mock import patch
+import boto3
+from botocore.config import Config
+from botocore.awsrequest import AWSResponse
+from awschain.utils import concurrency
+from awschain.utils.concurrency import AdaptiveLimiter
+
+class RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+class LocalService:
+    """
+    Answers the HTTP attempts of a client locally, throttling whenever more than
+    capacity calls are in flight at the same time.
+    """
+
+    def __init__(self, capacity, latency=0.02):
+        self.capacity = capacity
+        self.latency = latency
+        self.active = 0
+        self.throttled = 0
+        self.served = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, request=None, **kwargs):
+        with self.lock:
+            self.active += 1
+            overloaded = self.active > self.capacity
+        try:
+            time.sleep(self.latency)
+            with self.lock:
+                if overloaded:
+                    self.throttled += 1
+                    return AWSResponse(request.url, 400, {"Content-Type": "application/x-amz-json-1.1"},
+                                       RawBody(b'{"__type": "ThrottlingException", "message": "Rate exceeded"}'))
+                self.served += 1
+            return AWSResponse(request.url, 200, {"Content-Type": "application/x-amz-json-1.1"}, RawBody(b'{"Sentiment": "POSITIVE"}'))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    def setUp(self):
+        concurrency.reset()
+
+    def tearDown(self):
+        concurrency.reset()
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AdaptiveLimiter("comprehend", initial=4, maximum=10)
+        for _ in range(8):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.snapshot()["limit"], 5)
+
+        # Two throttles from calls started before the cut only halve the limit once.
+        first, second = limiter.acquire(), limiter.acquire()
+        limiter.release(first, throttled=True)
+        limiter.release(second, throttled=True)
+        self.assertEqual(limiter.snapshot()["limit"], 2)
+        self.assertEqual(limiter.snapshot()["throttles"], 2)
+
+        started = limiter.acquire()
+        limiter.release(started, throttled=True)
+        self.assertEqual(limiter.snapshot()["limit"], 1)
+
+    def test_slow_calls_do_not_grow_limit(self):
+        limiter = AdaptiveLimiter("bedrock-runtime", initial=2)
+        limiter.release(limiter.acquire())
+        limit = limiter.limit
+        started = limiter.acquire()
+        time.sleep(0.05)
+        limiter.release(started)
+        self.assertEqual(limiter.limit, limit)
+
+    def test_acquire_blocks_at_limit(self):
+        limiter = AdaptiveLimiter("s3", initial=1)
+        started = limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release(started)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    @patch.dict(os.environ, {"AWS_ADAPTIVE_CONCURRENCY": "true", "AWS_CONCURRENCY_INITIAL": "12"})
+    def test_client_backs_off_under_throttling(self):
+        service = LocalService(capacity=3)
+        client = boto3.client("comprehend", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x",
+                              config=Config(retries={"total_max_attempts": 1}))
+        concurrency.register_client(client)
+        client.meta.events.register("before-send", service)
+
+        def call():
+            for _ in range(10):
+                try:
+                    client.detect_sentiment(Text="good", LanguageCode="en")
+                except client.exceptions.ClientError:
+                    pass
+
+        threads = [threading.Thread(target=call) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        state = concurrency.snapshot()["comprehend"]
+        self.assertEqual(state["in_flight"], 0)
+        self.assertGreater(state["throttles"], 0)
+        self.assertLess(state["limit"], 12)
+        # Once the limit adapted, most calls succeed.
+        self.assertGreater(service.served, service.throttled)
+        self.assertIn('awschain_aws_concurrency_limit{service="comprehend"}', concurrency.to_prometheus())
+
+    @patch.dict(os.environ, {"AWS_ADAPTIVE_CONCURRENCY": "false"})
+    def test_disabled_by_default(self):
+        client = boto3.client("comprehend", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+        concurrency.register_client(client)
+        client.meta.events.register("before-send", LocalService(capacity=1))
+        client.detect_sentiment(Text="good", LanguageCode="en")
+        self.assertEqual(concurrency.snapshot(), {})
+
+if __name__ == '__main__':
+    unittest.main()
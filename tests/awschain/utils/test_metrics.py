@@ -0,0 +1,80 @@
+import os
+import time
+import json
+import unittest
+from unittest.mock import patch
+import boto3
+from botocore.stub import Stubber
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.parallel_handler import ParallelHandler
+from awschain.utils import metrics
+
+class SleepHandler(AbstractHandler):
+    def __init__(self, seconds, text=None):
+        self.seconds = seconds
+        self.text = text
+
+    def handle(self, request: dict) -> dict:
+        time.sleep(self.seconds)
+        if self.text is not None:
+            request["text"] = self.text
+        return super().handle(request)
+
+class S3CallHandler(AbstractHandler):
+    def __init__(self, client):
+        self.client = client
+
+    def handle(self, request: dict) -> dict:
+        self.client.head_bucket(Bucket="bucket")
+        return super().handle(request)
+
+class TestMetrics(unittest.TestCase):
+    @patch.dict(os.environ, {"AWSCHAIN_METRICS": "true"})
+    def test_stage_times_are_exclusive(self):
+        chain = SleepHandler(0.05, text="hello")
+        chain.set_next(SleepHandler(0.1, text="hello world"))
+        result = chain.handle({"text": "abc"})
+
+        first, second = result[metrics.METRICS_KEY]
+        self.assertEqual(first["handler"], "SleepHandler")
+        self.assertLess(first["wall_seconds"], 0.09)
+        self.assertGreaterEqual(second["wall_seconds"], 0.1)
+        self.assertEqual((first["input_size"], first["output_size"]), (3, 5))
+        self.assertEqual((second["input_size"], second["output_size"]), (5, 11))
+
+    @patch.dict(os.environ, {"AWSCHAIN_METRICS": "false"})
+    def test_disabled_by_default(self):
+        result = SleepHandler(0).handle({"text": "abc"})
+        self.assertNotIn(metrics.METRICS_KEY, result)
+        result = SleepHandler(0).handle({"text": "abc", "collect_metrics": True})
+        self.assertEqual(len(result[metrics.METRICS_KEY]), 1)
+
+    @patch.dict(os.environ, {"AWSCHAIN_METRICS": "true"})
+    def test_aws_calls_are_attributed_to_stage(self):
+        client = metrics.register_client(boto3.client("s3", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x"))
+        with Stubber(client) as stubber:
+            stubber.add_response("head_bucket", {}, {"Bucket": "bucket"})
+            stubber.add_response("head_bucket", {}, {"Bucket": "bucket"})
+            chain = SleepHandler(0)
+            chain.set_next(S3CallHandler(client))
+            result = chain.handle({"text": ""})
+            client.head_bucket(Bucket="bucket")  # outside any stage: not recorded
+
+        first, second = result[metrics.METRICS_KEY]
+        self.assertEqual(first["aws_calls"], 0)
+        self.assertEqual(second["aws_calls"], 1)
+        self.assertEqual(second["aws_operations"]["s3.HeadBucket"]["count"], 1)
+
+        exposition = metrics.to_prometheus([result])
+        self.assertIn('awschain_aws_calls_total{handler="S3CallHandler",operation="s3.HeadBucket"} 1', exposition)
+        self.assertEqual(len(json.loads(metrics.to_json(result))), 2)
+
+    @patch.dict(os.environ, {"AWSCHAIN_METRICS": "true"})
+    def test_parallel_branches_keep_their_records(self):
+        handler = ParallelHandler(SleepHandler(0, text="a"), SleepHandler(0))
+        result = handler.handle({"text": ""})
+        names = [record["handler"] for record in result[metrics.METRICS_KEY]]
+        self.assertEqual(names, ["ParallelHandler", "SleepHandler", "SleepHandler"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import pickle
+import unittest
+from unittest.mock import patch
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.chain_runner import ChainRunner
+from awschain.utils import executors
+
+class ParseHandler(AbstractHandler):
+    cpu_bound = True
+
+    def handle(self, request: dict) -> dict:
+        request["pid"] = os.getpid()
+        request["metadata"]["pages"] = 3
+        request.pop("scratch", None)
+        request["text"] = request["path"].upper()
+        return super().handle(request)
+
+class StopHandler(AbstractHandler):
+    cpu_bound = True
+
+    def handle(self, request: dict) -> dict:
+        request["pid"] = os.getpid()
+        return request
+
+class TagHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        request["tagged_in"] = os.getpid()
+        return super().handle(request)
+
+class TestProcessPool(unittest.TestCase):
+    @patch.dict(os.environ, {"CPU_BOUND_EXECUTOR": "process"})
+    def test_cpu_bound_stage_runs_in_worker_process(self):
+        blob = "x" * 100000
+        requests = [{"path": f"doc{i}.pdf", "metadata": {}, "scratch": 1, "blob": blob} for i in range(4)]
+        chain = ParseHandler()
+        chain.set_next(TagHandler())
+        results = ChainRunner(chain).run(requests)
+
+        for i, result in enumerate(results):
+            self.assertIs(result, requests[i])
+            self.assertNotEqual(result["pid"], os.getpid())
+            self.assertEqual(result["tagged_in"], os.getpid())
+            self.assertEqual(result["text"], f"DOC{i}.PDF")
+            # In-place changes and removals are applied; unchanged values are not copied back.
+            self.assertEqual(result["metadata"], {"pages": 3})
+            self.assertNotIn("scratch", result)
+            self.assertIs(result["blob"], blob)
+
+    @patch.dict(os.environ, {"CPU_BOUND_EXECUTOR": "process"})
+    def test_early_return_in_worker_process(self):
+        chain = StopHandler()
+        chain.set_next(TagHandler())
+        result, = ChainRunner(chain).run([{"path": "a"}])
+        self.assertNotEqual(result["pid"], os.getpid())
+        self.assertNotIn("tagged_in", result)
+
+    @patch.dict(os.environ, {"CPU_BOUND_EXECUTOR": "process"})
+    def test_unpicklable_handler_falls_back_to_thread(self):
+        class LocalHandler(AbstractHandler):
+            cpu_bound = True
+
+            def handle(self, request: dict) -> dict:
+                request["pid"] = os.getpid()
+                return super().handle(request)
+
+        result, = ChainRunner(LocalHandler()).run([{}])
+        self.assertEqual(result["pid"], os.getpid())
+
+    @patch.dict(os.environ, {"CPU_BOUND_EXECUTOR": "thread"})
+    def test_thread_executor(self):
+        result, = ChainRunner(ParseHandler()).run([{"path": "a", "metadata": {}}])
+        self.assertEqual(result["pid"], os.getpid())
+
+    def test_process_is_the_default(self):
+        with patch.dict(os.environ):
+            os.environ.pop("CPU_BOUND_EXECUTOR", None)
+            self.assertTrue(executors.process_pool_enabled())
+        with patch.dict(os.environ, {"CPU_BOUND_EXECUTOR": "thread"}):
+            self.assertFalse(executors.process_pool_enabled())
+
+    def test_delta_compares_against_input_pickles(self):
+        request = {"path": "a", "metadata": {}, "scratch": 1, "blob": "x" * 100000}
+        pickled = {key: pickle.dumps(value, pickle.HIGHEST_PROTOCOL) for key, value in request.items()}
+        with patch.object(executors.pickle, "dumps", wraps=pickle.dumps) as dumps:
+            changed, removed, forwarded = executors._run_stage_in_process(ParseHandler(), {}, pickled)
+        # Only the mutable metadata is pickled again; unchanged strings are not.
+        self.assertEqual(dumps.call_count, 1)
+        self.assertEqual(set(changed), {"pid", "metadata", "text"})
+        self.assertEqual(removed, ["scratch"])
+
+if __name__ == '__main__':
+    unittest.main()
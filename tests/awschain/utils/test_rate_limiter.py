@@ -0,0 +1,81 @@
+import os
+import time
+import threading
+import unittest
+from unittest.mock import patch
+import boto3
+from botocore.awsrequest import AWSResponse
+from awschain.utils import rate_limiter
+from awschain.utils.rate_limiter import TokenBucket, RateLimiter, get_rate_limiter
+
+class RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+def respond_locally(client, body=b'{"Sentiment": "POSITIVE"}'):
+    """
+    Answers every HTTP attempt of the client with body instead of calling AWS.
+    Registered after the rate limiter hook, so the limiter still runs first.
+    """
+    def send(request=None, **kwargs):
+        return AWSResponse(request.url, 200, {"Content-Type": "application/x-amz-json-1.1"}, RawBody(body))
+    client.meta.events.register("before-send", send)
+    return client
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket_spaces_concurrent_callers(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        calls = []
+        lock = threading.Lock()
+
+        def call():
+            bucket.acquire()
+            with lock:
+                calls.append(time.monotonic())
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 2 calls from the burst, the remaining 6 at 20 per second.
+        elapsed = max(calls) - start
+        self.assertGreaterEqual(elapsed, 0.28)
+        self.assertLess(elapsed, 0.6)
+
+    def test_service_and_api_limits(self):
+        limiter = RateLimiter({"comprehend": {"rate": 100, "burst": 100}, "comprehend.detect_entities": {"rate": 10, "burst": 1}})
+        for _ in range(3):
+            limiter.acquire("comprehend", "DetectSentiment")
+        self.assertEqual(limiter.stats(), {})
+        limiter.acquire("comprehend", "DetectEntities")
+        waited = limiter.acquire("comprehend", "DetectEntities")
+        self.assertGreater(waited, 0.05)
+        self.assertEqual(limiter.stats()["comprehend.DetectEntities"]["count"], 1)
+        self.assertEqual(limiter.acquire("s3", "GetObject"), 0.0)
+
+    def test_limits_from_config(self):
+        with patch.dict(os.environ, {"AWS_RATE_LIMITS": '{"comprehend": 5}'}):
+            self.assertEqual(set(get_rate_limiter().buckets), {"comprehend"})
+        # ConfigLoader stores nested YAML mappings with str().
+        with patch.dict(os.environ, {"AWS_RATE_LIMITS": str({"bedrock-runtime.InvokeModel": {"rate": 1}})}):
+            self.assertEqual(set(get_rate_limiter().buckets), {"bedrock-runtime.invokemodel"})
+        with patch.dict(os.environ, {"AWS_RATE_LIMITS": ""}):
+            self.assertEqual(get_rate_limiter().buckets, {})
+
+    @patch.dict(os.environ, {"AWS_RATE_LIMITS": '{"comprehend.DetectSentiment": {"rate": 10, "burst": 1}}'})
+    def test_client_calls_are_limited(self):
+        client = boto3.client("comprehend", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+        respond_locally(rate_limiter.register_client(client))
+        start = time.monotonic()
+        for _ in range(4):
+            self.assertEqual(client.detect_sentiment(Text="good", LanguageCode="en")["Sentiment"], "POSITIVE")
+        self.assertGreaterEqual(time.monotonic() - start, 0.28)
+        self.assertEqual(get_rate_limiter().stats()["comprehend.DetectSentiment"]["count"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
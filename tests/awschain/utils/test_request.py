@@ -0,0 +1,110 @@
+import os
+import copy
+import json
+import pickle
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+from awschain import Request
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.chain_runner import ChainRunner
+from awschain.handlers.parallel_handler import ParallelHandler
+from awschain.worker import SQLiteQueue
+
+class ReadHandler(AbstractHandler):
+    cpu_bound = True
+
+    def handle(self, request: dict) -> dict:
+        request["text"] = bytes(request["payload"]).decode("utf-8")
+        request.setdefault("metadata", {})["size"] = len(request["payload"])
+        return super().handle(request)
+
+class TokenHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        request["token_map"] = {"[NAME]": "Alice"}
+        return super().handle(request)
+
+class TestRequest(unittest.TestCase):
+    def test_dict_interface(self):
+        request = Request({"path": "a.pdf", "text": "abc"}, token_map={})
+        self.assertEqual(request["path"], "a.pdf")
+        self.assertEqual(request.get("type"), None)
+        self.assertEqual(request.get("subject", "none"), "none")
+        self.assertEqual(list(request), ["path", "text", "token_map"])
+        self.assertEqual(request, {"path": "a.pdf", "text": "abc", "token_map": {}})
+        self.assertIn("token_map", request)
+        self.assertNotIn("metadata", request)
+
+        request.update({"text": "def", "subject": "hi"})
+        self.assertEqual(request.pop("subject"), "hi")
+        del request["text"]
+        self.assertNotIn("text", request)
+        with self.assertRaises(KeyError):
+            request["text"]
+        with self.assertRaises(KeyError):
+            del request["text"]
+        self.assertEqual(request.to_dict(), {"path": "a.pdf", "token_map": {}})
+        self.assertEqual(len(request), 2)
+
+    def test_json(self):
+        request = Request(path="a.pdf", text="abc", extract_media=True)
+        with self.assertRaises(TypeError):
+            json.dumps(request)  # not a dict subclass
+        self.assertEqual(json.loads(json.dumps(request.to_dict())), {"path": "a.pdf", "text": "abc", "extract_media": True})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = SQLiteQueue(os.path.join(tmp, "queue.db"))
+            queue.put(request)
+            message, = queue.receive()
+            queue.close()
+        self.assertEqual(message.body, request.to_dict())
+
+    def test_payload_is_not_copied(self):
+        buffer = bytearray(b"hello")
+        request = Request(payload=buffer)
+        self.assertIsInstance(request["payload"], memoryview)
+        buffer[0:1] = b"j"
+        self.assertEqual(bytes(request["payload"]), b"jello")
+
+        data = b"x" * 1000
+        self.assertIs(Request(payload=data)["payload"], data)
+
+    def test_pickle_and_deepcopy(self):
+        request = Request(path="a", payload=bytearray(b"abc"), token_map={"k": "v"})
+        for restored in (pickle.loads(pickle.dumps(request)), copy.deepcopy(request)):
+            self.assertIsInstance(restored, Request)
+            self.assertEqual(restored["payload"], b"abc")
+            self.assertEqual(restored["token_map"], {"k": "v"})
+
+    def test_repr_summarizes_long_values(self):
+        self.assertEqual(repr(Request(path="a", text="x" * 1000)), "Request(path='a', text=<str of length 1000>)")
+
+    def test_smaller_than_dict(self):
+        def allocated(factory):
+            tracemalloc.start()
+            items = [factory(i) for i in range(2000)]
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            return size, items
+
+        dict_size, _ = allocated(lambda i: {"type": "pdf", "path": "p", "text": "t", "metadata": None, "prompt_file_name": "f"})
+        request_size, _ = allocated(lambda i: Request(type="pdf", path="p", text="t", metadata=None, prompt_file_name="f"))
+        self.assertLess(request_size, dict_size * 0.7)
+
+    @patch.dict(os.environ, {"CPU_BOUND_EXECUTOR": "process"})
+    def test_runs_through_chains(self):
+        chain = ReadHandler()
+        chain.set_next(ParallelHandler(TokenHandler()))
+        request = Request(path="doc.txt", payload=bytearray(b"hello"))
+        result, = ChainRunner(chain).run([request])
+        self.assertIs(result, request)
+        self.assertEqual(result["text"], "hello")
+        self.assertEqual(result["metadata"], {"size": 5})
+        self.assertEqual(result["token_map"], {"[NAME]": "Alice"})
+
+        result = chain.handle(Request(path="doc.txt", payload=b"bye"))
+        self.assertEqual((result["text"], result["token_map"]), ("bye", {"[NAME]": "Alice"}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest.mock import patch
+import boto3
+from botocore.stub import Stubber
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.processors.amazon_transcribe_handler import AmazonTranscriptionHandler
+from awschain.utils import result_cache
+from awschain.utils.result_cache import DirectoryCache, SQLiteCache, get_result_cache
+from awschain.utils.text_stream import TextStream
+
+class UpperHandler(AbstractHandler):
+    cache_key_fields = ("text", "path")
+    cache_file_fields = ("path",)
+    cache_config_vars = ("UPPER_SUFFIX",)
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def handle(self, request: dict) -> dict:
+        self.calls.append(request["text"])
+        request["text"] = request["text"].upper() + os.getenv("UPPER_SUFFIX", "")
+        request.pop("scratch", None)
+        return super().handle(request)
+
+class CountHandler(AbstractHandler):
+    def __init__(self, calls):
+        self.calls = calls
+
+    def handle(self, request: dict) -> dict:
+        self.calls.append("count")
+        request["length"] = len(request["text"])
+        return super().handle(request)
+
+class StreamHandler(AbstractHandler):
+    cache_key_fields = ("text",)
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def handle(self, request: dict) -> dict:
+        self.calls.append(request["text"])
+        request["text"] = TextStream(iter(["a", "b", "c"]), buffer=True)
+        return super().handle(request)
+
+class ReadHandler(AbstractHandler):
+    accepts_lazy_text = True
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def handle(self, request: dict) -> dict:
+        # The stream has not been read (or stored) before this handler reads it.
+        self.calls.append(get_result_cache().stats.snapshot()["stores"])
+        request["read"] = "".join(request["text"].iter_chunks())
+        return super().handle(request)
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, "input.bin")
+        with open(self.file_path, "wb") as f:
+            f.write(b"v1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_chain(self, calls, **request):
+        chain = UpperHandler(calls)
+        chain.set_next(CountHandler(calls))
+        return chain.handle({"path": self.file_path, **request})
+
+    def check_backend(self, backend):
+        env = {"RESULT_CACHE": backend, "RESULT_CACHE_PATH": os.path.join(self.tmp.name, backend), "UPPER_SUFFIX": "!"}
+        with patch.dict(os.environ, env):
+            calls = []
+            first = self.run_chain(calls, text="abc", scratch=1)
+            second = self.run_chain(calls, text="abc", scratch=1)
+            # The cached handler ran once; the rest of the chain ran both times.
+            self.assertEqual(calls, ["abc", "count", "count"])
+            self.assertEqual(second, first)
+            self.assertNotIn("scratch", second)
+
+            stats = get_result_cache().stats.snapshot()
+            self.assertEqual((stats["hits"], stats["misses"], stats["stores"]), (1, 1, 1))
+            self.assertEqual(stats["handlers"]["UpperHandler"]["hits"], 1)
+
+            # Changing the file content, the config or bypassing the cache recomputes.
+            with open(self.file_path, "wb") as f:
+                f.write(b"v2")
+            self.run_chain(calls, text="abc")
+            with patch.dict(os.environ, {"UPPER_SUFFIX": "?"}):
+                self.run_chain(calls, text="abc")
+            self.run_chain(calls, text="abc", use_cache=False)
+            self.assertEqual(calls.count("abc"), 4)
+
+    def test_directory_backend(self):
+        self.check_backend("directory")
+
+    def test_sqlite_backend(self):
+        self.check_backend("sqlite")
+
+    def test_stream_is_stored_once_consumed(self):
+        env = {"RESULT_CACHE": "directory", "RESULT_CACHE_PATH": os.path.join(self.tmp.name, "streams")}
+        with patch.dict(os.environ, env):
+            calls = []
+            for _ in range(2):
+                chain = StreamHandler(calls)
+                chain.set_next(ReadHandler(calls))
+                result = chain.handle({"text": "in"})
+                self.assertEqual(result["read"], "abc")
+            self.assertEqual(calls, ["in", 0, 1])
+            self.assertEqual(str(result["text"]), "abc")
+
+    @patch.dict(os.environ, {"BUCKET_NAME": "bucket", "OUTPUT_FOLDER": "out"})
+    def test_transcription_key_includes_etag(self):
+        s3 = boto3.client("s3", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+        env = {"RESULT_CACHE": "directory", "RESULT_CACHE_PATH": os.path.join(self.tmp.name, "transcribe")}
+        with patch.dict(os.environ, env), Stubber(s3) as stubber, \
+                patch("awschain.utils.aws_boto_client_manager.AWSBotoClientManager.get_client", return_value=s3), \
+                patch.object(AmazonTranscriptionHandler, "extract_transcript", side_effect=["one", "two"]) as extract:
+            for etag in ('"v1"', '"v1"', '"v2"'):
+                stubber.add_response("head_object", {"ETag": etag}, {"Bucket": "bucket", "Key": "media/a.mp3"})
+            texts = [AmazonTranscriptionHandler().handle({"path": "s3://bucket/media/a.mp3"})["text"] for _ in range(3)]
+            stubber.assert_no_pending_responses()
+        # The same ETag is a hit; a re-uploaded object is transcribed again.
+        self.assertEqual(texts, ["one", "one", "two"])
+        self.assertEqual(extract.call_count, 2)
+
+    def test_lru_eviction_and_ttl(self):
+        for cache in (DirectoryCache(os.path.join(self.tmp.name, "dir"), max_bytes=600),
+                      SQLiteCache(os.path.join(self.tmp.name, "db.sqlite3"), max_bytes=600)):
+            cache.set("a" * 64, b"x" * 250)
+            time.sleep(0.01)
+            cache.set("b" * 64, b"x" * 250)
+            time.sleep(0.01)
+            cache.get("a" * 64)  # "b" is now the least recently used
+            time.sleep(0.01)
+            cache.set("c" * 64, b"x" * 250)
+            self.assertIs(cache.get("b" * 64), result_cache._MISSING)
+            self.assertEqual(cache.get("a" * 64), b"x" * 250)
+            self.assertEqual(cache.stats.snapshot()["evictions"], 1)
+
+            cache.ttl = 0.01
+            time.sleep(0.02)
+            self.assertIs(cache.get("a" * 64), result_cache._MISSING)
+
+if __name__ == '__main__':
+    unittest.main()
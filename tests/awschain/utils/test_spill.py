@@ -0,0 +1,163 @@
+import gc
+import os
+import copy
+import pickle
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+import boto3
+from botocore.stub import Stubber
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.processors.html_cleaner_handler import HTMLCleanerHandler
+from awschain.handlers.processors.amazon_comprehend_pii_classifier_handler import AmazonComprehendPIIClassifierHandler
+from awschain.handlers.misc.print_context_handler import PrintContextHandler
+from awschain.handlers.writers.amazon_s3_writer_handler import AmazonS3WriterHandler
+from awschain.utils.aws_boto_client_manager import AWSBotoClientManager
+from awschain.utils.spill import SpilledText, maybe_spill
+
+class ProduceHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        request["text"] = "héllo wörld " * 1000
+        return super().handle(request)
+
+class PassHandler(AbstractHandler):
+    accepts_lazy_text = True
+
+    def handle(self, request: dict) -> dict:
+        request["seen"] = type(request["text"]).__name__
+        return super().handle(request)
+
+class UpperHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        request["seen_by_upper"] = type(request["text"]).__name__
+        request["summary"] = request["text"].upper()[:11]
+        return super().handle(request)
+
+class HTMLProduceHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        request["text"] = "<html><body>" + "<p>Call me at 555-0100.</p>" * 100 + "</body></html>"
+        return super().handle(request)
+
+class BigReadHandler(AbstractHandler):
+    def handle(self, request: dict) -> dict:
+        # Like a reader: the text is still a local when the request is forwarded.
+        text = "x" * (20 * 1024 * 1024)
+        request["text"] = text
+        return super().handle(request)
+
+class MeasureHandler(AbstractHandler):
+    accepts_lazy_text = True
+
+    def handle(self, request: dict) -> dict:
+        gc.collect()
+        request["traced"] = tracemalloc.get_traced_memory()[0]
+        return super().handle(request)
+
+class TestSpill(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = patch.dict(os.environ, {"SPILL_DIR": self.tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        gc.collect()
+        self.tmp.cleanup()
+
+    @patch.dict(os.environ, {"SPILL_THRESHOLD": "1000"})
+    def test_spilled_text_is_freed_between_stages(self):
+        def traced(run):
+            chain = BigReadHandler()
+            chain.set_next(MeasureHandler())
+            tracemalloc.start()
+            try:
+                baseline = tracemalloc.get_traced_memory()[0]
+                result = run(chain, {})
+            finally:
+                tracemalloc.stop()
+            self.assertIsInstance(result["text"], SpilledText)
+            return result["traced"] - baseline
+
+        # Run stage by stage, the reader's string is gone once it is spilled.
+        self.assertLess(traced(lambda chain, request: chain.handle_in_stages(request)), 2 * 1024 * 1024)
+        # Nested handle() calls keep it alive in the reader's frame.
+        self.assertGreater(traced(lambda chain, request: chain.handle(request)), 20 * 1024 * 1024)
+
+    def test_spilled_text_reads_back(self):
+        text = "naïve café " * 500
+        spilled = SpilledText(text, chunk_size=7)
+        self.assertEqual(len(spilled), len(text))
+        self.assertEqual("".join(spilled.iter_chunks()), text)
+        self.assertEqual(spilled, text)
+        self.assertEqual(spilled.split()[:2], ["naïve", "café"])
+        self.assertIs(copy.deepcopy(spilled), spilled)
+        self.assertEqual(pickle.loads(pickle.dumps(spilled)), text)
+
+        path = spilled.path
+        self.assertTrue(os.path.exists(path))
+        del spilled
+        gc.collect()
+        self.assertFalse(os.path.exists(path))
+
+    @patch.dict(os.environ, {"SPILL_THRESHOLD": "1000"})
+    def test_large_text_is_spilled_between_stages(self):
+        chain = ProduceHandler()
+        chain.set_next(PassHandler()).set_next(UpperHandler())
+        with patch.object(SpilledText, "materialize", autospec=True, side_effect=SpilledText.materialize) as materialize:
+            result = chain.handle({"text": "short"})
+        self.assertEqual(result["seen"], "SpilledText")
+        # A handler that has not opted in to lazy text gets a str.
+        self.assertEqual(result["seen_by_upper"], "str")
+        self.assertEqual(result["summary"], "HÉLLO WÖRLD")
+        self.assertEqual(materialize.call_count, 1)
+        self.assertEqual(result["text"], "héllo wörld " * 1000)
+
+        self.assertIsInstance(maybe_spill({"text": "short"})["text"], str)
+
+    def test_pass_through_handlers_keep_spilled_text(self):
+        uploaded = {}
+
+        def upload(handler, path, bucket, folder, filename):
+            with open(path, encoding="utf-8") as f:
+                uploaded["body"] = f.read()
+            return f"{folder}/{filename}"
+
+        chain = ProduceHandler()
+        chain.set_next(PrintContextHandler()).set_next(AmazonS3WriterHandler()).set_next(PassHandler())
+        with patch.object(SpilledText, "materialize", autospec=True, side_effect=SpilledText.materialize) as materialize, \
+                patch.object(AmazonS3WriterHandler, "upload_file_to_s3", autospec=True, side_effect=upload), \
+                patch.dict(os.environ, {"SPILL_THRESHOLD": "1000", "DIR_STORAGE": self.tmp.name}), patch("builtins.print"):
+            result = chain.handle({"write_file_path": "s3://bucket/folder/out.txt"})
+        self.assertEqual(result["seen"], "SpilledText")
+        self.assertEqual(materialize.call_count, 0)
+        self.assertEqual(uploaded["body"], "héllo wörld " * 1000 + "\n")
+
+    @patch.dict(os.environ, {"SPILL_THRESHOLD": "100"})
+    def test_spilled_request_through_str_handlers(self):
+        comprehend = boto3.client("comprehend", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+        stubber = Stubber(comprehend)
+        # The stub validates the parameters like the real client: Text must be a str.
+        stubber.add_response("detect_pii_entities", {"Entities": [{"Type": "PHONE", "BeginOffset": 11, "EndOffset": 19}]},
+                             {"Text": "Call me at 555-0100. " * 99 + "Call me at 555-0100.", "LanguageCode": "en"})
+        chain = HTMLProduceHandler()
+        chain.set_next(PassHandler()).set_next(HTMLCleanerHandler()).set_next(AmazonComprehendPIIClassifierHandler())
+        with stubber, patch.object(AWSBotoClientManager, "get_client", return_value=comprehend), \
+                patch.dict(os.environ, {"RESULT_CACHE": ""}):
+            result = chain.handle({})
+        self.assertEqual(result["seen"], "SpilledText")
+        self.assertTrue(result["is_pii"])
+        self.assertEqual(result["detected_pii"], ["PHONE"])
+        self.assertIsInstance(result["text"], str)
+        stubber.assert_no_pending_responses()
+
+    @patch.dict(os.environ, {"SPILL_MEMORY_BUDGET": "1", "SPILL_MIN_SIZE": "100"})
+    def test_memory_budget(self):
+        request = maybe_spill({"text": "x" * 200, "title": "y" * 200})
+        self.assertIsInstance(request["text"], SpilledText)
+        # Only SPILL_FIELDS are spilled.
+        self.assertIsInstance(request["title"], str)
+        self.assertIsInstance(maybe_spill({"text": "x" * 50})["text"], str)
+
+if __name__ == '__main__':
+    unittest.main()
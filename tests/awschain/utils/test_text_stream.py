@@ -0,0 +1,108 @@
+import os
+import re
+import json
+import tempfile
+import unittest
+from awschain.utils.text_stream import LazyText, TextStream, PromptedText, FileText, rechunk
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.handlers.processors.prompt_handler import PromptHandler
+from awschain.handlers.writers.local_file_writer_handler import LocalFileWriterHandler
+
+class RegexHandler(AbstractHandler):
+    """
+    Not stream-aware: uses re and json on the text.
+    """
+
+    def handle(self, request: dict) -> dict:
+        request["type"] = type(request["text"]).__name__
+        request["text"] = re.sub(r"\s+", " ", request["text"])
+        request["json"] = json.dumps(request)
+        return super().handle(request)
+
+class TestTextStream(unittest.TestCase):
+    def test_rechunk_chars_and_bytes(self):
+        text = "héllo wörld " * 40 + "x" * 100
+        for unit in ("chars", "bytes"):
+            pieces = list(rechunk(iter([text[:50], text[50:]]), 32, unit))
+            self.assertEqual("".join(pieces), text)
+            sizes = [len(piece) if unit == "chars" else len(piece.encode("utf-8")) for piece in pieces]
+            self.assertLessEqual(max(sizes), 32)
+
+    def test_rechunk_prefers_whitespace(self):
+        pieces = list(rechunk(["aaaa bbbb cccc"], 10))
+        self.assertEqual(pieces, ["aaaa bbbb ", "cccc"])
+
+    def test_stream_behaves_like_str(self):
+        stream = TextStream(["Hello ", "world"])
+        self.assertEqual(stream.upper(), "HELLO WORLD")
+        self.assertEqual(len(stream), 11)
+        self.assertEqual(f"{stream}!", "Hello world!")
+
+    def test_bool_does_not_read_the_stream(self):
+        read = []
+
+        def segments():
+            for segment in ["", "a", "b"]:
+                read.append(segment)
+                yield segment
+
+        stream = TextStream(segments())
+        self.assertTrue(stream)
+        self.assertEqual(read, ["", "a"])
+        self.assertEqual(list(stream.iter_chunks()), ["a", "b"])
+        self.assertFalse(TextStream(iter(["", ""])))
+
+    def test_handlers_that_did_not_opt_in_get_str(self):
+        prompt = PromptHandler().format_prompt("Summarize: {input_text}", TextStream(iter(["one\n\n", "two"])))
+        result = RegexHandler().handle({"text": prompt})
+        self.assertEqual(result["type"], "str")
+        self.assertEqual(result["text"], "Summarize: one two")
+        self.assertEqual(json.loads(result["json"])["text"], "Summarize: one two")
+
+    def test_lazy_text_subclasses_implement_reading(self):
+        class ChunksOnly(LazyText):
+            def iter_chunks(self):
+                yield "text"
+
+        with self.assertRaises(TypeError):
+            ChunksOnly()
+
+    def test_single_pass_stream(self):
+        stream = TextStream(iter(["a", "b"]))
+        self.assertEqual(list(stream.iter_chunks()), ["a", "b"])
+        with self.assertRaises(RuntimeError):
+            list(stream.iter_chunks())
+
+    def test_buffered_stream_can_be_replayed(self):
+        stream = TextStream(iter(["a", "b"]), buffer=True)
+        self.assertEqual(list(stream.iter_chunks()), ["a", "b"])
+        self.assertEqual(str(stream), "ab")
+
+    def test_prompt_handler_keeps_stream(self):
+        chunks = []
+
+        def segments():
+            for segment in ["one ", "two"]:
+                chunks.append(segment)
+                yield segment
+
+        prompt = PromptHandler().format_prompt("Summarize: {input_text} -- end", TextStream(segments()))
+        self.assertIsInstance(prompt, PromptedText)
+        self.assertEqual((prompt.prefix, prompt.suffix), ("Summarize: ", " -- end"))
+        self.assertEqual(chunks, [])
+        self.assertEqual(str(prompt), "Summarize: one two -- end")
+
+    def test_writer_hands_back_file_text(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "out.txt")
+            with open(path, "w") as f:
+                f.write("previous\n")
+            request = {"text": TextStream(iter(["streamed ", "tëxt"])), "write_file_path": path}
+            result = LocalFileWriterHandler().handle(request)
+            self.assertIsInstance(result["text"], FileText)
+            self.assertEqual(str(result["text"]), "streamed tëxt")
+            with open(path) as f:
+                self.assertEqual(f.read(), "previous\nstreamed tëxt\n")
+
+if __name__ == '__main__':
+    unittest.main()
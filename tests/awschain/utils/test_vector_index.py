@@ -0,0 +1,118 @@
+import io
+import os
+import json
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from awschain.handlers.processors.amazon_bedrock_chat_handler import AmazonBedrockChatHandler
+from awschain.utils.chunking import ChunkPlanner
+from awschain.utils.embeddings import BedrockEmbedder
+from awschain.utils.vector_index import VectorIndex, index_key
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TOPICS = ("apple", "river", "engine", "violin")
+
+def topic_vector(text):
+    return [float(text.count(topic)) for topic in TOPICS] + [0.01]
+
+class EmbeddingClient:
+    """
+    Embeds texts as topic word counts, answering Titan (one inputText) and Cohere (texts) bodies.
+    """
+
+    def __init__(self):
+        self.bodies = []
+        self.lock = threading.Lock()
+
+    def invoke_model(self, body, modelId, **kwargs):
+        body = json.loads(body)
+        with self.lock:
+            self.bodies.append(body)
+        if "texts" in body:
+            result = {"embeddings": [topic_vector(text) for text in body["texts"]]}
+        else:
+            result = {"embedding": topic_vector(body["inputText"])}
+        return {"body": io.BytesIO(json.dumps(result).encode("utf-8"))}
+
+class TestBedrockEmbedder(unittest.TestCase):
+    def test_titan_embeds_one_text_per_call(self):
+        client = EmbeddingClient()
+        embedder = BedrockEmbedder("amazon.titan-embed-text-v2:0", concurrency=3, dimensions=256, client=client)
+        texts = [f"apple {i}" for i in range(7)] + ["river"]
+        vectors = embedder.embed(texts)
+        self.assertEqual(len(client.bodies), 8)
+        self.assertEqual(client.bodies[0]["dimensions"], 256)
+        self.assertEqual(vectors[0], topic_vector("apple 0"))
+        self.assertEqual(vectors[-1], topic_vector("river"))
+
+    def test_cohere_embeds_batches(self):
+        client = EmbeddingClient()
+        embedder = BedrockEmbedder("cohere.embed-english-v3", batch_size=200, client=client)
+        self.assertEqual(embedder.batch_size, 96)
+        vectors = embedder.embed([f"engine {i}" for i in range(100)])
+        self.assertEqual(sorted(len(body["texts"]) for body in client.bodies), [4, 96])
+        self.assertEqual(len(vectors), 100)
+        embedder.embed_query("which engine?")
+        self.assertEqual(client.bodies[-1]["input_type"], "search_query")
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+class TestVectorIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.text = " ".join(["apple orchard notes."] * 5 + ["river crossing notes."] * 5 + ["engine repair notes."] * 5)
+        self.planner = ChunkPlanner(50)
+        self.directory = os.path.join(self.tmp.name, index_key(self.text, "amazon.titan-embed-text-v2:0", self.planner))
+        self.embedder = BedrockEmbedder("amazon.titan-embed-text-v2:0", client=EmbeddingClient())
+
+    def test_build_and_search(self):
+        chunks = self.planner.plan(self.text)
+        index = VectorIndex.build(self.directory, chunks, self.embedder)
+        self.assertEqual(len(index), len(chunks))
+        self.assertIsInstance(index.vectors, numpy.memmap)
+        self.assertEqual(index.vectors.dtype, numpy.float32)
+        hits = index.search(topic_vector("river"), top_k=2)
+        self.assertEqual(len(hits), 2)
+        # The two chunks with only river notes, not the one that also has apple notes.
+        self.assertTrue(all(chunk["text"].count("river") == 2 for _, chunk in hits))
+        self.assertGreaterEqual(hits[0][0], hits[1][0])
+        chunk = hits[0][1]
+        self.assertEqual(self.text[chunk["start"]:chunk["end"]], chunk["text"])
+
+        # Reopened from disk, with no partial build left behind.
+        reopened = VectorIndex.open(self.directory)
+        self.assertEqual(reopened.search(topic_vector("engine"), 1)[0][1], index.search(topic_vector("engine"), 1)[0][1])
+        self.assertEqual(os.listdir(self.tmp.name), [os.path.basename(self.directory)])
+
+    def test_key_depends_on_model_and_chunking(self):
+        key = index_key(self.text, "amazon.titan-embed-text-v2:0", self.planner)
+        self.assertNotEqual(key, index_key(self.text, "cohere.embed-english-v3", self.planner))
+        self.assertNotEqual(key, index_key(self.text, "amazon.titan-embed-text-v2:0", ChunkPlanner(50, overlap=10)))
+        self.assertNotEqual(key, index_key(self.text, "amazon.titan-embed-text-v2:0", self.planner, 256))
+
+    def test_questions_are_embedded_with_the_index_dimensions(self):
+        index = VectorIndex.build(self.directory, self.planner.plan(self.text), self.embedder)
+        client = EmbeddingClient()
+        with patch.dict(os.environ, {"AMAZON_BEDROCK_EMBEDDING_DIMENSIONS": "256"}), \
+                patch.object(BedrockEmbedder, "client", client):
+            retrieve = AmazonBedrockChatHandler().retriever(self.directory)
+            passages = retrieve("river")
+        self.assertEqual(client.bodies[0]["dimensions"], index.meta["dimensions"])
+        self.assertTrue(passages)
+        # Models without a dimensions parameter are not sent one.
+        self.assertIsNone(BedrockEmbedder.from_env("cohere.embed-english-v3", 1024).dimensions)
+
+    def test_failed_build_leaves_nothing(self):
+        with patch.object(self.embedder, "embed_batch", side_effect=RuntimeError("throttled")):
+            with self.assertRaises(RuntimeError):
+                VectorIndex.build(self.directory, self.planner.plan(self.text), self.embedder)
+        self.assertFalse(VectorIndex.exists(self.directory))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+if __name__ == '__main__':
+    unittest.main()
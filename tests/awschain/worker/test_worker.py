@@ -0,0 +1,168 @@
+import os
+import time
+import uuid
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from awschain.handlers.abstract_handler import AbstractHandler
+from awschain.worker import Worker, SQLiteQueue, SQSQueue
+
+class RecordHandler(AbstractHandler):
+    def __init__(self, seen, fail_once=(), delay=0):
+        self.seen = seen
+        self.fail_once = set(fail_once)
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def handle(self, request: dict) -> dict:
+        time.sleep(self.delay)
+        with self.lock:
+            if request["id"] in self.fail_once:
+                self.fail_once.discard(request["id"])
+                raise RuntimeError("transient failure")
+            self.seen.append(request["id"])
+        return super().handle(request)
+
+class LocalSQSClient:
+    """In-memory stand-in for the subset of the SQS API used by SQSQueue."""
+
+    def __init__(self):
+        self.messages = {}
+        self.lock = threading.Lock()
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0):
+        message_id = uuid.uuid4().hex
+        with self.lock:
+            self.messages[message_id] = {"Body": MessageBody, "visible_at": time.time() + DelaySeconds, "receives": 0, "receipt": None}
+        return {"MessageId": message_id}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, AttributeNames, VisibilityTimeout=30):
+        now = time.time()
+        result = []
+        with self.lock:
+            for message_id, message in self.messages.items():
+                if len(result) == MaxNumberOfMessages:
+                    break
+                if message["visible_at"] <= now:
+                    message["visible_at"] = now + VisibilityTimeout
+                    message["receives"] += 1
+                    message["receipt"] = uuid.uuid4().hex
+                    result.append({"MessageId": message_id, "Body": message["Body"], "ReceiptHandle": message["receipt"],
+                                   "Attributes": {"ApproximateReceiveCount": str(message["receives"])}})
+        if not result and WaitTimeSeconds:
+            time.sleep(0.05)
+        return {"Messages": result} if result else {}
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        with self.lock:
+            for message_id, message in list(self.messages.items()):
+                if message["receipt"] == ReceiptHandle:
+                    del self.messages[message_id]
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        with self.lock:
+            for message in self.messages.values():
+                if message["receipt"] == ReceiptHandle:
+                    message["visible_at"] = time.time() + VisibilityTimeout
+
+class TestWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = SQLiteQueue(os.path.join(self.tmp.name, "queue.db"), visibility_timeout=60, max_receives=3)
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp.cleanup()
+
+    def test_sqlite_queue_delivery(self):
+        self.queue.put({"id": 1})
+        message, = self.queue.receive()
+        self.assertEqual(message.body, {"id": 1})
+        # Claimed messages are invisible until acknowledged or released.
+        self.assertEqual(self.queue.receive(), [])
+        self.queue.nack(message)
+        message, = self.queue.receive()
+        self.assertEqual(message.receive_count, 2)
+        self.queue.ack(message)
+        self.assertEqual(self.queue.size(), 0)
+
+    def test_unacknowledged_messages_are_redelivered_then_dead_lettered(self):
+        self.queue.visibility_timeout = 0
+        self.queue.put({"id": 1})
+        for attempt in range(3):
+            self.assertEqual(len(self.queue.receive()), 1)
+        self.assertEqual(self.queue.receive(), [])
+        self.assertEqual(self.queue.dead_letters(), [{"id": 1}])
+
+    def test_worker_retries_failures_and_acknowledges(self):
+        for i in range(10):
+            self.queue.put({"id": i})
+        seen = []
+        worker = Worker(self.queue, RecordHandler(seen, fail_once={3, 7}), concurrency=3, retry_delay=0, poll_wait=0.05)
+        worker.run(stop_when_empty=True)
+        self.assertEqual(sorted(seen), list(range(10)))
+        self.assertEqual((worker.processed, worker.failed), (10, 2))
+        self.assertEqual(self.queue.size(), 0)
+
+    def test_stop_drains_requests_in_flight(self):
+        for i in range(6):
+            self.queue.put({"id": i})
+        seen = []
+        worker = Worker(self.queue, RecordHandler(seen, delay=0.2), concurrency=2, poll_wait=0.05)
+        thread = threading.Thread(target=worker.run)
+        thread.start()
+        time.sleep(0.1)
+        worker.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        # The two requests running when stop() was called finished and were acknowledged.
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(self.queue.size(), 4)
+
+    def test_heartbeat_keeps_long_requests_hidden(self):
+        self.queue.visibility_timeout = 0.3
+        self.queue.put({"id": 1})
+        seen = []
+        worker = Worker(self.queue, RecordHandler(seen, delay=1), concurrency=1, poll_wait=0.05, heartbeat_interval=0.1)
+        thread = threading.Thread(target=worker.run, kwargs={"stop_when_empty": True})
+        thread.start()
+        time.sleep(0.6)
+        # Past the visibility timeout the message is still claimed by the running request.
+        self.assertEqual(self.queue.receive(), [])
+        thread.join(5)
+        self.assertEqual(seen, [1])
+        self.assertEqual((worker.processed, self.queue.size()), (1, 0))
+
+    def test_result_handler_errors_are_not_acknowledgement_errors(self):
+        self.queue.put({"id": 1})
+        seen = []
+
+        def on_result(message, result):
+            raise ValueError("cannot store result")
+
+        worker = Worker(self.queue, RecordHandler(seen), concurrency=1, poll_wait=0.05, on_result=on_result)
+        with patch("builtins.print") as printed:
+            worker.run(stop_when_empty=True)
+        lines = [" ".join(map(str, call.args)) for call in printed.call_args_list]
+        self.assertTrue(any("Failed to handle the result of message" in line for line in lines))
+        self.assertFalse(any("Failed to acknowledge" in line for line in lines))
+        self.assertEqual((worker.processed, worker.failed, self.queue.size()), (1, 0, 0))
+
+    def test_sqs_queue_with_local_stand_in(self):
+        queue = SQSQueue("https://sqs.us-east-1.amazonaws.com/123456789012/requests", client=LocalSQSClient(), wait_time=0,
+                         visibility_timeout=1)
+        for i in range(5):
+            queue.put({"id": i})
+        seen = []
+        handler = RecordHandler(seen, fail_once={2}, delay=0.3)
+        worker = Worker(queue, lambda request: handler, concurrency=2, retry_delay=0, poll_wait=0, heartbeat_interval=0.1)
+        with patch.object(queue.client, "change_message_visibility", wraps=queue.client.change_message_visibility) as change:
+            worker.run(stop_when_empty=True)
+        self.assertEqual(sorted(seen), list(range(5)))
+        self.assertEqual(queue.client.messages, {})
+        # The heartbeat extended running messages by the visibility timeout.
+        self.assertIn(1, [call.kwargs["VisibilityTimeout"] for call in change.call_args_list])
+
+if __name__ == '__main__':
+    unittest.main()